@@ -2,7 +2,12 @@ import cv2
 import mediapipe as mp
 import numpy as np
 
-THRESHOLD = 0.2 # 20%, 값이 클수록 손이 카메라와 가까워야 인식함
+import sys
+sys.path.append('code') # Reuse utility in code folder
+from utils_joint_angle import convert_3d_joint_to_angle
+from utils_dynamic_gesture import SwipeRecognizer
+
+max_num_hands = 1
 
 gesture = {
     0:'fist', 1:'one', 2:'two', 3:'three', 4:'four', 5:'five',
@@ -13,7 +18,7 @@ gesture = {
 mp_hands = mp.solutions.hands
 mp_drawing = mp.solutions.drawing_utils
 hands = mp_hands.Hands(
-    max_num_hands=1,
+    max_num_hands=max_num_hands,
     min_detection_confidence=0.5,
     min_tracking_confidence=0.5)
 
@@ -24,69 +29,55 @@ label = file[:, -1].astype(np.float32)
 knn = cv2.ml.KNearest_create()
 knn.train(angle, cv2.ml.ROW_SAMPLE, label)
 
+# Direction is recognized from trajectory of the hand over recent frames
+swipe = SwipeRecognizer(max_num=max_num_hands)
+
 cap = cv2.VideoCapture(1)
 
+rgb = None # Reused buffer of RGB image
 while cap.isOpened():
     ret, img = cap.read()
     if not ret:
         continue
 
-    img = cv2.flip(img, 1) # 이미지 좌우 반전
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    # Convert to RGB into a reused buffer without flipping the frame
+    # Flip is only for display thus landmark is mirrored below instead
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=rgb)
 
-    result = hands.process(img)
+    result = hands.process(rgb)
 
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    img = cv2.flip(img, 1) # Flip image for display
 
     if result.multi_hand_landmarks is not None:
-        for res in result.multi_hand_landmarks:
-            joint = np.zeros((21, 3))
+        joint = np.zeros((len(result.multi_hand_landmarks), 21, 3))
+        for i, res in enumerate(result.multi_hand_landmarks):
             for j, lm in enumerate(res.landmark):
-                joint[j] = [lm.x, lm.y, lm.z]
-
-            # Compute angles between joints
-            v1 = joint[[0,1,2,3,0,5,6,7,0,9,10,11,0,13,14,15,0,17,18,19],:] # Parent joint
-            v2 = joint[[1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20],:] # Child joint
-            v = v2 - v1 # [20,3]
-            # Normalize v
-            v = v / np.linalg.norm(v, axis=1)[:, np.newaxis]
-
-            # Get angle using arcos of dot product
-            angle = np.arccos(np.einsum('nt,nt->n',
-                v[[0,1,2,4,5,6,8,9,10,12,13,14,16,17,18],:], 
-                v[[1,2,3,5,6,7,9,10,11,13,14,15,17,18,19],:])) # [15,]
-
-            angle = np.degrees(angle) # Convert radian to degree
-
-            # Inference gesture
-            data = np.array([angle], dtype=np.float32)
-            ret, results, neighbours, dist = knn.findNearest(data, 3)
-            idx = int(results[0][0])
-
-            if idx == 0 or idx == 6: # fist or six
-                thumb_end = res.landmark[4]
-                fist_end = res.landmark[17]
-
-                text = None
-
-                if thumb_end.x - fist_end.x > THRESHOLD:
-                    text = 'RIGHT'
-                elif fist_end.x - thumb_end.x > THRESHOLD:
-                    text = 'LEFT'
-                elif thumb_end.y - fist_end.y > THRESHOLD:
-                    text = 'DOWN'
-                elif fist_end.y - thumb_end.y > THRESHOLD:
-                    text = 'UP'
-
-                if text is not None:
-                    cv2.putText(img, text=text, org=(int(res.landmark[0].x * img.shape[1]), int(res.landmark[0].y * img.shape[0] + 20)), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
+                lm.x = 1 - lm.x # Mirror landmark to match flipped image
+                joint[i,j] = [lm.x, lm.y, lm.z]
+
+        # Swipe direction from trajectory in pixel, no single-frame threshold
+        swipe.update(joint[:,:,:2] * [img.shape[1], img.shape[0]])
+
+        # Number is a static pose thus still classified by KNN for all hands at once
+        angle = convert_3d_joint_to_angle(joint) # [num_hands,15]
+        data = angle.astype(np.float32)
+        ret, results, neighbours, dist = knn.findNearest(data, 3)
+
+        for i, res in enumerate(result.multi_hand_landmarks):
+            idx = int(results[i][0])
+            org = (int(res.landmark[0].x * img.shape[1]), int(res.landmark[0].y * img.shape[0] + 20))
+
+            if swipe.label[i] is not None:
+                cv2.putText(img, text=swipe.label[i], org=org, fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
             elif idx in [1, 2, 3, 4, 5, 9]: # 숫자 1,2,3,4,5 인식
                 if idx == 9:
                     idx = 2
 
-                cv2.putText(img, text=str(idx), org=(int(res.landmark[0].x * img.shape[1]), int(res.landmark[0].y * img.shape[0] + 20)), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
+                cv2.putText(img, text=str(idx), org=org, fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
 
             mp_drawing.draw_landmarks(img, res, mp_hands.HAND_CONNECTIONS)
+    else:
+        swipe.update(np.zeros((0, 21, 2))) # Restart trajectory when hand reappears
 
     cv2.imshow('Ampere\'s Law', img)
     if cv2.waitKey(1) == ord('q'):
@@ -12,6 +12,7 @@ import cv2
 import sys
 import argparse
 
+from utils_cache import LandmarkCache
 from utils_display import DisplayFace, DisplayHand, DisplayBody, DisplayHolistic
 from utils_mediapipe import MediaPipeFace, MediaPipeHand, MediaPipeBody, MediaPipeHolistic
 
@@ -20,24 +21,29 @@ from utils_mediapipe import MediaPipeFace, MediaPipeHand, MediaPipeBody, MediaPi
 parser = argparse.ArgumentParser()
 parser.add_argument('-m', '--mode', default='hand', 
     help='Select mode: face / hand / body / holistic')
+parser.add_argument('-c', '--cache', default=None,
+    help='Folder to cache landmarks e.g. ../data/cache/')
 args = parser.parse_args()
 mode = args.mode
 
+# Load landmark cache to skip inference on previously seen image
+cache = None if args.cache is None else LandmarkCache(args.cache)
+
 # Load mediapipe and display class
 if mode=='face':
-    pipe = MediaPipeFace(static_image_mode=True, max_num_faces=1)
+    pipe = MediaPipeFace(static_image_mode=True, max_num_faces=1, cache=cache)
     disp = DisplayFace(draw3d=True)
     file = '../data/sample/mona.png'
 elif mode=='hand':
-    pipe = MediaPipeHand(static_image_mode=True, max_num_hands=1)
+    pipe = MediaPipeHand(static_image_mode=True, max_num_hands=1, cache=cache)
     disp = DisplayHand(draw3d=True, max_num_hands=1)
     file = '../data/sample/hand.png'
 elif mode=='body':
-    pipe = MediaPipeBody(static_image_mode=True, model_complexity=1)
+    pipe = MediaPipeBody(static_image_mode=True, model_complexity=1, cache=cache)
     disp = DisplayBody(draw3d=True)
     file = '../data/sample/upper_limb4.png'
 elif mode=='holistic':
-    pipe = MediaPipeHolistic(static_image_mode=True, model_complexity=1)
+    pipe = MediaPipeHolistic(static_image_mode=True, model_complexity=1, cache=cache)
     disp = DisplayHolistic(draw3d=True)
     file = '../data/sample/lower_limb4.png'
 else:
@@ -15,27 +15,38 @@ import argparse
 
 from utils_display import DisplayFace, DisplayHand, DisplayBody, DisplayHolistic
 from utils_mediapipe import MediaPipeFace, MediaPipeHand, MediaPipeBody, MediaPipeHolistic
+from utils_record import SessionRecorder
 
 
 # User select mode
 parser = argparse.ArgumentParser()
 parser.add_argument('-m', '--mode', default='hand', 
     help='Select mode: face / hand / body / holistic')
+parser.add_argument('-i', '--infer_size', type=int, default=None,
+    help='Downscale longer side of frame to this size before inference e.g. 640')
+parser.add_argument('--crop', action='store_true',
+    help='Crop frame around landmark of previous frame before inference')
+parser.add_argument('-r', '--record', default=None,
+    help='Folder to record landmarks of every frame e.g. ../data/session')
 args = parser.parse_args()
 mode = args.mode
 
 # Load mediapipe and display class
 if mode=='face':
-    pipe = MediaPipeFace(static_image_mode=False, max_num_faces=1)
+    pipe = MediaPipeFace(static_image_mode=False, max_num_faces=1,
+        infer_size=args.infer_size, crop=args.crop)
     disp = DisplayFace(draw3d=True)
 elif mode=='hand':
-    pipe = MediaPipeHand(static_image_mode=False, max_num_hands=2)
+    pipe = MediaPipeHand(static_image_mode=False, max_num_hands=2,
+        infer_size=args.infer_size, crop=args.crop)
     disp = DisplayHand(draw3d=True, max_num_hands=2)
 elif mode=='body':
-    pipe = MediaPipeBody(static_image_mode=False, model_complexity=1)
+    pipe = MediaPipeBody(static_image_mode=False, model_complexity=1,
+        infer_size=args.infer_size, crop=args.crop)
     disp = DisplayBody(draw3d=True)
 elif mode=='holistic':
-    pipe = MediaPipeHolistic(static_image_mode=False, model_complexity=1)
+    pipe = MediaPipeHolistic(static_image_mode=False, model_complexity=1,
+        infer_size=args.infer_size, crop=args.crop)
     disp = DisplayHolistic(draw3d=True)
 else:
     print('Undefined mode only the following modes are available: \nface / hand / body / holistic')
@@ -53,6 +64,9 @@ cap = cv2.VideoCapture(0) # By default webcam is index 0
 # fourcc = cv2.VideoWriter_fourcc(*'mp4v') # Be sure to use lower case
 # video = cv2.VideoWriter('../data/video_.mp4', fourcc, fps, (width, height))
 
+# Log landmarks for offline analysis
+recorder = None if args.record is None else SessionRecorder(args.record, mode)
+
 prev_time = time.time()
 while cap.isOpened():
     ret, img = cap.read()
@@ -81,6 +95,9 @@ while cap.isOpened():
             p['fps'] = fps
     prev_time = curr_time
 
+    if recorder is not None:
+        recorder.record(param, curr_time)
+
     img.flags.writeable = True
 
     # Display 2D keypoint
@@ -102,6 +119,8 @@ while cap.isOpened():
     if key==27:
         break
 
+if recorder is not None:
+    recorder.close()
 pipe.pipe.close()
 # video.release()
 cap.release()
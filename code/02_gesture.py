@@ -5,6 +5,7 @@
 ###         with gesture classification
 ### Usage : python 02_gesture.py -m train (to log data)
 ###       : python 02_gesture.py -m eval  (to perform gesture recognition)
+###       : python 02_gesture.py -m eval --model logistic (constant time classifier)
 ###############################################################################
 
 import cv2
@@ -13,10 +14,17 @@ import argparse
 from utils_display import DisplayHand
 from utils_mediapipe import MediaPipeHand
 from utils_joint_angle import GestureRecognition
+from utils_record import SessionRecorder
 
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-m', '--mode', default='eval', help='train / eval')
+parser.add_argument('-r', '--record', default=None,
+    help='Folder to record landmarks of every frame e.g. ../data/session')
+parser.add_argument('--model', default='knn',
+    help='Select gesture classifier: knn / logistic / tree')
+parser.add_argument('--reject', action='store_true',
+    help='Return unknown for hand pose far from training data')
 args = parser.parse_args()
 mode = args.mode
 
@@ -30,7 +38,10 @@ disp = DisplayHand(max_num_hands=1)
 cap = cv2.VideoCapture(0) # By default webcam is index 0
 
 # Load gesture recognition class
-gest = GestureRecognition(mode)
+gest = GestureRecognition(mode, args.model, args.reject)
+
+# Log landmarks and gesture for offline analysis
+recorder = None if args.record is None else SessionRecorder(args.record, 'hand')
 
 counter = 0
 while cap.isOpened():
@@ -38,19 +49,23 @@ while cap.isOpened():
     if not ret:
         break
 
-    # Flip image for 3rd person view
-    img = cv2.flip(img, 1)
-
     # To improve performance, optionally mark image as not writeable to pass by reference
     img.flags.writeable = False
 
     # Feedforward to extract keypoint
-    param = pipe.forward(img)
+    # Note: Mirror landmark instead of flipping the frame before inference
+    param = pipe.forward(img, mirror=True)
     if (param[0]['class'] is not None) and (mode=='eval'):
         param[0]['gesture'] = gest.eval(param[0]['angle'])
 
+    if recorder is not None:
+        recorder.record(param)
+
     img.flags.writeable = True
 
+    # Flip image for 3rd person view
+    img = cv2.flip(img, 1)
+
     # Display keypoint
     cv2.imshow('img 2D', disp.draw2d(img.copy(), param))
 
@@ -69,5 +84,7 @@ while cap.isOpened():
     if key==32 and (param[0]['class'] is not None) and (mode=='eval'):
         cv2.waitKey(0) # Pause display until user press any key        
 
+if recorder is not None:
+    recorder.close()
 pipe.pipe.close()
 cap.release()
@@ -3,18 +3,48 @@
 ### Input : Live video of 2 hands playing rock paper scissor
 ### Output: 2D display of hand keypoint 
 ###         with gesture classification (rock=fist, paper=five, scissor=three/yeah)
+### Usage : python 03_game_rps.py
+###         python 03_game_rps.py -k 3 -c 0.3 (skip frames to limit cpu usage)
+###         python 03_game_rps.py -f one_euro (smooth landmark to reduce flicker)
+###         python 03_game_rps.py --model logistic (constant time classifier)
 ###############################################################################
 
 import cv2
+import argparse
 
+from utils_filter import LandmarkFilter
 from utils_display import DisplayHand
 from utils_mediapipe import MediaPipeHand
+from utils_schedule import AdaptiveScheduler
 from utils_joint_angle import GestureRecognition
 
 
+parser = argparse.ArgumentParser()
+parser.add_argument('-k', '--max_skip', type=int, default=0,
+    help='Maximum number of consecutive frames without inference (0: run every frame)')
+parser.add_argument('-c', '--cpu_target', type=float, default=None,
+    help='Target fraction of one cpu core spent on inference e.g. 0.3')
+parser.add_argument('-f', '--filter', default='none',
+    help='Select landmark smoothing: none / exp / one_euro / kalman')
+parser.add_argument('--model', default='knn',
+    help='Select gesture classifier: knn / logistic / tree')
+parser.add_argument('--reject', action='store_true',
+    help='Return unknown for hand pose far from training data')
+args = parser.parse_args()
+
 # Load mediapipe hand class
 pipe = MediaPipeHand(static_image_mode=False, max_num_hands=2)
 
+# Only run inference every few frames or when the hands move
+sched = None
+if args.max_skip>0:
+    sched = AdaptiveScheduler(pipe, max_skip=args.max_skip, cpu_target=args.cpu_target)
+
+# Smooth landmark and angle of both hands before gesture recognition
+smoother = None
+if args.filter!='none':
+    smoother = LandmarkFilter(max_num=2, method=args.filter)
+
 # Load display class
 disp = DisplayHand(max_num_hands=2)
 
@@ -22,7 +52,7 @@ disp = DisplayHand(max_num_hands=2)
 cap = cv2.VideoCapture(0) # By default webcam is index 0
 
 # Load gesture recognition class
-gest = GestureRecognition(mode='eval')
+gest = GestureRecognition(mode='eval', model=args.model, reject=args.reject)
 
 counter = 0
 while cap.isOpened():
@@ -30,21 +60,30 @@ while cap.isOpened():
     if not ret:
         break
 
-    # Flip image for 3rd person view
-    img = cv2.flip(img, 1)
-
     # To improve performance, optionally mark image as not writeable to pass by reference
     img.flags.writeable = False
 
     # Feedforward to extract keypoint
-    param = pipe.forward(img)
+    # Note: Mirror landmark instead of flipping the frame before inference
+    if sched is None:
+        param = pipe.forward(img, mirror=True)
+    else:
+        param = sched.forward(img, mirror=True)
+    if smoother is not None:
+        smoother.forward(param)
     # Evaluate gesture for all hands
-    for p in param:
-        if p['class'] is not None:
-            p['gesture'] = gest.eval(p['angle'])
+    # Note: Last gesture is reused on frame without inference
+    if sched is None or sched.ran:
+        hand = [p for p in param if p['class'] is not None]
+        if len(hand)>0:
+            for p, g in zip(hand, gest.eval_batch([p['angle'] for p in hand])):
+                p['gesture'] = g
 
     img.flags.writeable = True
 
+    # Flip image for 3rd person view
+    img = cv2.flip(img, 1)
+
     # Display keypoint and result of rock paper scissor game
     cv2.imshow('Game: Rock Paper Scissor', disp.draw_game_rps(img.copy(), param))
 
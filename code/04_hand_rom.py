@@ -5,6 +5,7 @@
 ###         with hand rom classification and corresponding joint angle
 ### Usage : python 04_hand_rom.py -m train (to log data)
 ###       : python 04_hand_rom.py -m eval  (to perform hand rom recognition)
+###       : python 04_hand_rom.py -m eval -v 1 (extended hand feature)
 ###############################################################################
 
 import cv2
@@ -17,6 +18,8 @@ from utils_joint_angle import HandRomRecognition
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-m', '--mode', default='eval', help='train / eval')
+parser.add_argument('-v', '--version', type=int, default=0,
+    help='Version of hand feature: 0 joint angle only / 1 extended')
 args = parser.parse_args()
 mode = args.mode
 
@@ -30,7 +33,7 @@ disp = DisplayHand(max_num_hands=1)
 cap = cv2.VideoCapture(0) # By default webcam is index 0
 
 # Load hand rom recognition class
-gest = HandRomRecognition(mode)
+gest = HandRomRecognition(mode, args.version)
 
 counter = 0
 while cap.isOpened():
@@ -47,7 +50,7 @@ while cap.isOpened():
     # Feedforward to extract keypoint
     param = pipe.forward(img)
     if (param[0]['class'] is not None) and (mode=='eval'):
-        param[0]['gesture'] = gest.eval(param[0]['angle'])
+        param[0]['gesture'] = gest.eval(gest.feature(param[0]))
 
     img.flags.writeable = True
 
@@ -73,7 +76,7 @@ while cap.isOpened():
         # 'Wrist Extension'       :10,# Not done yet
         # 'Wrist Radial Deviation':11,# Not done yet
         # 'Wrist Ulnar Deviation' :12,# Not done yet
-        gest.train(param[0]['angle'], gest.gesture['Finger MCP Flexion'])
+        gest.train(gest.feature(param[0]), gest.gesture['Finger MCP Flexion'])
         print('Saved', counter) # Log around 10 for each class
         counter += 1
     if key==32 and (param[0]['class'] is not None) and (mode=='eval'):
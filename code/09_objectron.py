@@ -11,6 +11,7 @@
 import cv2
 import argparse
 
+from utils_cache import LandmarkCache
 from utils_display import DisplayObjectron
 from utils_mediapipe import MediaPipeObjectron
 
@@ -19,6 +20,8 @@ from utils_mediapipe import MediaPipeObjectron
 parser = argparse.ArgumentParser()
 parser.add_argument('-m', '--mode', default='shoe', 
     help='Select mode: shoe / chair / cup / camera')
+parser.add_argument('-c', '--cache', default=None,
+    help='Folder to cache landmarks e.g. ../data/cache/')
 args = parser.parse_args()
 
 # Read in image (Note: You can change the file path to your own test image)
@@ -37,9 +40,12 @@ intrin = {
     'height': img_height,
 }
 
+# Load landmark cache to skip inference on previously seen image
+cache = None if args.cache is None else LandmarkCache(args.cache)
+
 # Load mediapipe
 pipe = MediaPipeObjectron(static_image_mode=True, max_num_objects=5, 
-  model_name=args.mode, intrin=intrin)
+  model_name=args.mode, intrin=intrin, cache=cache)
 
 # Load display class
 disp = DisplayObjectron(draw3d=True, draw_camera=True, intrin=intrin, max_num_objects=5)
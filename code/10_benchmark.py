@@ -0,0 +1,168 @@
+###############################################################################
+### Headless benchmark of the gesture recognition pipeline
+### Input : Recorded video file or folder of images (no webcam needed)
+### Output: JSON report of end-to-end FPS, per-stage latency,
+###         memory high-water mark and gesture classification results
+### Usage : python 10_benchmark.py -s '../data/sample/*.png'
+###         python 10_benchmark.py -s ../data/video.mp4 -o bench.json
+###############################################################################
+
+import sys
+import time
+import json
+import argparse
+import platform
+import subprocess
+import numpy as np
+
+from utils_cache import LandmarkCache
+from utils_frame import FrameReader
+from utils_mediapipe import MediaPipeHand
+from utils_joint_angle import GestureRecognition
+
+try:
+    import resource # Not available on Windows
+except ImportError:
+    resource = None
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-s', '--source', default='../data/sample/*.png',
+    help='Video file, image folder or glob pattern')
+parser.add_argument('-n', '--max_num_hands', type=int, default=2)
+parser.add_argument('-l', '--loop', type=int, default=1,
+    help='Number of times to replay the source')
+parser.add_argument('-w', '--warmup', type=int, default=5,
+    help='Number of initial frames excluded from latency statistics')
+parser.add_argument('-o', '--output', default=None,
+    help='Write JSON report to file instead of stdout')
+parser.add_argument('-c', '--cache', default=None,
+    help='Folder to cache landmarks (image folder only) e.g. ../data/cache/')
+parser.add_argument('--no_flip', action='store_true',
+    help='Do not mirror landmark for 3rd person view')
+parser.add_argument('--per_frame', action='store_true',
+    help='Include gesture result of every frame in the report')
+args = parser.parse_args()
+
+
+def get_max_rss():
+    # Memory high-water mark of this process in MB
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform=='darwin':
+        return rss / 1024 / 1024 # Bytes on macOS
+    return rss / 1024 # Kilobytes on Linux
+
+
+def get_commit():
+    # Git commit of the code being benchmarked for comparing runs
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def summarize(t):
+    # Summarize list of latency in ms
+    if len(t)==0:
+        return None
+    t = np.asarray(t) * 1000
+    return {
+        'mean': float(np.mean(t)),
+        'p50' : float(np.percentile(t, 50)),
+        'p95' : float(np.percentile(t, 95)),
+        'max' : float(np.max(t)),
+    }
+
+
+# Load frame source
+reader = FrameReader(args.source, args.loop)
+# Image folder contains unrelated images thus run detection on every image
+static_image_mode = reader.mode=='image'
+
+# Load landmark cache to skip inference on previously seen image
+cache = None
+if args.cache is not None and static_image_mode:
+    cache = LandmarkCache(args.cache)
+
+# Load mediapipe hand class
+pipe = MediaPipeHand(static_image_mode=static_image_mode, max_num_hands=args.max_num_hands, cache=cache)
+
+# Load gesture recognition class
+gest = GestureRecognition(mode='eval')
+
+stage  = {'read':[], 'preprocess':[], 'inference':[], 'classify':[], 'total':[]}
+count  = {} # Number of times each gesture is recognized
+frames = [] # Gesture result of each frame
+num_frame = 0
+num_detect = 0
+
+start_time = time.perf_counter()
+t0 = start_time
+for index, name, img in reader:
+    t1 = time.perf_counter()
+
+    # Note: Frame is not flipped for 3rd person view, landmark is mirrored
+    # instead as in the demos, and there is no display copy to flip
+    img.flags.writeable = False
+    t2 = time.perf_counter()
+
+    # Feedforward to extract keypoint
+    param = pipe.forward(img, mirror=not args.no_flip)
+    t3 = time.perf_counter()
+
+    # Evaluate gesture for all hands
+    result = []
+    for p in param:
+        if p['class'] is not None:
+            p['gesture'] = gest.eval(p['angle'])
+            result.append(p['gesture'])
+            count[p['gesture']] = count.get(p['gesture'], 0) + 1
+    t4 = time.perf_counter()
+
+    if index>=args.warmup:
+        stage['read'].append(t1-t0)
+        stage['preprocess'].append(t2-t1)
+        stage['inference'].append(t3-t2)
+        stage['classify'].append(t4-t3)
+        stage['total'].append(t4-t0)
+
+    if len(result)>0:
+        num_detect += 1
+    if args.per_frame:
+        frames.append({'index':index, 'name':name, 'gesture':result})
+
+    num_frame += 1
+    t0 = time.perf_counter()
+
+elapsed = time.perf_counter() - start_time
+reader.release()
+pipe.pipe.close()
+
+report = {
+    'commit'     : get_commit(),
+    'platform'   : platform.platform(),
+    'python'     : platform.python_version(),
+    'source'     : args.source,
+    'mode'       : reader.mode,
+    'num_frame'  : num_frame,
+    'num_detect' : num_detect,
+    'elapsed'    : elapsed,
+    'fps'        : num_frame/elapsed if elapsed>0 else None,
+    'latency_ms' : {k: summarize(v) for k, v in stage.items()},
+    'max_rss_mb' : get_max_rss(),
+    'gesture'    : count,
+}
+if cache is not None:
+    report['cache'] = {'hit':cache.hit, 'miss':cache.miss}
+if args.per_frame:
+    report['frames'] = frames
+
+text = json.dumps(report, indent=2)
+if args.output is None:
+    print(text)
+else:
+    with open(args.output, 'w') as f:
+        f.write(text)
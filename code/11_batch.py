@@ -0,0 +1,51 @@
+###############################################################################
+### Batch processing of an image folder for labelling large dataset
+### Input : Folder or glob pattern of still images
+### Output: Columnar landmark file (see utils_record.py) with one row per image
+### Usage : python 11_batch.py -m hand -s '../data/sample/*.png' -o ../data/landmark_hand
+###         python 11_batch.py -m body -s ../data/images/ -o ../data/landmark_body -p 8
+###############################################################################
+
+import time
+import argparse
+
+from utils_batch import BatchProcessor
+from utils_frame import list_image
+from utils_record import LandmarkWriter
+
+
+if __name__=='__main__': # Note: Required for multiprocessing on Windows/macOS
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--mode', default='hand',
+        help='Select mode: face / hand / body / holistic')
+    parser.add_argument('-s', '--source', default='../data/sample/',
+        help='Image folder or glob pattern')
+    parser.add_argument('-o', '--output', default='../data/landmark_batch',
+        help='Folder of output landmark file')
+    parser.add_argument('-n', '--max_num', type=int, default=1,
+        help='Maximum number of faces/hands to detect')
+    parser.add_argument('-p', '--num_proc', type=int, default=None,
+        help='Number of processes (default: number of cpu cores)')
+    parser.add_argument('-t', '--num_thread', type=int, default=4,
+        help='Number of decoding threads per process')
+    parser.add_argument('-b', '--batch_size', type=int, default=32)
+    parser.add_argument('--flip', action='store_true',
+        help='Flip image for 3rd person view')
+    parser.add_argument('--no_compress', action='store_true',
+        help='Store uncompressed chunks which can be memory-mapped')
+    args = parser.parse_args()
+
+    files = list_image(args.source)
+    print('Found', len(files), 'images')
+
+    proc = BatchProcessor(mode=args.mode, max_num=args.max_num,
+        num_proc=args.num_proc, num_thread=args.num_thread,
+        batch_size=args.batch_size, flip=args.flip)
+
+    start = time.time()
+    with LandmarkWriter(args.output, compress=not args.no_compress,
+        meta={'model':args.mode, 'setting':proc.setting}) as writer:
+        count = proc.run(files, writer)
+    elapsed = time.time() - start
+
+    print('Saved %d rows to %s in %.1f s (%.1f img/s)' % (count, args.output, elapsed, count/max(elapsed, 1e-6)))
@@ -0,0 +1,91 @@
+###############################################################################
+### Replay recorded landmarks through classifiers and display without MediaPipe
+### Input : Landmark file recorded by 01_video.py / 02_gesture.py --record
+### Output: Replay FPS, classification result and optional 2D display
+### Usage : python 12_replay.py -s ../data/session_hand -c gesture
+###         python 12_replay.py -s ../data/session_hand -c handrom --display
+###         python 12_replay.py -s ../data/session_holistic -c wrist -w 0 --side right
+###############################################################################
+
+import cv2
+import time
+import argparse
+import numpy as np
+
+from utils_record import LandmarkReplay
+from utils_joint_angle import GestureRecognition, HandRomRecognition, WristArmRom
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-s', '--session', default='../data/session_hand',
+    help='Folder of recorded landmark file')
+parser.add_argument('-c', '--classifier', default='gesture',
+    help='Select classifier: none / gesture / handrom / wrist')
+parser.add_argument('-w', '--wrist_mode', type=int, default=2,
+    help='Mode of WristArmRom 0:Wrist flex/ext, 1:Wrist radial/ulnar dev, 2:Forearm pronation/supination')
+parser.add_argument('--side', default='right')
+parser.add_argument('--speed', type=float, default=0,
+    help='0: As fast as possible, 1: Recorded frame rate')
+parser.add_argument('--display', action='store_true',
+    help='Draw replayed landmarks on a blank image')
+args = parser.parse_args()
+
+# Load recorded session in place of MediaPipe class
+pipe = LandmarkReplay(args.session, speed=args.speed)
+print('Replay', len(pipe), 'frames of', pipe.model)
+
+# Load classifier
+gest = None
+if args.classifier=='gesture':
+    gest = GestureRecognition(mode='eval')
+elif args.classifier=='handrom':
+    gest = HandRomRecognition(mode='eval')
+elif args.classifier=='wrist':
+    gest = WristArmRom(args.wrist_mode, args.side)
+
+# Load display class
+disp = None
+if args.display:
+    # Note: Import here as Open3D is only needed for display
+    from utils_display import DisplayFace, DisplayHand, DisplayBody, DisplayHolistic
+    if pipe.model=='face':
+        disp = DisplayFace(max_num_faces=len(pipe.param))
+    elif pipe.model=='hand':
+        disp = DisplayHand(max_num_hands=len(pipe.param))
+    elif pipe.model=='body':
+        disp = DisplayBody()
+    elif pipe.model=='holistic':
+        disp = DisplayHolistic()
+    img = np.zeros((disp.intrin['height'], disp.intrin['width'], 3), np.uint8)
+else:
+    img = None
+
+count = {} # Number of times each gesture is recognized
+start = time.time()
+while not pipe.done():
+    # Same interface as MediaPipe class
+    param = pipe.forward(img)
+
+    if isinstance(gest, WristArmRom):
+        param = gest.eval(param)
+    elif gest is not None:
+        for p in param:
+            if p['class'] is not None:
+                if isinstance(gest, HandRomRecognition):
+                    p['gesture'] = gest.eval(gest.feature(p))
+                else:
+                    p['gesture'] = gest.eval(p['angle'])
+                count[p['gesture']] = count.get(p['gesture'], 0) + 1
+
+    if disp is not None:
+        cv2.imshow('img 2D', disp.draw2d(img.copy(), param))
+        key = cv2.waitKey(1)
+        if key==27:
+            break
+
+elapsed = time.time() - start
+print('Replayed %d frames in %.2f s (%.1f FPS)' % (pipe.index, elapsed, pipe.index/max(elapsed, 1e-6)))
+for k, v in sorted(count.items(), key=lambda x: -x[1]):
+    print('%-25s %d' % (k, v))
+
+pipe.pipe.close()
@@ -0,0 +1,59 @@
+###############################################################################
+### Rock paper scissor tournament server hosting many tables in one process
+### Input : Gesture stream of each table from
+###         local camera / recorded session / socket client (JSON line)
+### Output: Result of each round and leaderboard across all tables
+### Usage : python 13_rps_server.py -t 20 -p 8765 (20 tables for socket clients)
+###         python 13_rps_server.py -c 0 (1 table played by 2 hands on webcam)
+###         python 13_rps_server.py -r ../data/session_a ../data/session_b -n 10
+###############################################################################
+
+import asyncio
+import argparse
+
+from utils_tournament import TournamentServer, replay_source, camera_source
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-t', '--tables', type=int, default=0,
+    help='Number of tables for socket clients')
+parser.add_argument('-p', '--port', type=int, default=None,
+    help='Port to accept socket clients')
+parser.add_argument('-c', '--camera', type=int, nargs='*', default=[],
+    help='Webcam index, each camera hosts a table')
+parser.add_argument('-r', '--replay', nargs='*', default=[],
+    help='Recorded session folder, each session hosts a table')
+parser.add_argument('-n', '--rounds', type=int, default=None,
+    help='Number of rounds per table (default: play forever)')
+parser.add_argument('--countdown', type=float, default=3.0)
+parser.add_argument('--lock_in', type=float, default=1.0,
+    help='Duration (s) of window to collect gesture after countdown')
+parser.add_argument('--rest', type=float, default=2.0)
+parser.add_argument('--speed', type=float, default=1.0,
+    help='Replay speed of recorded session (0: as fast as possible)')
+args = parser.parse_args()
+
+server = TournamentServer(countdown=args.countdown, lock_in=args.lock_in,
+    rest=args.rest, rounds=args.rounds)
+
+sources = []
+for index in args.camera:
+    table = server.add_table('cam%d' % index)
+    sources.append(camera_source(table, index))
+for folder in args.replay:
+    table = server.add_table()
+    sources.append(replay_source(table, folder, speed=args.speed))
+for i in range(args.tables):
+    server.add_table()
+
+if len(server.tables)==0:
+    parser.error('No table to host, use --tables / --camera / --replay')
+if args.tables>0 and args.port is None:
+    parser.error('Socket tables require --port')
+
+print('Hosting', len(server.tables), 'tables')
+try:
+    leaderboard = asyncio.run(server.run(sources, port=args.port))
+    print(leaderboard)
+except KeyboardInterrupt:
+    print(server.leaderboard)
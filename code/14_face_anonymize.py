@@ -0,0 +1,81 @@
+###############################################################################
+### Anonymize faces by blurring / pixelating inside convex hull of face mesh
+### Input : Live video, video file or image folder with one or more faces
+### Output: Anonymized video and throughput of each stage
+### Usage : python 14_face_anonymize.py -s 0 -n 4
+###         python 14_face_anonymize.py -s ../data/crowd_1080p.mp4 -n 8 -i 640 --no_display
+###############################################################################
+
+import cv2
+import time
+import argparse
+import numpy as np
+
+from utils_frame import FrameReader
+from utils_privacy import FaceAnonymizer
+from utils_mediapipe import MediaPipeFace
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-s', '--source', default='0',
+    help='Webcam index, video file, image folder or glob pattern')
+parser.add_argument('-n', '--max_num_faces', type=int, default=4)
+parser.add_argument('-m', '--method', default='blur',
+    help='Select method: blur / pixelate / mask')
+parser.add_argument('-i', '--infer_size', type=int, default=None,
+    help='Longer side of image fed to MediaPipe e.g. 640 for 1080p input')
+parser.add_argument('-o', '--output', default=None,
+    help='Write anonymized video to file')
+parser.add_argument('--no_display', action='store_true')
+args = parser.parse_args()
+
+reader = FrameReader(args.source)
+pipe = MediaPipeFace(static_image_mode=reader.mode=='image',
+    max_num_faces=args.max_num_faces, infer_size=args.infer_size)
+anon = FaceAnonymizer(method=args.method)
+
+writer = None
+stage = {'inference':[], 'anonymize':[], 'total':[]}
+num_face = 0
+
+t0 = time.perf_counter()
+for index, name, img in reader:
+    t1 = time.perf_counter()
+    param = pipe.forward(img)
+    t2 = time.perf_counter()
+    anon.forward(img, param) # In place
+    t3 = time.perf_counter()
+
+    stage['inference'].append(t2-t1)
+    stage['anonymize'].append(t3-t2)
+    stage['total'].append(t3-t0)
+    t0 = t3
+    num_face += sum(p['detect'] for p in param)
+
+    if args.output is not None:
+        if writer is None:
+            writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*'mp4v'),
+                30, (img.shape[1], img.shape[0]))
+        writer.write(img)
+
+    if not args.no_display:
+        cv2.putText(img, 'FPS: %.1f' % (1/max(stage['total'][-1], 1e-6)), (30,50),
+            cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0), 2)
+        cv2.imshow('img', img)
+        key = cv2.waitKey(1)
+        if key==27:
+            break
+
+reader.release()
+pipe.pipe.close()
+if writer is not None:
+    writer.release()
+
+# Report throughput of each stage
+num_frame = len(stage['total'])
+if num_frame>0:
+    print('%d frames %s, %.2f faces per frame' % (num_frame, img.shape[1::-1], num_face/num_frame))
+    for k, v in stage.items():
+        t = np.asarray(v) * 1000
+        print('%-10s mean %6.2f ms  p95 %6.2f ms  %7.1f fps' % (
+            k, np.mean(t), np.percentile(t, 95), 1000/max(np.mean(t), 1e-6)))
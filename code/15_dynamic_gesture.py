@@ -0,0 +1,94 @@
+###############################################################################
+### Dynamic gesture recognition e.g. wave / swipe / counting
+### Input : Live video of hand
+### Output: 2D display of hand keypoint with recognized dynamic gesture
+### Usage : python 15_dynamic_gesture.py -m train -l wave (spacebar to start/stop recording)
+###       : python 15_dynamic_gesture.py -m eval
+###############################################################################
+
+import cv2
+import time
+import argparse
+
+from utils_display import DisplayHand
+from utils_mediapipe import MediaPipeHand
+from utils_dynamic_gesture import DynamicGestureRecognition
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-m', '--mode', default='eval', help='train / eval')
+parser.add_argument('-l', '--label', default='wave',
+    help='Label of template to be recorded in train mode')
+parser.add_argument('-f', '--file', default='../data/dynamic_gesture_train.npz',
+    help='File of recorded templates')
+parser.add_argument('-n', '--max_num_hands', type=int, default=1)
+parser.add_argument('-t', '--threshold', type=float, default=0.3,
+    help='Maximum DTW distance per template frame')
+args = parser.parse_args()
+mode = args.mode
+
+# Load mediapipe hand class
+pipe = MediaPipeHand(static_image_mode=False, max_num_hands=args.max_num_hands)
+
+# Load display class
+disp = DisplayHand(max_num_hands=args.max_num_hands)
+
+# Start video capture
+cap = cv2.VideoCapture(0) # By default webcam is index 0
+
+# Load dynamic gesture recognition class
+gest = DynamicGestureRecognition(mode, args.file, args.max_num_hands, args.threshold)
+
+text = None # Last recognized gesture and time to display
+text_time = 0
+while cap.isOpened():
+    ret, img = cap.read()
+    if not ret:
+        break
+
+    # Feedforward to extract keypoint
+    # Note: Mirror landmark instead of flipping the frame before inference
+    param = pipe.forward(img, mirror=True)
+
+    for i, p in enumerate(param):
+        if p['class'] is None:
+            # Gesture that ended right before the hand left is reported here
+            event = gest.lost(i)
+        elif mode=='train':
+            gest.add(p['joint'], i)
+            event = []
+        else:
+            event = gest.eval(p['joint'], i)
+        for e in event:
+            text = e['label']
+            text_time = time.time()
+            print('Hand %d %s: frame %d-%d distance %.3f' % (
+                i, e['label'], e['start'], e['end'], e['distance']))
+
+    # Flip image for 3rd person view
+    img = cv2.flip(img, 1)
+
+    # Display keypoint
+    img = disp.draw2d(img, param)
+    if mode=='train' and gest.record is not None:
+        cv2.putText(img, 'Recording %s %d' % (args.label, len(gest.record)), (10,30),
+            cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)
+    if text is not None and time.time()-text_time<1.0:
+        cv2.putText(img, text, (10,30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0), 2)
+    cv2.imshow('img 2D', img)
+
+    key = cv2.waitKey(1)
+    if key==27:
+        break
+    if key==32 and mode=='train':
+        # Press spacebar to start and again to stop recording a template
+        # Note: Record a few templates of each gesture at natural speed
+        if gest.record is None:
+            gest.start()
+        elif gest.stop(args.label):
+            print('Saved template', args.label, 'total', len(gest.template))
+        else:
+            print('Template too short, discarded')
+
+pipe.pipe.close()
+cap.release()
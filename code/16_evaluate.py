@@ -0,0 +1,87 @@
+###############################################################################
+### Evaluate training data of gesture / hand ROM classifier offline
+### Input : Training data .csv e.g. gesture_train.csv, gesture_train_fy.csv
+### Output: k-fold cross validation accuracy, confusion matrix
+###         and per query latency of each classifier backend
+### Usage : python 16_evaluate.py -f ../data/gesture_train.csv
+###         python 16_evaluate.py -f ../data/handrom_train.csv -b knn,svm -k 1,3,5 -t 0.95
+###############################################################################
+
+import argparse
+import numpy as np
+
+from utils_classifier import (load_data, create_classifier, is_available,
+    measure_latency, CrossValidation, backend)
+
+
+def print_confusion(r):
+    print('Confusion matrix of %s (row: true, column: predicted)' % r['name'])
+    print('     ' + ''.join('%5d' % c for c in r['classes']))
+    for c, row in zip(r['classes'], r['confusion']):
+        print('%5d' % c + ''.join('%5d' % v if v>0 else '    .' for v in row))
+
+
+if __name__=='__main__': # Note: Required for multiprocessing on Windows/macOS
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f', '--file', nargs='+', default=['../data/gesture_train.csv'],
+        help='Training data .csv with class label in last column')
+    parser.add_argument('-b', '--backend', default=','.join(backend),
+        help='Comma separated classifier: %s' % ' / '.join(backend))
+    parser.add_argument('-k', '--k', default='1,3,5,7',
+        help='Comma separated k of knn (single.py uses 3, fan.py uses 5)')
+    parser.add_argument('-n', '--num_fold', type=int, default=5)
+    parser.add_argument('-p', '--num_proc', type=int, default=None,
+        help='Number of processes to run folds (default: number of cpu cores)')
+    parser.add_argument('-q', '--num_query', type=int, default=500,
+        help='Number of single queries to time for latency')
+    parser.add_argument('-t', '--target', type=float, default=None,
+        help='Accuracy target e.g. 0.95 to select the fastest model above it')
+    parser.add_argument('-c', '--confusion', action='store_true',
+        help='Print confusion matrix of every model instead of the selected one')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = []
+    for name in args.backend.split(','):
+        if not is_available(name):
+            print('Skip %s: not available in this OpenCV build' % name)
+            continue
+        if name.startswith('knn'):
+            config += [(name, {'k':int(k)}) for k in args.k.split(',')]
+        else:
+            config.append((name, {}))
+
+    cv = CrossValidation(args.num_fold, args.num_proc, args.seed)
+    for file in args.file:
+        x, y = load_data(file)
+        print('\n%s: %d samples, %d features, %d classes, %d-fold' % (
+            file, len(y), x.shape[1], len(np.unique(y)), args.num_fold))
+
+        # Folds run in parallel, latency is timed afterwards one model at a time
+        # in this process so that it is not disturbed by other folds
+        result = cv.run(x, y, config)
+        for r in result:
+            model = create_classifier(r['backend'], **r['kwargs'])
+            model.train(x, y)
+            r['latency'] = measure_latency(model, x, args.num_query) * 1e6 # Microsecond
+
+        print('%-24s %8s %10s %10s %10s' % ('model', 'accuracy', 'mean(us)', 'p95(us)', 'train(ms)'))
+        for r in result:
+            print('%-24s %8.3f %10.1f %10.1f %10.2f' % (r['name'], r['accuracy'],
+                np.mean(r['latency']), np.percentile(r['latency'], 95), r['train_time']*1000))
+
+        # Fastest model meeting the target, else the most accurate one
+        if args.target is not None:
+            ok = [r for r in result if r['accuracy']>=args.target]
+            if len(ok)>0:
+                best = min(ok, key=lambda r: np.mean(r['latency']))
+                print('Fastest model with accuracy >= %.3f: %s' % (args.target, best['name']))
+            else:
+                best = max(result, key=lambda r: r['accuracy'])
+                print('No model reaches accuracy %.3f, most accurate: %s' % (args.target, best['name']))
+        else:
+            best = max(result, key=lambda r: (r['accuracy'], -np.mean(r['latency'])))
+            print('Most accurate model: %s' % best['name'])
+
+        for r in (result if args.confusion else [best]):
+            print_confusion(r)
@@ -0,0 +1,82 @@
+###############################################################################
+### Condense training data of gesture / hand ROM classifier
+### Remove near-duplicate samples, then select prototypes with edited
+### nearest neighbour (drop noisy samples) and condensed nearest neighbour
+### (drop samples far from class boundary) so that KNN query is faster
+### Input : Training data .csv e.g. gesture_train.csv
+### Output: Condensed .csv and change of size, accuracy and query latency
+### Usage : python 17_condense.py -f ../data/gesture_train.csv
+###         python 17_condense.py -f ../data/gesture_train_fy.csv -d 2 -e 3 -o ../data/gesture_train_fy_small.csv
+###############################################################################
+
+import argparse
+import numpy as np
+
+from utils_classifier import (load_data, create_classifier, is_available,
+    measure_latency, condense, CrossValidation)
+
+
+if __name__=='__main__': # Note: Required for multiprocessing on Windows/macOS
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f', '--file', default='../data/gesture_train.csv',
+        help='Training data .csv with class label in last column')
+    parser.add_argument('-o', '--output', default=None,
+        help='Condensed .csv (default: input file name with _condensed)')
+    parser.add_argument('-d', '--tol', type=float, default=1.0,
+        help='Distance (degree of joint angle) below which samples are duplicates')
+    parser.add_argument('-e', '--enn', type=int, default=0,
+        help='k of edited nearest neighbour e.g. 3, 0 to disable')
+    parser.add_argument('--no_cnn', action='store_true',
+        help='Disable condensed nearest neighbour')
+    parser.add_argument('-b', '--backend', default='knn' if is_available('knn') else 'knn_np',
+        help='Classifier to compare before and after')
+    parser.add_argument('-k', '--k', type=int, default=3,
+        help='k of knn on original data and on data without condensed NN')
+    parser.add_argument('-n', '--num_fold', type=int, default=5)
+    parser.add_argument('-p', '--num_proc', type=int, default=None,
+        help='Number of processes to run folds (default: number of cpu cores)')
+    parser.add_argument('-q', '--num_query', type=int, default=500,
+        help='Number of single queries to time for latency')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dry_run', action='store_true',
+        help='Only report, do not write output')
+    args = parser.parse_args()
+
+    # Condense on scaled feature but write the original rows
+    x, y = load_data(args.file)
+    raw  = np.genfromtxt(args.file, delimiter=',', ndmin=2)
+    select = {'tol':args.tol, 'k':args.enn, 'cnn':not args.no_cnn, 'seed':args.seed}
+    keep, count = condense(x, y, **select)
+
+    print('%s: %d samples, %d classes' % (args.file, len(y), len(np.unique(y))))
+    for name, n in count.items():
+        print('  %-13s %6d samples (%5.1f%%)' % (name, n, 100*n/len(y)))
+    for c in np.unique(y):
+        print('  class %3d     %6d -> %d' % (c, np.sum(y==c), np.sum(y[keep]==c)))
+
+    # Accuracy: Each held out fold is predicted by a model trained on the
+    # full / condensed training folds, so it is never part of the prototypes
+    # Note: Condensed NN only guarantees prototypes that are consistent under 1-NN
+    #       thus knn on condensed data uses k=1
+    knn = args.backend.startswith('knn')
+    config = [(args.backend, {'k':args.k} if knn else {}),
+              (args.backend, {'k':1 if select['cnn'] else args.k} if knn else {})]
+    cv = CrossValidation(args.num_fold, args.num_proc, args.seed)
+    result = [cv.run(x, y, config[:1])[0], cv.run(x, y, config[1:], select)[0]]
+
+    # Latency of a single query with model trained on all / condensed data
+    for r, index in zip(result, (np.arange(len(y)), keep)):
+        model = create_classifier(r['backend'], **r['kwargs'])
+        model.train(x[index], y[index])
+        r['latency'] = measure_latency(model, x, args.num_query) * 1e6 # Microsecond
+
+    print('\n%d-fold %-12s %-14s %10s %10s %10s %10s' % (args.num_fold, 'data', 'model',
+        'train size', 'accuracy', 'mean(us)', 'p95(us)'))
+    for name, r in zip(('original', 'condensed'), result):
+        print('       %-12s %-14s %10.1f %10.3f %10.1f %10.1f' % (name, r['name'], r['train_size'],
+            r['accuracy'], np.mean(r['latency']), np.percentile(r['latency'], 95)))
+
+    if not args.dry_run:
+        output = args.output or args.file.replace('.csv', '_condensed.csv')
+        np.savetxt(output, raw[keep], delimiter=',', fmt='%f')
+        print('\nSaved %d samples to %s' % (len(keep), output))
@@ -0,0 +1,170 @@
+###############################################################################
+### Regression check of utility algorithms that run without camera / MediaPipe
+### Each check uses synthetic or shipped data and fails with AssertionError
+### Usage : python check_utils.py
+###         python check_utils.py spring (run only checks containing 'spring')
+###############################################################################
+
+import sys
+import numpy as np
+
+
+def check_spring():
+    # SPRING finds a template embedded in noise at the right place
+    from utils_dynamic_gesture import SpringDTW
+    rng = np.random.default_rng(0)
+    tpl = np.cumsum(rng.normal(size=(20,3)), axis=0)
+    stream = np.concatenate([rng.normal(size=(30,3))*0.1 + 10,     # Noise far from template
+        tpl + rng.normal(size=(20,3))*0.01,                          # Template at frame 30-49
+        rng.normal(size=(30,3))*0.1 + 10])
+    spring = SpringDTW([tpl], threshold=0.3)
+    match = [m for x in stream for m in spring.update(x)]
+    assert len(match)==1, match
+    k, d, ts, te = match[0]
+    assert k==0 and d<0.1 and abs(ts-30)<=1 and abs(te-49)<=1, match[0]
+
+    # Match ended but not yet reported is returned by reset instead of lost
+    spring = SpringDTW([tpl], threshold=0.3)
+    match = [m for x in stream[:50] for m in spring.update(x)]
+    match += spring.reset([0])
+    assert len(match)==1 and abs(match[0][3]-49)<=1, match
+    assert spring.reset([0])==[]
+
+    # Noise alone does not match
+    spring = SpringDTW([tpl], threshold=0.3)
+    assert not [m for x in stream[:30] for m in spring.update(x)]
+
+
+def check_tree():
+    # Batch query (gather per level) and single query (Python walk) agree
+    from utils_classifier import load_data, DecisionTree
+    x, y = load_data('../data/gesture_train.csv')
+    tree = DecisionTree()
+    tree.train(x, y)
+    batch = tree.predict(x)
+    single = np.array([tree.predict(q)[0] for q in x])
+    assert np.array_equal(batch, single)
+    assert np.mean(batch==y)>0.9 # Training accuracy of a depth 8 tree
+
+
+def check_save_load():
+    # Saved model predicts the same and keeps its training setting
+    import os, tempfile
+    from utils_classifier import (load_data, create_classifier, model_kwargs,
+        save_model, load_model, load_model_kwargs)
+    x, y = load_data('../data/gesture_train.csv')
+    with tempfile.TemporaryDirectory() as folder:
+        for name, kwargs in (('logistic', {'num_iter':200}), ('tree', {'max_depth':5})):
+            model = create_classifier(name, **kwargs)
+            model.train(x, y)
+            file = os.path.join(folder, name+'.npz')
+            save_model(model, file)
+            loaded = load_model(file)
+            assert type(loaded) is type(model)
+            assert np.array_equal(loaded.predict(x), model.predict(x)), name
+            assert np.array_equal(loaded.predict(x[0]), model.predict(x[0])), name
+            default = model_kwargs(create_classifier(name))
+            assert load_model_kwargs(file)==(name, dict(default, **kwargs)), name
+
+
+def check_condense():
+    # Near-duplicates are dropped and condensed NN keeps a consistent subset
+    from utils_classifier import load_data, condense, dedup, KnnNumpy
+    x, y = load_data('../data/gesture_train.csv')
+    rng = np.random.default_rng(0)
+    xd = np.concatenate([x, x + rng.normal(size=x.shape)*0.1]).astype(np.float32)
+    yd = np.concatenate([y, y])
+    assert np.array_equal(dedup(xd, yd, tol=1.0), np.arange(len(y))) # Copies come after originals
+
+    keep, count = condense(xd, yd, tol=1.0, k=0, cnn=True)
+    assert count['dedup']==len(y) and len(keep)<len(y)
+    assert np.array_equal(np.unique(yd[keep]), np.unique(y)) # No class removed
+    knn = KnnNumpy(1)
+    knn.train(xd[keep], yd[keep])
+    assert np.array_equal(knn.predict(xd[keep]), yd[keep])
+    assert np.array_equal(knn.predict(xd[:len(y)]), y) # Consistent on the data it condensed
+
+
+def check_memmap():
+    # Uncompressed chunk is memory-mapped from zip local header and reads
+    # the same as decompressing, including a column name that np.savez reserves
+    import os, zipfile, tempfile
+    from utils_record import (save_chunk, load_chunk, memmap_member,
+        SessionRecorder, LandmarkReader)
+    rng = np.random.default_rng(0)
+    data = {'0/keypt':rng.normal(size=(50,21,2)).astype(np.float32),
+        'file':np.arange(50), 'time':rng.normal(size=50)}
+    with tempfile.TemporaryDirectory() as folder:
+        file = os.path.join(folder, 'chunk_00000.npz')
+        save_chunk(file, data, compress=False)
+        with zipfile.ZipFile(file) as z:
+            for info in z.infolist():
+                assert info.compress_type==zipfile.ZIP_STORED
+                a = memmap_member(file, info)
+                assert isinstance(a, np.memmap)
+                assert np.array_equal(a, data[info.filename[:-4]])
+                del a # Release file before folder is removed
+        mmap  = load_chunk(file, mmap=True)
+        plain = load_chunk(file, mmap=False)
+        for k, v in data.items():
+            assert mmap[k].dtype==v.dtype and np.array_equal(mmap[k], v), k
+            assert np.array_equal(plain[k], v), k
+        del mmap
+
+        # Recorded param is overwritten in place every frame as MediaPipe class does
+        # so each row must keep its own frame and not the last one of its chunk
+        param = [{'keypt':np.zeros((21,2)), 'class':None}]
+        recorder = SessionRecorder(os.path.join(folder, 'session'), chunk_size=4)
+        for i in range(10):
+            param[0]['keypt'][:] = i
+            param[0]['class'] = 'Left' if i%2 else None
+            recorder.record(param, timestamp=i)
+        recorder.close()
+        reader = LandmarkReader(os.path.join(folder, 'session'))
+        assert len(reader)==10 and len(reader.meta['chunks'])==3
+        keypt = reader.column('0/keypt')
+        assert isinstance(keypt, np.ndarray) and keypt.shape==(10,21,2)
+        assert np.array_equal(keypt[:,0,0], np.arange(10)), keypt[:,0,0]
+        assert np.array_equal(reader.column('frame'), np.arange(10))
+        assert [str(c) for c in reader.column('0/class')]==['', 'Left']*5
+        del reader, keypt
+
+
+def check_batch():
+    # Each image of a batch keeps its own result although the pipe
+    # overwrites its param in place as MediaPipe class does
+    import os, cv2, tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    import utils_batch
+
+    class FakePipe:
+        def __init__(self):
+            self.param = [{'keypt':np.zeros((21,2)), 'class':None}]
+
+        def forward(self, img):
+            self.param[0]['keypt'][:] = img[0,0,0]
+            return self.param
+
+    with tempfile.TemporaryDirectory() as folder:
+        files = []
+        for i in range(4):
+            files.append(os.path.join(folder, '%d.png' % i))
+            cv2.imwrite(files[-1], np.full((8,6,3), i*10, np.uint8))
+
+        utils_batch.worker_pipe   = FakePipe()
+        utils_batch.worker_thread = ThreadPoolExecutor(2)
+        rows = utils_batch.process_batch(files)
+        utils_batch.worker_thread.shutdown()
+
+    assert [r['file'] for r in rows]==files
+    assert [r['0/keypt'][0,0] for r in rows]==[0, 10, 20, 30], [r['0/keypt'][0,0] for r in rows]
+    assert all(r['height']==8 and r['width']==6 for r in rows)
+
+
+if __name__=='__main__':
+    check = [(k, v) for k, v in sorted(globals().items()) if k.startswith('check_')]
+    if len(sys.argv)>1:
+        check = [(k, v) for k, v in check if any(a in k for a in sys.argv[1:])]
+    for name, func in check:
+        func()
+        print('%-20s ok' % name)
@@ -0,0 +1,165 @@
+###############################################################################
+### Asynchronous dispatch of actuator command e.g. dynamikontrol motor
+### Command is sent from a background thread so that serial latency
+### does not stall the video loop, only the latest command is kept
+### (coalescing) and the command rate is limited
+###############################################################################
+
+import time
+import threading
+
+
+class MockMotor:
+    def __init__(self, latency=0.0):
+        # Same interface as dynamikontrol Module().motor for testing without hardware
+
+        # latency:
+        #   Delay (s) of each command to simulate slow serial link
+
+        self.latency = latency
+        self.history = [] # List of (time, command, value)
+
+
+    def speed(self, value):
+        time.sleep(self.latency)
+        self.history.append((time.time(), 'speed', value))
+
+
+    def stop(self):
+        time.sleep(self.latency)
+        self.history.append((time.time(), 'stop', None))
+
+
+class MockModule:
+    def __init__(self, latency=0.0):
+        # Same interface as dynamikontrol Module()
+        self.motor = MockMotor(latency)
+
+
+    def disconnect(self):
+        pass
+
+
+class ActuatorDispatcher:
+    def __init__(self, target, max_rate=10, timeout=0.5, verbose=True):
+        # target:
+        #   Object whose method is called e.g. module.motor
+        #   Calling dispatcher.speed(1000) sends target.speed(1000) in background
+
+        # max_rate:
+        #   Maximum number of commands per second, None or <=0 for no limit
+
+        # timeout:
+        #   Command taking longer than this (s) is counted as timeout
+        #   Note: A blocking serial call cannot be interrupted,
+        #   new command is coalesced while waiting for it to return
+
+        self.target   = target
+        self.period   = 0 if max_rate is None or max_rate<=0 else 1.0/max_rate
+        self.timeout  = timeout
+        self.verbose  = verbose
+
+        self.pending  = None # Latest command (name, args) not yet sent
+        self.closed   = False
+        self.busy     = False
+        self.cond     = threading.Condition()
+        self.last_time = 0
+
+        self.num_submit  = 0
+        self.num_sent    = 0
+        self.num_drop    = 0 # Overwritten by a newer command before being sent
+        self.num_timeout = 0
+        self.num_error   = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def submit(self, name, *args):
+        # Queue command without blocking, replace any pending command
+        with self.cond:
+            if self.closed:
+                raise RuntimeError('Dispatcher is closed')
+            if self.pending is not None:
+                self.num_drop += 1
+            self.pending = (name, args)
+            self.num_submit += 1
+            self.cond.notify_all()
+
+
+    def __getattr__(self, name):
+        # Forward method of target e.g. dispatcher.speed(value) / dispatcher.stop()
+        # Note: Get target from __dict__ as self.target would call __getattr__
+        #       again and recurse forever if it is not set yet
+        if name.startswith('_') or not callable(getattr(self.__dict__.get('target'), name, None)):
+            raise AttributeError(name)
+        return lambda *args: self.submit(name, *args)
+
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.pending is None and not self.closed:
+                    self.cond.wait()
+                if self.pending is None and self.closed:
+                    return
+
+                # Limit command rate, newer command may replace pending while waiting
+                delay = self.last_time + self.period - time.time()
+                while delay>0 and not self.closed:
+                    self.cond.wait(delay)
+                    delay = self.last_time + self.period - time.time()
+
+                name, args = self.pending
+                self.pending = None
+                self.busy = True
+
+            start = time.time()
+            try:
+                getattr(self.target, name)(*args)
+                self.num_sent += 1
+            except Exception as e:
+                self.num_error += 1
+                if self.verbose:
+                    print('Actuator command %s%s failed: %s' % (name, args, e))
+            elapsed = time.time() - start
+
+            if self.timeout is not None and elapsed>self.timeout:
+                self.num_timeout += 1
+                if self.verbose:
+                    print('Actuator command %s%s took %.2f s' % (name, args, elapsed))
+
+            with self.cond:
+                self.last_time = time.time()
+                self.busy = False
+                self.cond.notify_all()
+
+
+    def flush(self, timeout=None):
+        # Block until pending command is sent, return False on timeout
+        end = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while self.pending is not None or self.busy:
+                remain = None if end is None else end - time.time()
+                if remain is not None and remain<=0:
+                    return False
+                self.cond.wait(remain)
+        return True
+
+
+    def close(self, timeout=1.0):
+        # Send pending command then stop the thread
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
+
+
+    def stats(self):
+        return {
+            'submit' : self.num_submit,
+            'sent'   : self.num_sent,
+            'drop'   : self.num_drop,
+            'timeout': self.num_timeout,
+            'error'  : self.num_error,
+        }
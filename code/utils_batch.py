@@ -0,0 +1,132 @@
+###############################################################################
+### Batch processing of still images with MediaPipe in static image mode
+### Images are decoded by a pool of threads and sharded across a pool of
+### processes, each process holding its own MediaPipe instance
+###############################################################################
+
+import cv2
+import time
+import numpy as np
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from utils_cache import param_to_array
+
+
+# Global variable of each worker process
+worker_pipe   = None
+worker_thread = None
+worker_flip   = False
+
+
+def create_pipe(mode, max_num=1, model_complexity=1):
+    # Create MediaPipe class in static image mode
+    # Note: Import here so that parent process does not load MediaPipe
+    from utils_mediapipe import MediaPipeFace, MediaPipeHand, MediaPipeBody, MediaPipeHolistic
+
+    if mode=='face':
+        return MediaPipeFace(static_image_mode=True, max_num_faces=max_num)
+    elif mode=='hand':
+        return MediaPipeHand(static_image_mode=True, max_num_hands=max_num)
+    elif mode=='body':
+        return MediaPipeBody(static_image_mode=True, model_complexity=model_complexity)
+    elif mode=='holistic':
+        return MediaPipeHolistic(static_image_mode=True, model_complexity=model_complexity)
+    raise ValueError('Undefined mode only the following modes are available: face / hand / body / holistic')
+
+
+def init_worker(mode, max_num, model_complexity, num_thread, flip):
+    global worker_pipe, worker_thread, worker_flip
+    # Avoid oversubscribing cores as each process already runs its own MediaPipe
+    cv2.setNumThreads(1)
+    worker_pipe   = create_pipe(mode, max_num, model_complexity)
+    worker_thread = ThreadPoolExecutor(num_thread)
+    worker_flip   = flip
+
+
+def process_batch(files):
+    # Decode images in parallel threads (cv2.imread releases the GIL)
+    # then feedforward one by one through MediaPipe
+    rows = []
+    for file, img in zip(files, worker_thread.map(cv2.imread, files)):
+        if img is None: continue # Skip unreadable file
+        if worker_flip:
+            img = cv2.flip(img, 1)
+        param = worker_pipe.forward(img)
+
+        # Copy as MediaPipe class overwrites its param in place for the next image
+        row = {k: np.array(v, copy=True) for k, v in param_to_array(param).items()}
+        row['file']   = file
+        row['height'] = img.shape[0]
+        row['width']  = img.shape[1]
+        rows.append(row)
+
+    return rows
+
+
+class BatchProcessor:
+    def __init__(self, mode='hand', max_num=1, model_complexity=1,
+        num_proc=None, num_thread=4, batch_size=32, flip=False):
+        # mode:
+        #   face / hand / body / holistic
+
+        # max_num:
+        #   Maximum number of faces/hands to detect
+
+        # num_proc:
+        #   Number of processes each with its own MediaPipe instance
+        #   Default to number of cpu cores, set to 1 to run in this process
+
+        # num_thread:
+        #   Number of threads per process to decode images
+
+        # batch_size:
+        #   Number of images sent to a process at a time
+
+        self.mode       = mode
+        self.num_proc   = multiprocessing.cpu_count() if num_proc is None else num_proc
+        self.batch_size = batch_size
+        self.initargs   = (mode, max_num, model_complexity, num_thread, flip)
+        self.setting    = {'mode':mode, 'max_num':max_num,
+            'model_complexity':model_complexity, 'flip':flip}
+
+
+    def run(self, files, writer=None, verbose=True):
+        # Process list of image files and stream result to writer in order
+        # Return number of images processed
+        batches = [files[i:i+self.batch_size] for i in range(0, len(files), self.batch_size)]
+
+        count = 0
+        start = time.time()
+        if self.num_proc<=1:
+            init_worker(*self.initargs)
+            results = map(process_batch, batches)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(self.num_proc, init_worker, self.initargs)
+            results = pool.imap(process_batch, batches)
+
+        try:
+            for rows in results:
+                for row in rows:
+                    if writer is not None:
+                        writer.append(row)
+                count += len(rows)
+                if verbose:
+                    elapsed = time.time() - start
+                    print('Processed %d/%d images %.1f img/s' % (count, len(files), count/elapsed), end='\r')
+        except BaseException:
+            if pool is not None:
+                pool.terminate() # Do not wait for remaining batches
+            raise
+        else:
+            if pool is not None:
+                pool.close()
+        finally:
+            if pool is not None:
+                pool.join()
+
+        if verbose:
+            print()
+
+        return count
@@ -0,0 +1,167 @@
+###############################################################################
+### On-disk cache of MediaPipe result for static image mode
+### Key  : Hash of image content + model setting
+### Value: Decoded param arrays (keypt, joint, joint_3d, angle, etc.)
+### Re-running analysis over the same images will skip inference entirely
+###############################################################################
+
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+
+def param_to_array(param, prefix='', skip=('gesture','fps')):
+    # Flatten nested list/tuple/dict of param into a flat dict of arrays
+    # e.g. [{'keypt':..., 'class':'Left'}] -> {'0/keypt':..., '0/class':'Left'}
+    # Note: Keys in skip are not produced by MediaPipe thus not stored
+    out = {}
+    if isinstance(param, dict):
+        items = param.items()
+    else:
+        items = enumerate(param)
+
+    for k, v in items:
+        if k in skip: continue
+        key = prefix + str(k)
+        if isinstance(v, (dict, list, tuple)):
+            out.update(param_to_array(v, key+'/', skip))
+        elif v is None:
+            out[key] = np.array('') # Empty string to denote None e.g. no hand class
+        else:
+            out[key] = np.asarray(v)
+
+    return out
+
+
+def array_to_value(a, prev=None):
+    # Convert stored array back to the value type used in param
+    if a.dtype.kind=='U':
+        s = str(a)
+        return s if s!='' else None
+    if a.ndim==0:
+        return a.item() # bool / int / float
+    if isinstance(prev, np.ndarray) and prev.shape==a.shape:
+        prev[...] = a # Overwrite in place to keep reference held by caller
+        return prev
+    return np.array(a)
+
+
+def array_to_param(array, param):
+    # Reverse of param_to_array, overwrite values of param in place
+    for key, a in array.items():
+        keys = key.split('/')
+        p = param
+        for k in keys[:-1]:
+            p = p[int(k)] if isinstance(p, (list, tuple)) else p[k]
+        k = keys[-1]
+        if isinstance(p, (list, tuple)):
+            k = int(k)
+            p[k] = array_to_value(a, p[k])
+        else:
+            p[k] = array_to_value(a, p.get(k))
+
+    return param
+
+
+class LandmarkCache:
+    def __init__(self, folder='../data/cache/', max_entries=100000, max_bytes=1<<30):
+        # folder:
+        #   Folder to store one .npz file per cached image
+
+        # max_entries / max_bytes:
+        #   Size limit of the cache, least recently used entries are
+        #   removed once either of the limit is exceeded
+
+        self.folder      = folder
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        os.makedirs(folder, exist_ok=True)
+
+        # Index of cached entry {key: size in bytes} from least to most recently used
+        # Rebuilt from the folder (sorted by access time once) so that cache persists across runs
+        entry = []
+        for f in os.listdir(folder):
+            if f.endswith('.npz'):
+                stat = os.stat(os.path.join(folder, f))
+                entry.append((stat.st_mtime, f[:-4], stat.st_size))
+        self.index = OrderedDict((k, size) for _, k, size in sorted(entry))
+        self.total_bytes = sum(self.index.values())
+
+        self.hit  = 0
+        self.miss = 0
+
+
+    def get_key(self, img, setting):
+        # Hash of image content and model setting
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps(setting, sort_keys=True).encode())
+        h.update(str(img.shape).encode())
+        h.update(str(img.dtype).encode())
+        h.update(np.ascontiguousarray(img).data)
+
+        return h.hexdigest()
+
+
+    def get_file(self, key):
+        return os.path.join(self.folder, key+'.npz')
+
+
+    def load(self, img, setting, param):
+        # Return True and overwrite param if image is cached
+        key = self.get_key(img, setting)
+        if key not in self.index:
+            self.miss += 1
+            return False
+
+        try:
+            with np.load(self.get_file(key)) as data:
+                array_to_param(dict(data), param)
+        except (OSError, ValueError, KeyError, IndexError):
+            # Corrupted or outdated entry, treat as cache miss
+            self.remove(key)
+            self.miss += 1
+            return False
+
+        # Update access time for LRU, file time keeps the order for next run
+        now = time.time()
+        os.utime(self.get_file(key), (now, now))
+        self.index.move_to_end(key)
+        self.hit += 1
+
+        return True
+
+
+    def save(self, img, setting, param):
+        key  = self.get_key(img, setting)
+        file = self.get_file(key)
+        np.savez(file, **param_to_array(param))
+
+        size = os.path.getsize(file)
+        if key in self.index:
+            self.total_bytes -= self.index[key]
+        self.index[key] = size
+        self.index.move_to_end(key)
+        self.total_bytes += size
+
+        self.evict()
+
+
+    def remove(self, key):
+        if key in self.index:
+            self.total_bytes -= self.index.pop(key)
+        try:
+            os.remove(self.get_file(key))
+        except OSError:
+            pass
+
+
+    def evict(self):
+        # Remove least recently used entries until within size limit
+        # Note: Index is kept in LRU order so that no sort is needed per save
+        while len(self.index)>self.max_entries or self.total_bytes>self.max_bytes:
+            key, size = self.index.popitem(last=False)
+            self.total_bytes -= size
+            self.remove(key) # Delete file only as key is no longer in index
@@ -0,0 +1,319 @@
+###############################################################################
+### Offline censoring of recorded video at high throughput
+### Video is split into segments which are processed by a pool of workers
+### Each worker runs a pipeline of 3 stages linked by bounded queues:
+###   decode thread -> hand inference (frame skipping + tracking) -> encode thread
+### so memory stays constant however long the video is
+### Finished segments are logged in a manifest so that an interrupted job
+### resumes from the segments not yet written
+###############################################################################
+
+import os
+import cv2
+import json
+import time
+import queue
+import shutil
+import threading
+import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils_privacy import PrivacyFilter, FaceAnonymizer, keypt_to_box
+from utils_schedule import AdaptiveScheduler
+
+
+def video_info(file):
+    cap = cv2.VideoCapture(file)
+    if not cap.isOpened():
+        raise ValueError('Cannot open video %s' % file)
+    info = {
+        'frames': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        'fps'   : cap.get(cv2.CAP_PROP_FPS) or 30.0,
+        'width' : int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+    cap.release()
+    return info
+
+
+def decode_segment(file, start, stop, out):
+    # Put frame [start, stop) into bounded queue, None marks the end
+    # Note: Seeking is exact for most intra-coded / mp4 files
+    #       but may land on a nearby key frame for some codecs
+    cap = cv2.VideoCapture(file)
+    try:
+        if start>0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for i in range(start, stop):
+            ret, img = cap.read()
+            if not ret: break
+            out.put(img) # Block when inference falls behind
+    finally:
+        cap.release()
+        out.put(None)
+
+
+def encode_segment(file, fourcc, fps, size, inp, error):
+    # Write frame from bounded queue until None
+    writer = cv2.VideoWriter(file, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    try:
+        if not writer.isOpened():
+            raise IOError('Cannot open video writer %s' % file)
+        while True:
+            img = inp.get()
+            if img is None: break
+            writer.write(img)
+    except Exception as e:
+        error.append(e)
+        while inp.get() is not None: pass # Unblock inference
+    finally:
+        writer.release()
+
+
+def concat_segment(files, output, fourcc, fps, size):
+    # Join segments without re-encoding if ffmpeg is available
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is not None:
+        lst = output + '.txt'
+        with open(lst, 'w') as f:
+            for file in files:
+                f.write("file '%s'\n" % os.path.abspath(file).replace("'", "'\\''"))
+        ret = subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat',
+            '-safe', '0', '-i', lst, '-c', 'copy', output])
+        os.remove(lst)
+        if ret.returncode==0:
+            return
+
+    # Otherwise decode and encode again with OpenCV
+    writer = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    for file in files:
+        cap = cv2.VideoCapture(file)
+        while True:
+            ret, img = cap.read()
+            if not ret: break
+            writer.write(img)
+        cap.release()
+    writer.release()
+
+
+class VideoCensor:
+    def __init__(self, gesture_file='../data/gesture_train_fy.csv', target=(11,),
+        max_num_hands=2, max_num_faces=0, method='pixelate', block=16,
+        max_skip=2, segment=300, num_worker=None, queue_size=8, fourcc='mp4v'):
+        # gesture_file / target:
+        #   Training data of KNN and class label of gesture to be censored
+        #   Default to middle finger of fy_filter.py
+
+        # max_num_faces:
+        #   Also anonymize up to this many faces, 0 to disable
+
+        # method / block:
+        #   Setting of PrivacyFilter
+
+        # max_skip:
+        #   Maximum number of consecutive frames without inference
+        #   Landmark is extrapolated and gesture is reused on skipped frames
+
+        # segment:
+        #   Number of frames per segment, unit of parallel work and of resume
+
+        # num_worker:
+        #   Number of segments processed at the same time, each with its own MediaPipe
+        #   Note: Threads are used as MediaPipe and OpenCV release the GIL
+        #   while running, this also works from a script without __main__ guard
+
+        # queue_size:
+        #   Maximum number of frames waiting between two stages of a worker
+
+        self.target        = set(target)
+        self.max_num_hands = max_num_hands
+        self.max_num_faces = max_num_faces
+        self.method        = method
+        self.block         = block
+        self.max_skip      = max_skip
+        self.segment       = segment
+        self.num_worker    = num_worker or max(1, (os.cpu_count() or 2)//2)
+        self.queue_size    = queue_size
+        self.fourcc        = fourcc
+        self.abort         = threading.Event() # Stop running segments on interrupt
+
+        file = np.genfromtxt(gesture_file, delimiter=',')
+        self.angle = file[:,:-1].astype(np.float32)
+        self.label = file[:, -1].astype(np.float32)
+
+        # Setting of output, resume only if it is unchanged
+        self.setting = {'gesture_file':os.path.basename(gesture_file), 'target':sorted(self.target),
+            'max_num_hands':max_num_hands, 'max_num_faces':max_num_faces,
+            'method':method, 'block':block, 'max_skip':max_skip, 'fourcc':fourcc}
+
+
+    def create_model(self):
+        # Each worker has its own model as MediaPipe graph and KNN are not shared
+        # Note: Import here so that VideoCensor can be created without MediaPipe
+        from utils_mediapipe import MediaPipeHand, MediaPipeFace
+        hand = AdaptiveScheduler(MediaPipeHand(static_image_mode=False,
+            max_num_hands=self.max_num_hands), max_skip=self.max_skip)
+        face = None
+        if self.max_num_faces>0:
+            face = AdaptiveScheduler(MediaPipeFace(static_image_mode=False,
+                max_num_faces=self.max_num_faces), max_skip=self.max_skip)
+        knn = cv2.ml.KNearest_create()
+        knn.train(self.angle, cv2.ml.ROW_SAMPLE, self.label)
+        return hand, face, knn
+
+
+    def process_segment(self, file, index, start, stop, folder, info):
+        # Censor frame [start, stop) of video into its own segment file
+        # Model is created per segment so that tracking does not cross a seek
+        # and a resumed job gives the same output
+        if self.abort.is_set():
+            return None
+        hand, face, knn = self.create_model()
+        censor = PrivacyFilter(method=self.method, block=self.block)
+        anon   = FaceAnonymizer(method=self.method, block=self.block)
+
+        name = 'seg_%05d.mp4' % index
+        part = os.path.join(folder, 'part_%05d.mp4' % index) # Renamed once complete
+        decoded = queue.Queue(self.queue_size)
+        encoded = queue.Queue(self.queue_size)
+        error   = []
+        decoder = threading.Thread(target=decode_segment, args=(file, start, stop, decoded), daemon=True)
+        encoder = threading.Thread(target=encode_segment, args=(part, self.fourcc,
+            info['fps'], (info['width'], info['height']), encoded, error), daemon=True)
+        decoder.start()
+        encoder.start()
+
+        count = 0
+        flag  = [] # Whether each hand is censored
+        t = time.time()
+        try:
+            while not self.abort.is_set():
+                img = decoded.get()
+                if img is None: break
+
+                param = hand.forward(img)
+                if hand.ran:
+                    # Classify detected hands at once, reused on skipped frames
+                    detect = np.array([p['class'] is not None for p in param])
+                    flag = np.zeros(len(param), dtype=bool)
+                    if np.any(detect):
+                        angle = np.stack([p['angle'] for p in param])[detect].astype(np.float32)
+                        ret, results, neighbours, dist = knn.findNearest(angle, 3)
+                        flag[detect] = [int(r[0]) in self.target for r in results]
+
+                keypt = [p['keypt'] for p, f in zip(param, flag) if f and p['class'] is not None]
+                censor.forward(img, keypt_to_box(keypt, img.shape, margin=0.05))
+                if face is not None:
+                    anon.forward(img, face.forward(img))
+
+                encoded.put(img) # Block when encoder falls behind
+                count += 1
+        finally:
+            encoded.put(None)
+            # Drain decoder so that it does not block forever on error
+            while decoder.is_alive():
+                try:
+                    decoded.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            encoder.join()
+            hand.pipe.pipe.close()
+            if face is not None:
+                face.pipe.pipe.close()
+
+        if len(error)>0:
+            raise error[0]
+        if self.abort.is_set():
+            return None # Unfinished part is redone on resume
+        os.replace(part, os.path.join(folder, name))
+
+        return {'index':index, 'file':name, 'start':start, 'stop':start+count,
+            'infer':hand.num_infer, 'time':time.time()-t}
+
+
+    def load_manifest(self, folder, file, info):
+        # Return manifest of previous run of the same job, else a new one
+        path = os.path.join(folder, 'manifest.json')
+        manifest = {'source':os.path.abspath(file), 'frames':info['frames'],
+            'segment':self.segment, 'setting':self.setting, 'done':{}}
+        if os.path.isfile(path):
+            with open(path) as f:
+                prev = json.load(f)
+            if all(prev.get(k)==manifest[k] for k in ('source','frames','segment','setting')):
+                # Keep only segments whose file still exists
+                manifest['done'] = {k: v for k, v in prev['done'].items()
+                    if os.path.isfile(os.path.join(folder, v['file']))}
+            else:
+                print('Setting changed, previous segments in %s are discarded' % folder)
+        return manifest
+
+
+    def write_manifest(self, folder, manifest):
+        # Rewritten after every segment so that it survives interruption
+        path = os.path.join(folder, 'manifest.json')
+        with open(path+'.tmp', 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(path+'.tmp', path)
+
+
+    def run(self, file, output, keep=False, verbose=True):
+        # file  : Input video file
+        # output: Output video file, segments are kept in output+'.parts' until done
+        # keep  : Keep segment folder after joining into output
+        # Return dict of statistics
+        info   = video_info(file)
+        if info['frames']<=0:
+            raise ValueError('Unknown number of frames in %s' % file)
+        folder = output + '.parts'
+        os.makedirs(folder, exist_ok=True)
+        manifest = self.load_manifest(folder, file, info)
+        self.write_manifest(folder, manifest)
+
+        num_seg = -(-info['frames']//self.segment)
+        task = [(i, i*self.segment, min((i+1)*self.segment, info['frames']))
+            for i in range(num_seg) if str(i) not in manifest['done']]
+        if verbose and len(task)<num_seg:
+            print('Resume %d/%d segments already done' % (num_seg-len(task), num_seg))
+
+        count = 0
+        infer = 0
+        start = time.time()
+        future = []
+        executor = ThreadPoolExecutor(self.num_worker)
+        self.abort.clear()
+        try:
+            future = [executor.submit(self.process_segment, file, i, s, e, folder, info)
+                for i, s, e in task]
+            for f in as_completed(future):
+                seg = f.result()
+                if seg is None: continue
+                manifest['done'][str(seg['index'])] = seg
+                self.write_manifest(folder, manifest)
+
+                count += seg['stop'] - seg['start']
+                infer += seg['infer']
+                if verbose:
+                    elapsed = time.time() - start
+                    print('Segment %d/%d done, %d frames %.1f fps (inference on %.0f%% of frames)' % (
+                        len(manifest['done']), num_seg, count, count/elapsed, 100*infer/max(count, 1)), end='\r')
+        except BaseException:
+            # Stop remaining segments, manifest keeps the finished ones
+            self.abort.set()
+            for f in future:
+                f.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=True)
+        if verbose:
+            print()
+
+        if len(manifest['done'])<num_seg:
+            raise RuntimeError('%d segments not finished, run again to resume' % (num_seg-len(manifest['done'])))
+        files = [os.path.join(folder, manifest['done'][str(i)]['file']) for i in range(num_seg)]
+        concat_segment(files, output, self.fourcc, info['fps'], (info['width'], info['height']))
+        if not keep:
+            shutil.rmtree(folder)
+
+        elapsed = time.time() - start
+        return {'frames':count, 'infer':infer, 'time':elapsed, 'fps':count/max(elapsed, 1e-6)}
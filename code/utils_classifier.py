@@ -0,0 +1,572 @@
+###############################################################################
+### Classifier backends for gesture / hand ROM training data (.csv)
+### All backends share the same interface:
+###   train(x, y) with x [n,m] float32 feature and y [n] int label
+###   predict(x)  with x [n,m] return [n] int label
+### and k-fold cross validation which runs folds on a pool of processes
+### Used by 16_evaluate.py to pick the fastest model that is accurate enough
+### Training data can be condensed (dedup / edited NN / condensed NN)
+### to fewer prototypes so that KNN query time goes down, see 17_condense.py
+### LogisticRegression and DecisionTree are NumPy models whose query cost
+### does not grow with training data and can be saved to a small .npz file
+### OpenSetThreshold rejects queries far from training data of predicted class
+###############################################################################
+
+import cv2
+import json
+import time
+import inspect
+import multiprocessing
+import numpy as np
+
+from utils_joint_angle import feature_version, feature_weight
+
+
+def load_data(file):
+    # Load .csv of feature with class label in last column
+    # Extended hand feature (see utils_joint_angle.py) is scaled as in HandRomRecognition
+    # Return x [n,m] float32 and y [n] int
+    data = np.genfromtxt(file, delimiter=',', ndmin=2)
+    x = data[:,:-1].astype(np.float32)
+    y = data[:, -1].astype(int)
+    v = feature_version(x.shape[1])
+    if v is not None:
+        x *= feature_weight(v)
+    return x, y
+
+
+class KnnOpenCV:
+    # Same KNN as the demos e.g. single.py (k=3) and fan.py (k=5)
+    def __init__(self, k=3):
+        self.k = k
+
+
+    def train(self, x, y):
+        self.knn = cv2.ml.KNearest_create()
+        self.knn.train(np.float32(x), cv2.ml.ROW_SAMPLE, np.float32(y))
+
+
+    def predict(self, x):
+        ret, results, neighbours, dist = self.knn.findNearest(np.float32(x), self.k)
+        return results[:,0].astype(int)
+
+
+class KnnNumpy:
+    # Brute force KNN with one matrix product for all queries
+    # Tie of vote is broken by the nearest neighbour
+    def __init__(self, k=3):
+        self.k = k
+
+
+    def train(self, x, y):
+        self.x = np.float32(x)
+        self.y = np.asarray(y, dtype=int)
+        self.xx = np.sum(self.x*self.x, axis=1) # Precompute squared norm of training data
+        self.classes, self.index = np.unique(self.y, return_inverse=True)
+
+
+    def predict(self, x):
+        x = np.float32(x).reshape(-1, self.x.shape[1])
+        k = min(self.k, len(self.x))
+        dist = self.xx[None,:] - 2 * x @ self.x.T # [n,N] squared distance without |x|^2
+        near = np.argpartition(dist, k-1, axis=1)[:,:k]
+        near = np.take_along_axis(near, np.argsort(np.take_along_axis(dist, near, axis=1), axis=1), axis=1)
+        vote = np.zeros((len(x), len(self.classes)))
+        np.add.at(vote, (np.arange(len(x))[:,None], self.index[near]), k+1)
+        vote[np.arange(len(x)), self.index[near[:,0]]] += 1 # Tie break
+        return self.classes[np.argmax(vote, axis=1)]
+
+
+class NearestCentroid:
+    # Nearest mean of each class, constant cost however large the training data
+    def train(self, x, y):
+        y = np.asarray(y, dtype=int)
+        self.classes = np.unique(y)
+        self.center = np.stack([np.mean(x[y==c], axis=0) for c in self.classes]).astype(np.float32)
+
+
+    def predict(self, x):
+        x = np.float32(x).reshape(-1, self.center.shape[1])
+        dist = np.sum(self.center*self.center, axis=1)[None,:] - 2 * x @ self.center.T
+        return self.classes[np.argmin(dist, axis=1)]
+
+
+class SvmOpenCV:
+    # RBF SVM on standardized feature
+    def __init__(self, C=10, gamma=None):
+        self.C = C
+        self.gamma = gamma
+
+
+    def train(self, x, y):
+        self.mean = np.mean(x, axis=0)
+        self.std  = np.maximum(np.std(x, axis=0), 1e-6)
+        self.svm = cv2.ml.SVM_create()
+        self.svm.setType(cv2.ml.SVM_C_SVC)
+        self.svm.setKernel(cv2.ml.SVM_RBF)
+        self.svm.setC(self.C)
+        self.svm.setGamma(self.gamma or 1.0/x.shape[1])
+        self.svm.train(np.float32((x-self.mean)/self.std), cv2.ml.ROW_SAMPLE, np.int32(y))
+
+
+    def predict(self, x):
+        x = np.float32((np.reshape(x, (-1, len(self.mean)))-self.mean)/self.std)
+        return self.svm.predict(x)[1][:,0].astype(int)
+
+
+class RTreesOpenCV:
+    # Random forest
+    def __init__(self, num_tree=50, max_depth=10):
+        self.num_tree = num_tree
+        self.max_depth = max_depth
+
+
+    def train(self, x, y):
+        self.tree = cv2.ml.RTrees_create()
+        self.tree.setMaxDepth(self.max_depth)
+        self.tree.setTermCriteria((cv2.TERM_CRITERIA_MAX_ITER, self.num_tree, 0))
+        self.tree.train(np.float32(x), cv2.ml.ROW_SAMPLE, np.int32(y))
+
+
+    def predict(self, x):
+        return self.tree.predict(np.float32(x).reshape(-1, self.tree.getVarCount()))[1][:,0].astype(int)
+
+
+class LogisticRegression:
+    # Multinomial logistic regression trained by full batch gradient descent
+    # Standardization is folded into weight after training so that
+    # a query is a single [m,c] matrix product
+    def __init__(self, l2=1e-3, num_iter=500, lr=1.0):
+        self.l2 = l2
+        self.num_iter = num_iter
+        self.lr = lr
+
+
+    def train(self, x, y):
+        x = np.float64(x)
+        self.classes, index = np.unique(y, return_inverse=True)
+        mean = np.mean(x, axis=0)
+        std  = np.maximum(np.std(x, axis=0), 1e-6)
+        z = (x - mean) / std
+        onehot = np.eye(len(self.classes))[index]
+
+        w = np.zeros((x.shape[1], len(self.classes)))
+        b = np.zeros(len(self.classes))
+        for i in range(self.num_iter):
+            logit = z @ w + b
+            logit -= np.max(logit, axis=1, keepdims=True)
+            prob = np.exp(logit)
+            prob /= np.sum(prob, axis=1, keepdims=True)
+            grad = (prob - onehot) / len(z)
+            w -= self.lr * (z.T @ grad + self.l2 * w)
+            b -= self.lr * np.sum(grad, axis=0)
+
+        self.weight = np.float32(w / std[:,None])
+        self.bias   = np.float32(b - (mean / std) @ w)
+
+
+    def predict_proba(self, x):
+        logit = np.float32(x).reshape(-1, len(self.weight)) @ self.weight + self.bias
+        prob = np.exp(logit - np.max(logit, axis=1, keepdims=True))
+        return prob / np.sum(prob, axis=1, keepdims=True)
+
+
+    def predict(self, x):
+        logit = np.float32(x).reshape(-1, len(self.weight)) @ self.weight + self.bias
+        return self.classes[np.argmax(logit, axis=1)]
+
+
+    def state(self):
+        return {'classes':self.classes, 'weight':self.weight, 'bias':self.bias}
+
+
+class DecisionTree:
+    # CART with Gini impurity, nodes are stored in flat arrays so that
+    # a batch of queries walks the tree with one gather per level
+    def __init__(self, max_depth=8, min_leaf=2):
+        self.max_depth = max_depth
+        self.min_leaf = min_leaf
+
+
+    def best_split(self, x, index):
+        # Return (feature, threshold) of split with lowest Gini impurity or None
+        n = len(index)
+        best = (np.inf, None, None)
+        for f in range(x.shape[1]):
+            order = np.argsort(x[:,f], kind='stable')
+            v = x[order,f]
+            count = np.cumsum(index[order], axis=0) # [n,c] class count left of split
+            left  = np.arange(1, n+1)[:,None]
+            gini_l = 1 - np.sum((count/left)**2, axis=1)
+            right = count[-1] - count
+            nr = (n - left[:,0])
+            gini_r = 1 - np.sum((right/np.maximum(nr, 1)[:,None])**2, axis=1)
+            cost = (left[:,0]*gini_l + nr*gini_r) / n
+            # Only split between distinct values leaving min_leaf on each side
+            valid = np.zeros(n, dtype=bool)
+            valid[self.min_leaf-1:n-self.min_leaf] = True
+            valid[:-1] &= v[:-1]<v[1:]
+            valid[-1] = False
+            if not np.any(valid):
+                continue
+            i = np.flatnonzero(valid)[np.argmin(cost[valid])]
+            if cost[i]<best[0]:
+                best = (cost[i], f, (v[i]+v[i+1])/2)
+        return best[1:] if best[1] is not None else None
+
+
+    def train(self, x, y):
+        x = np.float32(x)
+        self.classes, index = np.unique(y, return_inverse=True)
+        onehot = np.eye(len(self.classes))[index]
+        feature, threshold, left, right, label = [], [], [], [], []
+
+        def add_node(sample, depth):
+            node = len(feature)
+            count = np.sum(onehot[sample], axis=0)
+            feature.append(-1); threshold.append(0); left.append(node); right.append(node)
+            label.append(np.argmax(count))
+            if depth>=self.max_depth or len(sample)<2*self.min_leaf or np.max(count)==len(sample):
+                return node # Leaf points to itself
+            split = self.best_split(x[sample], onehot[sample])
+            if split is None:
+                return node
+            f, t = split
+            feature[node], threshold[node] = f, t
+            mask = x[sample,f]<=t
+            left[node]  = add_node(sample[mask], depth+1)
+            right[node] = add_node(sample[~mask], depth+1)
+            return node
+
+        add_node(np.arange(len(y)), 0)
+        self.feature   = np.array(feature, dtype=np.int32)
+        self.threshold = np.array(threshold, dtype=np.float32)
+        self.left      = np.array(left, dtype=np.int32)
+        self.right     = np.array(right, dtype=np.int32)
+        self.label     = np.array(label, dtype=np.int32)
+        self.depth     = self.max_depth
+        self.node      = None # Cache of node as Python list for single query
+
+
+    def predict(self, x):
+        x = np.float32(x).reshape(len(x) if np.ndim(x)>1 else 1, -1)
+        if len(x)==1:
+            # Single query walks the tree on Python lists
+            # which is faster than a NumPy gather per level
+            if getattr(self, 'node', None) is None:
+                self.node = list(zip(self.feature.tolist(), self.threshold.tolist(),
+                    self.left.tolist(), self.right.tolist()))
+            q, n = x[0].tolist(), 0
+            f, t, l, r = self.node[0]
+            while f>=0:
+                n = l if q[f]<=t else r
+                f, t, l, r = self.node[n]
+            return self.classes[self.label[n:n+1]]
+
+        node = np.zeros(len(x), dtype=np.int32)
+        row  = np.arange(len(x))
+        for i in range(self.depth): # Leaf points to itself so extra steps are harmless
+            f = self.feature[node]
+            go_left = x[row, np.maximum(f, 0)]<=self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.classes[self.label[node]]
+
+
+    def state(self):
+        return {'classes':self.classes, 'feature':self.feature, 'threshold':self.threshold,
+            'left':self.left, 'right':self.right, 'label':self.label, 'depth':self.depth}
+
+
+# Name of backend: (class, whether it needs cv2.ml)
+backend = {
+    'knn'     : (KnnOpenCV, True),
+    'knn_np'  : (KnnNumpy, False),
+    'centroid': (NearestCentroid, False),
+    'logistic': (LogisticRegression, False),
+    'tree'    : (DecisionTree, False),
+    'svm'     : (SvmOpenCV, True),
+    'rtrees'  : (RTreesOpenCV, True),
+}
+
+
+def model_kwargs(model):
+    # Training setting of model i.e. arguments of its __init__
+    arg = inspect.signature(type(model).__init__).parameters
+    return {k: getattr(model, k) for k in arg if k!='self'}
+
+
+def save_model(model, file):
+    # Save NumPy model with state() e.g. LogisticRegression / DecisionTree to .npz
+    # together with its training setting so that a stale file can be detected
+    name = [k for k, v in backend.items() if isinstance(model, v[0])][0]
+    np.savez(file, backend=name, kwargs=json.dumps(model_kwargs(model)), **model.state())
+
+
+def load_model(file):
+    # Return model saved by save_model, ready to predict
+    data  = np.load(file)
+    kwargs = json.loads(str(data['kwargs'])) if 'kwargs' in data.files else {}
+    model = backend[str(data['backend'])][0](**kwargs)
+    for k in data.files:
+        if k not in ('backend', 'kwargs'):
+            setattr(model, k, data[k] if data[k].ndim>0 else data[k].item())
+    return model
+
+
+def load_model_kwargs(file):
+    # Return (backend name, training setting) of saved model without loading it
+    # Training setting is None for file saved before it was stored
+    data = np.load(file)
+    kwargs = json.loads(str(data['kwargs'])) if 'kwargs' in data.files else None
+    return str(data['backend']), kwargs
+
+
+def is_available(name):
+    # Some OpenCV builds are without the ml module
+    return name in backend and (not backend[name][1] or hasattr(cv2, 'ml'))
+
+
+def create_classifier(name, **kwargs):
+    if name not in backend:
+        raise ValueError('Unknown classifier: %s, available: %s' % (name, ' / '.join(backend)))
+    if not is_available(name):
+        raise ImportError('Classifier %s requires cv2.ml which is not in this OpenCV build' % name)
+    return backend[name][0](**kwargs)
+
+
+def config_name(name, kwargs):
+    return ' '.join([name] + ['%s=%s' % (k, v) for k, v in sorted(kwargs.items())])
+
+
+def stratified_fold(y, num_fold=5, seed=0):
+    # Split index of samples into num_fold folds with similar class ratio
+    # Return list of num_fold arrays of test index
+    rng  = np.random.default_rng(seed)
+    fold = np.zeros(len(y), dtype=int)
+    offset = 0
+    for c in np.unique(y):
+        index = rng.permutation(np.flatnonzero(y==c))
+        # Continue round robin from the previous class so folds are of similar size
+        fold[index] = (np.arange(len(index)) + offset) % num_fold
+        offset += len(index)
+    return [np.flatnonzero(fold==i) for i in range(num_fold)]
+
+
+def confusion_matrix(y, pred, classes=None):
+    # Row is true class and column is predicted class
+    classes = np.unique(np.concatenate([y, pred])) if classes is None else np.asarray(classes)
+    index = {c:i for i, c in enumerate(classes)}
+    mat = np.zeros((len(classes), len(classes)), dtype=int)
+    np.add.at(mat, ([index[c] for c in y], [index[c] for c in pred]), 1)
+    return mat, classes
+
+
+def pairwise_dist(x):
+    # [n,n] Euclidean distance between all samples
+    xx = np.sum(x*x, axis=1)
+    return np.sqrt(np.maximum(xx[:,None] + xx[None,:] - 2 * x @ x.T, 0))
+
+
+def dedup(x, y, tol=1.0, dist=None):
+    # Drop near-duplicate samples i.e. within tol of an earlier kept sample
+    # of the same class, e.g. repeated spacebar presses on a still hand
+    # Return index of kept samples
+    dist = pairwise_dist(x) if dist is None else dist
+    drop = np.zeros(len(y), dtype=bool)
+    for i in range(len(y)):
+        if drop[i]: continue
+        # Later samples of the same class close to a kept sample are dropped
+        drop[i+1:] |= (dist[i,i+1:]<=tol) & (y[i+1:]==y[i])
+    return np.flatnonzero(~drop)
+
+
+def edited_nn(x, y, k=3, dist=None):
+    # Wilson's edited nearest neighbour: drop samples whose k nearest
+    # other samples vote for another class (noise / mislabelled / overlap)
+    # Return index of kept samples
+    if len(y)<=k:
+        return np.arange(len(y))
+    dist = pairwise_dist(x) if dist is None else dist.copy()
+    np.fill_diagonal(dist, np.inf) # Leave one out
+    near = np.argpartition(dist, k-1, axis=1)[:,:k]
+    classes, index = np.unique(y, return_inverse=True)
+    vote = np.zeros((len(y), len(classes)))
+    np.add.at(vote, (np.arange(len(y))[:,None], index[near]), 1)
+    return np.flatnonzero(vote[np.arange(len(y)), index] > k/2)
+
+
+def condensed_nn(x, y, seed=0, dist=None):
+    # Hart's condensed nearest neighbour: keep a subset (store) such that
+    # 1-NN on the store classifies every sample correctly, samples far
+    # from the class boundary are absorbed
+    # Return index of kept samples
+    dist  = pairwise_dist(x) if dist is None else dist
+    order = np.random.default_rng(seed).permutation(len(y))
+    store = [order[np.flatnonzero(y[order]==c)[0]] for c in np.unique(y)] # One per class
+    added = True
+    while added: # Repeat until a full pass adds nothing
+        added = False
+        for i in order:
+            if y[store[np.argmin(dist[i,store])]]!=y[i]:
+                store.append(i)
+                added = True
+    return np.sort(store)
+
+
+def condense(x, y, tol=1.0, k=3, cnn=True, seed=0):
+    # Apply dedup -> edited NN (k>0) -> condensed NN (cnn) in turn
+    # Return index of kept samples and number of samples after each step
+    keep  = np.arange(len(y))
+    dist  = pairwise_dist(x)
+    count = {'input':len(y)}
+    step  = [('dedup', lambda x, y, d: dedup(x, y, tol, d))]
+    if k>0:
+        step.append(('edited_nn', lambda x, y, d: edited_nn(x, y, k, d)))
+    if cnn:
+        step.append(('condensed_nn', lambda x, y, d: condensed_nn(x, y, seed, d)))
+    for name, func in step:
+        sub = func(x[keep], y[keep], dist[np.ix_(keep, keep)])
+        if len(np.unique(y[keep][sub]))<len(np.unique(y[keep])):
+            # Do not let a step remove a whole class e.g. a class of one sample in ENN
+            sub = np.union1d(sub, [np.flatnonzero(y[keep]==c)[0] for c in np.unique(y[keep])])
+        keep = keep[sub]
+        count[name] = len(keep)
+    return keep, count
+
+
+class OpenSetThreshold:
+    def __init__(self, quantile=0.9, scale=1.5):
+        # Per class distance threshold for open set rejection
+        # Any hand pose is assigned to some class by a closed set classifier
+        # thus a query farther than threshold from all training samples
+        # of its predicted class is labelled unknown instead
+
+        # quantile / scale:
+        #   Threshold of each class is scale times this quantile of leave one out
+        #   distance from each sample to nearest other sample of the same class
+        #   Quantile of a class is clipped to [median, quantile] of all classes
+        #   as a class with few samples gives a noisy estimate
+
+        self.quantile = quantile
+        self.scale    = scale
+
+
+    def train(self, x, y):
+        self.x = np.float32(x)
+        self.y = np.asarray(y, dtype=int)
+        dist = pairwise_dist(self.x)
+        np.fill_diagonal(dist, np.inf)
+        same = np.min(np.where(self.y[:,None]==self.y[None,:], dist, np.inf), axis=1)
+        valid = np.isfinite(same) # Class of one sample has no leave one out distance
+        lo = np.median(same[valid])
+        hi = np.quantile(same[valid], self.quantile)
+        self.classes = np.unique(self.y)
+        self.threshold = np.array([self.scale * np.clip(np.quantile(same[(self.y==c) & valid], self.quantile)
+            if np.any((self.y==c) & valid) else hi, lo, hi) for c in self.classes], dtype=np.float32)
+
+
+    def nearest(self, x, pred):
+        # Distance from each query to nearest training sample of its predicted class
+        # Note: For KNN use knn_nearest instead which reuses distance of neighbours
+        x = np.float32(x).reshape(-1, self.x.shape[1])
+        dist = np.sqrt(np.maximum(np.sum(self.x*self.x, axis=1)[None,:] - 2 * x @ self.x.T +
+            np.sum(x*x, axis=1)[:,None], 0))
+        return np.min(np.where(self.y[None,:]==np.asarray(pred)[:,None], dist, np.inf), axis=1)
+
+
+    def check(self, pred, dist, vote=1.0):
+        # pred: [n] predicted class
+        # dist: [n] distance to nearest training sample of predicted class
+        # vote: [n] fraction of neighbours / probability agreeing with pred
+        # Return [n] bool whether accepted and [n] confidence in [0,1]
+        #        confidence is vote scaled by 1 at zero distance, 0.5 at threshold
+        #        and 0 at twice threshold, thus an unknown has at most half the vote
+        ratio = np.asarray(dist) / self.threshold[np.searchsorted(self.classes, pred)]
+        return ratio<=1, np.asarray(vote) * np.clip(1 - ratio/2, 0, 1)
+
+
+def knn_nearest(pred, neighbours, dist):
+    # Use output of cv2 KNearest.findNearest (squared distance of k neighbours)
+    # Return [n] distance to nearest neighbour of predicted class and [n] fraction of vote
+    same = neighbours==np.asarray(pred).reshape(-1, 1)
+    return np.sqrt(np.min(np.where(same, dist, np.inf), axis=1)), np.mean(same, axis=1)
+
+
+def init_worker():
+    # Avoid oversubscribing cores as folds already run in parallel
+    cv2.setNumThreads(1)
+
+
+def run_fold(task):
+    # Train on all but one fold and predict the held out fold
+    # Training fold is condensed first if select is given (kwargs of condense)
+    # so that the held out fold is never used to choose prototypes
+    i, name, kwargs, x_train, y_train, x_test, select = task
+    if select is not None:
+        keep, count = condense(x_train, y_train, **select)
+        x_train, y_train = x_train[keep], y_train[keep]
+    model = create_classifier(name, **kwargs)
+    t = time.perf_counter()
+    model.train(x_train, y_train)
+    t_train = time.perf_counter() - t
+    return i, model.predict(x_test), t_train, len(y_train)
+
+
+def measure_latency(model, x, num_query=200):
+    # Time predict of one query at a time as in the live demo (one hand per frame)
+    # Return [num_query] latency in second
+    x = np.float32(x)
+    x = x[np.arange(num_query) % len(x)]
+    model.predict(x[:1]) # Warm up
+    latency = np.zeros(num_query)
+    for i in range(num_query):
+        t = time.perf_counter()
+        model.predict(x[i:i+1])
+        latency[i] = time.perf_counter() - t
+    return latency
+
+
+class CrossValidation:
+    def __init__(self, num_fold=5, num_proc=None, seed=0):
+        # num_fold:
+        #   Number of folds, each sample is predicted once by a model not trained on it
+
+        # num_proc:
+        #   Number of processes to run folds in parallel
+        #   Default to number of cpu cores, set to 1 to run in this process
+
+        self.num_fold = num_fold
+        self.num_proc = multiprocessing.cpu_count() if num_proc is None else num_proc
+        self.seed     = seed
+
+
+    def run(self, x, y, config, select=None):
+        # x, y  : Feature and label from load_data
+        # config: List of (backend name, kwargs)
+        # select: Optional kwargs of condense applied to each training fold
+        # Return list of dict of result for each config
+        fold = stratified_fold(y, self.num_fold, self.seed)
+        task = []
+        for c, (name, kwargs) in enumerate(config):
+            for f, test in enumerate(fold):
+                train = np.setdiff1d(np.arange(len(y)), test)
+                task.append(((c, f), name, kwargs, x[train], y[train], x[test], select))
+
+        if self.num_proc<=1:
+            output = list(map(run_fold, task))
+        else:
+            with multiprocessing.Pool(min(self.num_proc, len(task)), init_worker) as pool:
+                output = pool.map(run_fold, task)
+
+        result = [{'name':config_name(name, kwargs), 'backend':name, 'kwargs':kwargs,
+            'pred':np.zeros_like(y), 'train_time':0.0, 'train_size':0.0} for name, kwargs in config]
+        for (c, f), pred, t_train, size in output:
+            result[c]['pred'][fold[f]] = pred
+            result[c]['train_time'] += t_train / self.num_fold
+            result[c]['train_size'] += size / self.num_fold
+
+        classes = np.unique(y)
+        for r in result:
+            r['accuracy'] = np.mean(r['pred']==y)
+            r['confusion'], r['classes'] = confusion_matrix(y, r['pred'], classes)
+        return result
@@ -7,6 +7,8 @@ import cv2
 import numpy as np
 import open3d as o3d
 
+from utils_rps import gesture_to_rps, rps_choice, rps_resolve, rps_text
+
 
 # Define default camera intrinsic
 img_width  = 640
@@ -558,15 +560,11 @@ class DisplayHand:
     def draw_game_rps(self, img, param):
         img_height, img_width, _ = img.shape
 
-        # Init result of 2 hands to none
-        res = [None, None]
+        # Init result of all hands to none
+        res = [None] * len(param)
 
         # Loop through different hands
         for j, p in enumerate(param):
-            # Only allow maximum of two hands
-            if j>1:
-                break
-
             if p['class'] is not None:                
                 # Loop through keypoint for each hand
                 for i in range(21):
@@ -583,14 +581,8 @@ class DisplayHand:
                         # Draw keypoint
                         cv2.circle(img, (x, y), 5, self.color[i], -1)
 
-                # Label gesture 
-                text = None
-                if p['gesture']=='fist':
-                    text = 'rock'
-                elif p['gesture']=='five':
-                    text = 'paper'
-                elif (p['gesture']=='three') or (p['gesture']=='yeah'):
-                    text = 'scissor'
+                # Label gesture (rock=fist, paper=five, scissor=three/yeah)
+                text = gesture_to_rps.get(p['gesture'])
                 res[j] = text
 
                 # Label result
@@ -600,21 +592,10 @@ class DisplayHand:
                     cv2.putText(img, '%s' % (text.upper()), (x, y), 
                         cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2) # Red
 
-        # Determine winner
-        text = None
-        winner = None
-        if res[0]=='rock':
-            if res[1]=='rock'     : text = 'Tie'
-            elif res[1]=='paper'  : text = 'Paper wins'  ; winner = 1
-            elif res[1]=='scissor': text = 'Rock wins'   ; winner = 0
-        elif res[0]=='paper':
-            if res[1]=='rock'     : text = 'Paper wins'  ; winner = 0
-            elif res[1]=='paper'  : text = 'Tie'
-            elif res[1]=='scissor': text = 'Scissor wins'; winner = 1
-        elif res[0]=='scissor':
-            if res[1]=='rock'     : text = 'Rock wins'   ; winner = 1
-            elif res[1]=='paper'  : text = 'Scissor wins'; winner = 0
-            elif res[1]=='scissor': text = 'Tie'
+        # Determine winner of all hands at once
+        choice = rps_choice(res)
+        winner, _ = rps_resolve(choice)
+        text = rps_text(choice, winner)
 
         # Label gesture
         if text is not None:
@@ -627,9 +608,9 @@ class DisplayHand:
                 (x, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)            
 
         # Draw winner text
-        if winner is not None:
-            x = int(param[winner]['keypt'][0,0]) - 30
-            y = int(param[winner]['keypt'][0,1]) + 80
+        for j in np.where(winner)[0]:
+            x = int(param[j]['keypt'][0,0]) - 30
+            y = int(param[j]['keypt'][0,1]) + 80
             cv2.putText(img, 'WINNER', (x, y), 
                 cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,255), 2) # Yellow            
 
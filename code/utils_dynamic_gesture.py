@@ -0,0 +1,372 @@
+###############################################################################
+### Dynamic gesture recognition from trajectory of hand landmark
+### Unlike GestureRecognition which classifies the pose of a single frame
+### the gesture here is defined by how the hand moves over a short window
+### SwipeRecognizer keeps a fixed-size ring buffer per hand and updates
+### sliding window feature in constant time per frame
+### DynamicGestureRecognition matches a stream of angle and palm velocity
+### against recorded templates e.g. wave / swipe / counting with SPRING DTW
+###############################################################################
+
+import os
+import time
+import numpy as np
+
+
+class SwipeRecognizer:
+    def __init__(self, max_num=2, window=10, min_dist=1.5, min_straight=0.8,
+        max_ortho=0.5, cooldown=10, hold=15, point=(0,5,9,13,17)):
+        # max_num:
+        #   Maximum number of hands, each hand has its own ring buffer
+
+        # window:
+        #   Number of recent frames in ring buffer e.g. 10 frames = 0.33 s at 30 fps
+
+        # min_dist:
+        #   Minimum net displacement over the window in unit of hand size
+        #   Hand size is the distance from wrist to middle finger MCP
+        #   thus swipe does not depend on distance of hand to the camera
+
+        # min_straight:
+        #   Minimum ratio of net displacement to path length [0,1]
+        #   to reject shaking or circular motion
+
+        # max_ortho:
+        #   Maximum ratio of displacement along the other axis
+        #   to reject diagonal motion
+
+        # cooldown:
+        #   Number of frames after a swipe before the next one of the same hand
+        #   so that the tail of a long swipe is not counted again
+
+        # hold:
+        #   Number of frames to keep label of last swipe for display
+
+        # point:
+        #   Index of landmark averaged as palm center to be tracked
+
+        self.max_num      = max_num
+        self.window       = window
+        self.min_dist     = min_dist
+        self.min_straight = min_straight
+        self.max_ortho    = max_ortho
+        self.cooldown     = cooldown
+        self.hold         = hold
+        self.point        = list(point)
+
+        self.pos   = np.zeros((max_num, window, 2)) # Ring buffer of palm center
+        self.step  = np.zeros((max_num, window))    # Length of step into each position
+        self.size  = np.zeros((max_num, window))    # Hand size at each position
+        self.head  = np.zeros(max_num, dtype=int)   # Index to write next position
+        self.count = np.zeros(max_num, dtype=int)   # Number of valid position
+        self.path  = np.zeros(max_num)              # Sum of step within window
+        self.total = np.zeros(max_num)              # Sum of hand size within window
+
+        self.label = [None] * max_num           # Label of last swipe
+        self.age   = np.full(max_num, cooldown+1) # Frames since last swipe
+
+
+    def reset(self, slot=None):
+        slot = np.arange(self.max_num) if slot is None else slot
+        self.head[slot]  = 0
+        self.count[slot] = 0
+        self.path[slot]  = 0
+        self.total[slot] = 0
+
+
+    def push(self, slot, center, size):
+        # Write newest position of each slot and update running sum
+        # Only the step leaving the window is subtracted thus O(1) per hand
+        w = self.window
+        h = self.head[slot]
+        full = self.count[slot]==w
+        prev = self.pos[slot, (h-1)%w]
+        step = np.where(self.count[slot]>0, np.linalg.norm(center - prev, axis=-1), 0)
+
+        self.path[slot]  += step - np.where(full, self.step[slot, (h+1)%w], 0)
+        self.total[slot] += size - np.where(full, self.size[slot, h], 0)
+        self.pos[slot, h]  = center
+        self.step[slot, h] = step
+        self.size[slot, h] = size
+        self.head[slot]  = (h+1)%w
+        self.count[slot] = np.minimum(self.count[slot]+1, w)
+
+
+    def feature(self, slot):
+        # Sliding window feature of each slot from ring buffer endpoints and running sum
+        # Return net displacement [n,2] in hand size, straightness [n,]
+        full   = self.count[slot]==self.window
+        oldest = np.where(full, self.head[slot], 0)
+        newest = (self.head[slot]-1) % self.window
+        net    = self.pos[slot, newest] - self.pos[slot, oldest]
+        size   = self.total[slot] / np.maximum(self.count[slot], 1)
+        dist   = np.linalg.norm(net, axis=-1)
+        return net / np.maximum(size, 1e-6)[:,None], dist / np.maximum(self.path[slot], 1e-6)
+
+
+    def update(self, keypt, slot=None, t=None):
+        # keypt: [n,21,2] keypt (pixel) of n detected hands
+        #        Use pixel instead of normalized coordinate so that
+        #        horizontal and vertical distance have the same unit
+        # slot : Slot of each hand e.g. LandmarkFilter.slot, default to order of detection
+        # Return list of event {'slot', 'label', 'time', 'distance', 'straight'}
+        keypt = np.asarray(keypt, dtype=np.float64).reshape(-1, 21, 2)
+        slot  = np.arange(len(keypt)) if slot is None else np.asarray(slot, dtype=int)
+        if t is None:
+            t = time.time()
+
+        # Hand no longer detected restarts its trajectory
+        lost = np.setdiff1d(np.arange(self.max_num), slot)
+        self.reset(lost)
+
+        self.age += 1
+        for s in range(self.max_num):
+            if self.age[s]>self.hold:
+                self.label[s] = None
+
+        if len(slot)==0:
+            return []
+
+        center = keypt[:,self.point].mean(axis=1)
+        size   = np.linalg.norm(keypt[:,9] - keypt[:,0], axis=-1)
+        self.push(slot, center, size)
+
+        net, straight = self.feature(slot)
+        dist  = np.linalg.norm(net, axis=-1)
+        major = np.abs(net).max(axis=-1)
+        minor = np.abs(net).min(axis=-1)
+        swipe = (self.count[slot]==self.window) & (dist>self.min_dist) & \
+            (straight>self.min_straight) & (minor<self.max_ortho*major) & \
+            (self.age[slot]>self.cooldown)
+
+        event = []
+        for i in np.where(swipe)[0]:
+            s = slot[i]
+            dx, dy = net[i] # Image y points down
+            if abs(dx)>=abs(dy):
+                label = 'RIGHT' if dx>0 else 'LEFT'
+            else:
+                label = 'DOWN' if dy>0 else 'UP'
+            self.label[s] = label
+            self.age[s]   = 0
+            event.append({'slot':int(s), 'label':label, 'time':t,
+                'distance':float(dist[i]), 'straight':float(straight[i])})
+
+        return event
+
+
+def sequence_feature(joint, prev_center=None, weight=1.0):
+    # Per-frame feature of dynamic gesture
+    # joint : [n,21,3] joint of n hands in normalized coordinate
+    # prev_center: [n,2] palm center of previous frame, None if unknown
+    # Return feature [n,17] and palm center [n,2]
+    #   15 joint angle scaled to about [0,2] for finger motion e.g. counting
+    #   2 palm velocity in hand size per frame for hand motion e.g. wave / swipe
+    from utils_joint_angle import convert_3d_joint_to_angle
+    joint  = np.asarray(joint, dtype=np.float64).reshape(-1, 21, 3)
+    angle  = convert_3d_joint_to_angle(joint) / 90
+    center = joint[:,[0,5,9,13,17],:2].mean(axis=1)
+    size   = np.linalg.norm(joint[:,9,:2] - joint[:,0,:2], axis=-1, keepdims=True)
+    if prev_center is None:
+        vel = np.zeros_like(center)
+    else:
+        vel = (center - prev_center) / np.maximum(size, 1e-6)
+    return np.concatenate([angle, weight*vel], axis=-1), center
+
+
+class SpringDTW:
+    def __init__(self, template, threshold=0.3, num_stream=1):
+        # Streaming subsequence DTW (SPRING, Sakurai et al. ICDE 2007)
+        # Find subsequence of an endless stream that matches any template
+        # without a fixed window or start point, each frame only updates
+        # one DTW column per template thus costs O(template length)
+        # and the column of all templates is computed in a few numpy operations
+
+        # template:
+        #   List of K template [m_k,D], padded into one array so that
+        #   all templates are updated at once
+
+        # threshold:
+        #   Maximum DTW distance per template frame to report a match
+
+        # num_stream:
+        #   Number of independent streams e.g. hands, each has its own state
+
+        self.threshold = threshold
+        self.num_stream = num_stream
+        self.length = np.array([len(t) for t in template], dtype=int) # [K]
+        K, M = len(template), max(self.length)
+        D = template[0].shape[-1]
+        self.template = np.zeros((K, M, D))
+        for k, t in enumerate(template):
+            self.template[k,:len(t)] = t
+        self.valid = np.arange(M)[None,:] < self.length[:,None] # [K,M]
+        self.eps = threshold * self.length # Raw distance to report
+
+        S = num_stream
+        self.d    = np.full((S, K, M+1), np.inf)       # Cumulative distance of DTW column
+        self.s    = np.zeros((S, K, M+1), dtype=int)   # Start frame of each path
+        self.dmin = np.full((S, K), np.inf)            # Best match not yet reported
+        self.ts   = np.zeros((S, K), dtype=int)        # Start frame of best match
+        self.te   = np.zeros((S, K), dtype=int)        # End frame of best match
+        self.t    = np.zeros(S, dtype=int)             # Frame index of each stream
+
+
+    def reset(self, stream=None):
+        # Drop partial match e.g. when the hand is lost
+        # A match that has ended but is not yet reported (reporting lags a few
+        # frames) is complete, thus it is reported before the state is cleared
+        # Return list of match as update, joined in order of stream
+        stream = np.arange(self.num_stream) if stream is None else np.atleast_1d(stream)
+        match = []
+        for i in stream:
+            dmin, ts, te = self.dmin[i], self.ts[i], self.te[i]
+            for k in np.where(dmin<=self.eps)[0]:
+                match.append((int(k), float(dmin[k]/self.length[k]), int(ts[k]), int(te[k])))
+        self.d[stream]    = np.inf
+        self.dmin[stream] = np.inf
+        return match
+
+
+    def update(self, x, stream=0):
+        # x: [D] feature of current frame of a stream
+        # Return list of match (template index, distance per frame, start, end)
+        t = self.t[stream]
+        self.t[stream] += 1
+        K, M = self.valid.shape
+
+        # Distance of current frame to every frame of every template at once
+        dist = np.sqrt(np.sum((self.template - x)**2, axis=-1)) # [K,M]
+        dist[~self.valid] = np.inf
+
+        # Step pattern: stream frame repeats a template frame (stream slower),
+        # matches next template frame, or matches next two (stream up to 2x faster)
+        # Every template frame is counted at least once so that a whole
+        # template cannot be matched by a single stream frame
+        # As no step stays within the current column, the column is updated at once
+        prev_d, prev_s = self.d[stream], self.s[stream]
+        prev_d[:,0] = 0 # Star padding, match may start at any frame
+        prev_s[:,0] = t
+        skip = np.full((K, M), np.inf)
+        skip[:,1:] = prev_d[:,:-2] + dist[:,:-1]
+        cand_d = np.stack([prev_d[:,1:], prev_d[:,:-1], skip]) # [3,K,M]
+        cand_s = np.stack([prev_s[:,1:], prev_s[:,:-1], np.pad(prev_s[:,:-2], ((0,0),(1,0)))])
+        best = np.argmin(cand_d, axis=0)[None]
+        d = np.empty_like(prev_d)
+        s = np.empty_like(prev_s)
+        d[:,1:] = dist + np.take_along_axis(cand_d, best, axis=0)[0]
+        s[:,1:] = np.take_along_axis(cand_s, best, axis=0)[0]
+        d[:,0], s[:,0] = np.inf, t
+
+        match = []
+        dmin, ts, te = self.dmin[stream], self.ts[stream], self.te[stream]
+
+        # Report best match once no path can still improve it
+        report = (dmin<=self.eps) & np.all((d[:,1:]>=dmin[:,None]) | (s[:,1:]>te[:,None]), axis=1)
+        for k in np.where(report)[0]:
+            match.append((int(k), float(dmin[k]/self.length[k]), int(ts[k]), int(te[k])))
+            dmin[k] = np.inf
+            d[k, 1:][s[k,1:]<=te[k]] = np.inf # Remove paths overlapping reported match
+
+        # Keep track of best candidate ending at current frame
+        end = d[np.arange(K), self.length]
+        better = (end<=self.eps) & (end<dmin)
+        dmin[better] = end[better]
+        ts[better] = s[np.arange(K), self.length][better]
+        te[better] = t
+
+        self.d[stream], self.s[stream] = d, s
+        return match
+
+
+def save_template(file, template, label):
+    # Store list of template [m_k,D] with label in a single .npz file
+    np.savez(file, feature=np.concatenate(template), length=[len(t) for t in template],
+        label=np.array(label))
+
+
+def load_template(file):
+    data   = np.load(file)
+    split  = np.cumsum(data['length'])[:-1]
+    return np.split(data['feature'], split), list(data['label'])
+
+
+class DynamicGestureRecognition:
+    def __init__(self, mode='eval', file='../data/dynamic_gesture_train.npz',
+        max_num=1, threshold=0.3, weight=1.0):
+        # mode:
+        #   'train': Record template with start() / add() / stop(label)
+        #   'eval' : Recognize template in stream with eval()
+
+        # max_num:
+        #   Maximum number of hands, each hand is an independent stream
+
+        # threshold:
+        #   Maximum DTW distance per template frame, see SpringDTW
+
+        # weight:
+        #   Weight of palm velocity relative to joint angle in feature
+
+        self.mode   = mode
+        self.file   = file
+        self.weight = weight
+        self.prev_center = [None] * max_num
+
+        self.template, self.label = [], []
+        if os.path.isfile(file):
+            self.template, self.label = load_template(file)
+
+        self.record = None # Feature of template being recorded
+        self.spring = None
+        if mode=='eval':
+            if len(self.template)==0:
+                raise ValueError('No template found in %s' % file)
+            self.spring = SpringDTW(self.template, threshold, max_num)
+
+
+    def feature(self, joint, slot=0):
+        # Feature of a hand, velocity uses palm center of previous frame of the same slot
+        f, center = sequence_feature(joint, self.prev_center[slot], self.weight)
+        self.prev_center[slot] = center
+        return f[0]
+
+
+    def lost(self, slot=0):
+        # Hand is not detected, restart velocity and partial match
+        # Return list of gesture that ended before the hand was lost, same as eval
+        self.prev_center[slot] = None
+        if self.spring is None:
+            return []
+        return [{'label':self.label[k], 'distance':d, 'start':ts, 'end':te}
+            for k, d, ts, te in self.spring.reset([slot])]
+
+
+    def start(self):
+        self.record = []
+
+
+    def add(self, joint, slot=0):
+        # Note: Only the hand of slot 0 is recorded as template
+        f = self.feature(joint, slot)
+        if self.record is not None and slot==0:
+            self.record.append(f)
+
+
+    def stop(self, label, min_length=5):
+        # Save recorded template, return False if it is too short
+        record, self.record = self.record, None
+        if record is None or len(record)<min_length:
+            return False
+        self.template.append(np.array(record))
+        self.label.append(label)
+        save_template(self.file, self.template, self.label)
+        return True
+
+
+    def eval(self, joint, slot=0):
+        # Return list of recognized gesture {'label', 'distance', 'start', 'end'}
+        # Note: A match is reported a few frames after it ends
+        #       once no longer path can give a smaller distance
+        f = self.feature(joint, slot)
+        return [{'label':self.label[k], 'distance':d, 'start':ts, 'end':te}
+            for k, d, ts, te in self.spring.update(f, slot)]
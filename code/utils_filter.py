@@ -0,0 +1,389 @@
+###############################################################################
+### Temporal smoothing of landmark to reduce frame to frame jitter
+### All filters are vectorized and run over the whole tensor at once
+### e.g. [num_hands, 21, 3] joint of all hands in a single call
+### 1) ExponentialFilter: Simple exponential moving average
+### 2) OneEuroFilter    : Adaptive low pass filter (less lag when moving fast)
+###    https://gery.casiez.net/1euro/
+### 3) KalmanFilter     : Constant velocity Kalman filter on each coordinate
+### And debouncing of classified gesture label
+### 4) GestureDebouncer : N of M voting with hysteresis for a single hand
+### 5) GestureEvent     : Emit event only when confirmed label of a hand changes
+###############################################################################
+
+import time
+import numpy as np
+from collections import deque, Counter
+
+from utils_joint_angle import convert_3d_joint_to_angle
+
+
+def expand_mask(valid, x):
+    # Broadcast mask [N] to shape of x [N,...]
+    return valid.reshape(valid.shape + (1,)*(x.ndim-valid.ndim))
+
+
+class ExponentialFilter:
+    def __init__(self, alpha=0.5):
+        # alpha:
+        #   Weight [0,1] of new measurement, smaller is smoother but more lag
+        self.alpha = alpha
+        self.x = None
+
+
+    def reset(self):
+        self.x = None
+
+
+    def __call__(self, x, dt=None, new=None):
+        # x  : Measurement of any shape
+        # dt : Ignored, only for same interface as other filters
+        # new: Boolean mask of element to be re-initialized e.g. hand just appeared
+        if self.x is None or self.x.shape!=x.shape:
+            self.x = x.copy()
+            return self.x.copy()
+
+        self.x += self.alpha * (x - self.x)
+        if new is not None:
+            np.copyto(self.x, x, where=expand_mask(new, x))
+
+        return self.x.copy()
+
+
+class OneEuroFilter:
+    def __init__(self, min_cutoff=1.0, beta=10.0, d_cutoff=1.0):
+        # min_cutoff:
+        #   Minimum cutoff frequency (Hz), smaller to reduce jitter when static
+
+        # beta:
+        #   Speed coefficient, larger to reduce lag when moving fast
+        #   Note: Depends on unit of x, default is for normalized [0,1] coordinate
+
+        # d_cutoff:
+        #   Cutoff frequency (Hz) for derivative
+
+        self.min_cutoff = min_cutoff
+        self.beta       = beta
+        self.d_cutoff   = d_cutoff
+        self.x  = None
+        self.dx = None
+
+
+    def reset(self):
+        self.x  = None
+        self.dx = None
+
+
+    def alpha(self, dt, cutoff):
+        tau = 1.0 / (2*np.pi*cutoff)
+        return 1.0 / (1.0 + tau/dt)
+
+
+    def __call__(self, x, dt=1/30, new=None):
+        if self.x is None or self.x.shape!=x.shape:
+            self.x  = x.copy()
+            self.dx = np.zeros_like(x)
+            return self.x.copy()
+
+        # Filtered derivative
+        dx = (x - self.x) / dt
+        self.dx += self.alpha(dt, self.d_cutoff) * (dx - self.dx)
+
+        # Cutoff increases with speed
+        cutoff = self.min_cutoff + self.beta*np.abs(self.dx)
+        self.x += self.alpha(dt, cutoff) * (x - self.x)
+
+        if new is not None:
+            mask = expand_mask(new, x)
+            np.copyto(self.x, x, where=mask)
+            np.copyto(self.dx, 0, where=mask)
+
+        return self.x.copy()
+
+
+class KalmanFilter:
+    def __init__(self, process_noise=1.0, measure_noise=1e-4):
+        # Independent constant velocity model for each element
+        # State [position, velocity] with 2x2 covariance stored element-wise
+
+        # process_noise:
+        #   Spectral density of acceleration, larger to follow fast motion
+
+        # measure_noise:
+        #   Variance of measurement, larger is smoother
+        #   Note: Depends on unit of x, default is for normalized [0,1] coordinate
+
+        self.q = process_noise
+        self.r = measure_noise
+        self.x = None
+
+
+    def reset(self):
+        self.x = None
+
+
+    def init(self, x, mask=None):
+        if mask is None:
+            self.x   = x.copy()
+            self.v   = np.zeros_like(x)
+            self.p00 = np.full_like(x, self.r)
+            self.p01 = np.zeros_like(x)
+            self.p11 = np.full_like(x, self.q)
+        else:
+            np.copyto(self.x, x, where=mask)
+            np.copyto(self.v, 0, where=mask)
+            np.copyto(self.p00, self.r, where=mask)
+            np.copyto(self.p01, 0, where=mask)
+            np.copyto(self.p11, self.q, where=mask)
+
+
+    def __call__(self, x, dt=1/30, new=None):
+        if self.x is None or self.x.shape!=x.shape:
+            self.init(x)
+            return self.x.copy()
+
+        # Predict
+        self.x += self.v*dt
+        q = self.q
+        self.p00 += dt*(2*self.p01 + dt*self.p11) + q*dt**3/3
+        self.p01 += dt*self.p11 + q*dt**2/2
+        self.p11 += q*dt
+
+        # Update
+        s  = self.p00 + self.r
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        y  = x - self.x
+        self.x += k0*y
+        self.v += k1*y
+        self.p11 -= k1*self.p01
+        self.p01 *= 1-k0
+        self.p00 *= 1-k0
+
+        if new is not None:
+            self.init(x, expand_mask(new, x))
+
+        return self.x.copy()
+
+
+def create_filter(method='one_euro', **kwargs):
+    if method=='exp':
+        return ExponentialFilter(**kwargs)
+    elif method=='one_euro':
+        return OneEuroFilter(**kwargs)
+    elif method=='kalman':
+        return KalmanFilter(**kwargs)
+    raise ValueError('Undefined filter only the following are available: exp / one_euro / kalman')
+
+
+class LandmarkFilter:
+    def __init__(self, max_num=2, num_pt=21, method='one_euro', fps=30,
+        scale={'joint':1, 'keypt':1/640, 'joint_3d':1}, **kwargs):
+        # Smooth landmark of multiple hands in a single vectorized call
+        # Detected hands are assigned to filter slots by nearest wrist
+        # so that the state does not jump when MediaPipe swaps hand order
+
+        # max_num:
+        #   Maximum number of hands (filter slots)
+
+        # fps:
+        #   Frame rate assumed when timestamp is not given
+
+        # scale:
+        #   Param to be filtered and factor to bring them to similar unit
+        #   e.g. pixel keypt is scaled by 1/image width
+
+        self.max_num = max_num
+        self.num_pt  = num_pt
+        self.fps     = fps
+        self.scale   = scale
+        self.filter  = create_filter(method, **kwargs)
+
+        self.valid  = np.zeros(max_num, dtype=bool) # Slot in use
+        self.wrist  = np.zeros((max_num, 2))        # Last filtered wrist of each slot
+        self.slot   = np.zeros(0, dtype=int)        # Slot of each hand in last call
+        self.prev_t = None
+
+
+    def reset(self):
+        self.filter.reset()
+        self.valid[:] = False
+        self.slot   = np.zeros(0, dtype=int)
+        self.prev_t = None
+
+
+    def assign(self, wrist):
+        # Greedy assignment of detected hands to slots by nearest wrist
+        slot = -np.ones(len(wrist), dtype=int)
+        free = np.ones(self.max_num, dtype=bool)
+        if len(wrist)==0:
+            return slot
+        dist = np.linalg.norm(wrist[:,None,:] - self.wrist[None,:,:], axis=-1)
+        dist[:, ~self.valid] = np.inf # Prefer slot tracking a hand
+        for _ in range(min(len(wrist), self.max_num)):
+            i, j = np.unravel_index(np.argmin(dist), dist.shape)
+            if not np.isfinite(dist[i,j]): break
+            slot[i] = j
+            free[j] = False
+            dist[i,:] = np.inf
+            dist[:,j] = np.inf
+        # Remaining hands take any free slot
+        for i in np.where(slot<0)[0]:
+            if not np.any(free): break
+            j = int(np.argmax(free))
+            slot[i] = j
+            free[j] = False
+
+        return slot
+
+
+    def apply(self, x, t=None):
+        # x: [n, num_pt, d] landmark of n detected hands (first column is wrist x,y)
+        # Return filtered landmark in the same order as x
+        x = np.asarray(x, dtype=np.float64)
+        n = min(len(x), self.max_num)
+        x = x[:n]
+
+        if t is None:
+            t = time.time()
+        dt = 1/self.fps if self.prev_t is None else max(t-self.prev_t, 1e-3)
+        self.prev_t = t
+
+        slot  = self.assign(x[:,0,:2]) if n>0 else np.zeros(0, dtype=int)
+        valid = np.zeros(self.max_num, dtype=bool)
+        valid[slot] = True
+        new   = valid & ~self.valid # Hand just appeared in slot
+
+        # Fill slot tensor, empty slot keeps last state
+        d = x.shape[-1] if n>0 else 1
+        state = getattr(self.filter, 'x', None)
+        if state is not None and state.shape==(self.max_num, self.num_pt, d):
+            full = state.copy()
+        else:
+            full = np.zeros((self.max_num, self.num_pt, d))
+            new  = valid.copy()
+        full[slot] = x
+
+        out = self.filter(full, dt, new)
+
+        self.valid = valid
+        self.slot  = slot
+        if n>0:
+            self.wrist[slot] = out[slot,0,:2]
+
+        return out[slot]
+
+
+    def forward(self, param, t=None):
+        # Smooth param from MediaPipeHand in place and recompute joint angle
+        hand = [p for p in param if p['class'] is not None]
+        if len(hand)==0:
+            self.valid[:] = False
+            self.slot = np.zeros(0, dtype=int)
+            return param
+
+        key = [k for k in self.scale if k in hand[0]]
+        dim = [hand[0][k].shape[-1] for k in key]
+        x = np.concatenate([np.stack([p[k] for p in hand])*self.scale[k] for k in key], axis=-1)
+        x = self.apply(x, t)
+
+        start = 0
+        for k, d in zip(key, dim):
+            for i, p in enumerate(hand):
+                p[k][...] = x[i,:,start:start+d] / self.scale[k] # In place to keep buffer
+            start += d
+
+        if 'joint' in key:
+            angle = convert_3d_joint_to_angle(np.stack([p['joint'] for p in hand]))
+            for i, p in enumerate(hand):
+                p['angle'] = angle[i]
+
+        return param
+
+
+class GestureDebouncer:
+    def __init__(self, window=5, enter=3, leave=2):
+        # Confirm gesture label of a single hand from the last few frames
+        # so that a flickering label does not trigger redraw or actuator
+
+        # window:
+        #   Number of last frames (M) used for voting
+
+        # enter:
+        #   Number of votes (N) within window required to switch to a new label
+
+        # leave:
+        #   Current label is kept as long as it has at least this many votes
+        #   Hysteresis: leave<enter makes it harder to leave than to enter a label
+
+        self.enter   = enter
+        self.leave   = leave
+        self.history = deque(maxlen=window)
+        self.count   = Counter() # Number of votes of each label within window
+        self.label   = None      # Confirmed label
+
+
+    def reset(self):
+        self.history.clear()
+        self.count.clear()
+        self.label = None
+
+
+    def update(self, label):
+        # label: Raw label of current frame, None if no hand / no valid gesture
+        # Return (prev label, new label) if confirmed label changes else None
+        if len(self.history)==self.history.maxlen:
+            self.count[self.history[0]] -= 1
+        self.history.append(label)
+        self.count[label] += 1
+
+        prev = self.label
+        if label!=prev and self.count[label]>=self.enter and self.count[prev]<self.leave:
+            self.label = label
+        elif prev is not None and self.count[prev]==0:
+            self.label = None # Confirmed label no longer seen at all
+
+        if self.label!=prev:
+            return prev, self.label
+        return None
+
+
+class GestureEvent:
+    def __init__(self, max_num=2, **kwargs):
+        # Debounce label of multiple hands and emit event on confirmed change
+        # Event is a dict of {'slot', 'prev', 'label', 'time'}
+        # Other arguments are passed to GestureDebouncer
+
+        # max_num:
+        #   Maximum number of hands, each hand is tracked in a slot
+        #   e.g. use LandmarkFilter.slot to keep slot consistent across frames
+
+        self.debouncer = [GestureDebouncer(**kwargs) for _ in range(max_num)]
+
+
+    @property
+    def label(self):
+        # Confirmed label of each slot
+        return [d.label for d in self.debouncer]
+
+
+    def update(self, label, slot=None, t=None):
+        # label: List of raw label of detected hands in current frame
+        # slot : Slot of each hand, default to order of detection
+        # Slot without hand in current frame receives None
+        if slot is None:
+            slot = range(len(label))
+        if t is None:
+            t = time.time()
+
+        raw = [None] * len(self.debouncer)
+        for s, l in zip(slot, label):
+            raw[s] = l
+
+        event = []
+        for s, (d, l) in enumerate(zip(self.debouncer, raw)):
+            change = d.update(l)
+            if change is not None:
+                event.append({'slot':s, 'prev':change[0], 'label':change[1], 'time':t})
+
+        return event
@@ -0,0 +1,228 @@
+###############################################################################
+### Useful function for reading frames from webcam, video file or image folder
+### Allow the same pipeline to be replayed offline e.g. for benchmarking
+### And preparing frame for MediaPipe with minimum number of full-frame copy
+###############################################################################
+
+import os
+import cv2
+import glob
+import numpy as np
+
+
+# Supported still image extension
+img_ext = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+def list_image(path):
+    # Expand a folder or a glob pattern into a sorted list of image files
+    if os.path.isdir(path):
+        files = [os.path.join(path, f) for f in os.listdir(path)]
+    else:
+        files = glob.glob(path)
+
+    return sorted([f for f in files if f.lower().endswith(img_ext)])
+
+
+def prepare_frame(img, out=None, flip=False):
+    # Convert BGR to RGB (and optionally flip horizontally) into a reused buffer
+    # instead of allocating a new image for every flip/cvtColor call
+
+    # Note: cv2.flip into the buffer followed by in-place cvtColor
+    # is faster than a single numpy pass img[:,::-1,::-1] as both are SIMD
+    if out is None or out.shape!=img.shape or out.dtype!=img.dtype:
+        out = np.empty_like(img)
+
+    if flip:
+        cv2.flip(img, 1, dst=out)
+        cv2.cvtColor(out, cv2.COLOR_BGR2RGB, dst=out)
+    else:
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=out)
+
+    return out
+
+
+def mirror_landmark(res):
+    # Mirror normalized landmark horizontally x -> 1-x
+    # Equivalent to running MediaPipe on a horizontally flipped image
+    # thus flip for 3rd person view is only needed for display
+    if res is not None:
+        for lm in res.landmark:
+            lm.x = 1 - lm.x
+
+
+class FrameReader:
+    def __init__(self, source=0, loop=1):
+        # source:
+        #   Webcam index (int or digit string) e.g. 0
+        #   Video file e.g. ../data/video.mp4
+        #   Image folder or glob pattern e.g. ../data/sample/*.png
+
+        # loop:
+        #   Number of times to replay a video file or image folder
+        #   Ignored for webcam
+
+        self.loop  = max(1, loop)
+        self.cap   = None
+        self.files = None
+
+        if isinstance(source, int) or str(source).isdigit():
+            self.mode = 'camera'
+            self.cap  = cv2.VideoCapture(int(source))
+        elif os.path.isfile(source) and not source.lower().endswith(img_ext):
+            self.mode = 'video'
+            self.cap  = cv2.VideoCapture(source)
+        else:
+            self.mode  = 'image'
+            self.files = list_image(source)
+            if len(self.files)==0:
+                raise ValueError('No image found in %s' % source)
+
+        self.source = source
+
+
+    def num_frames(self):
+        # Total number of frames to be read, None if unknown e.g. webcam
+        # Note: Not __len__ as len() must return a count >= 0
+        if self.mode=='image':
+            return len(self.files) * self.loop
+        elif self.mode=='video':
+            count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            return count * self.loop if count>0 else None
+        return None
+
+
+    def __iter__(self):
+        # Yield (frame index, name, BGR image)
+        # Name is the image file for image folder, else the source itself
+        index = 0
+        if self.mode=='image':
+            for _ in range(self.loop):
+                for f in self.files:
+                    img = cv2.imread(f)
+                    if img is None: continue # Skip unreadable file
+                    yield index, f, img
+                    index += 1
+
+        elif self.mode=='video':
+            for i in range(self.loop):
+                if i>0: self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0) # Rewind
+                while self.cap.isOpened():
+                    ret, img = self.cap.read()
+                    if not ret: break
+                    yield index, self.source, img
+                    index += 1
+
+        else:
+            while self.cap.isOpened():
+                ret, img = self.cap.read()
+                if not ret: break
+                yield index, self.source, img
+                index += 1
+
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class InferenceRoi:
+    def __init__(self, infer_size=None, crop=False, margin=0.5, min_size=0.25, refresh=30):
+        # Reduce inference cost on high resolution camera e.g. 1080p / 4K
+        # by feeding MediaPipe with a smaller image, landmark is then
+        # mapped back to normalized coordinate of the full frame
+        # so that downstream keypt/joint remain unchanged
+
+        # infer_size:
+        #   Maximum length of the longer side of image used for inference
+        #   None to keep original resolution
+
+        # crop:
+        #   Crop around bounding box of landmark detected in previous frame
+
+        # margin:
+        #   Ratio of bounding box size to pad on each side of the crop
+
+        # min_size:
+        #   Minimum crop size as ratio of the longer side of full frame
+
+        # refresh:
+        #   Use full frame every n frames to pick up newly appeared face/hand/body
+
+        self.infer_size = infer_size
+        self.crop       = crop
+        self.margin     = margin
+        self.min_size   = min_size
+        self.refresh    = refresh
+
+        self.roi   = None # Crop (x0, y0, x1, y1) in full frame pixel
+        self.box   = None # Crop used for current frame (x0, y0, w, h, W, H)
+        self.count = 0
+
+
+    def enabled(self):
+        return self.infer_size is not None or self.crop
+
+
+    def prepare(self, img):
+        # Return cropped and/or downscaled image for inference
+        H, W = img.shape[:2]
+        self.count += 1
+        if self.crop and self.roi is not None and self.count%self.refresh!=0:
+            x0, y0, x1, y1 = self.roi
+        else:
+            x0, y0, x1, y1 = 0, 0, W, H
+        self.box = (x0, y0, x1-x0, y1-y0, W, H)
+
+        sub = img[y0:y1, x0:x1] # View of full frame without copy
+        if self.infer_size is not None and max(sub.shape[:2])>self.infer_size:
+            scale = self.infer_size / max(sub.shape[:2])
+            sub = cv2.resize(sub, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        return sub
+
+
+    def to_full(self, res):
+        # Map normalized landmark in crop to normalized landmark in full frame
+        # Note: Downscaling does not change normalized coordinate
+        if res is None: return
+        x0, y0, w, h, W, H = self.box
+        if w==W and h==H: return
+        for lm in res.landmark:
+            lm.x = (lm.x*w + x0) / W
+            lm.y = (lm.y*h + y0) / H
+            lm.z =  lm.z*w / W # z uses roughly the same scale as x
+
+
+    def update(self, keypt, mirror=False):
+        # Update crop from list of keypt [N,2] in full frame pixel
+        if not self.crop: return
+        x0, y0, w, h, W, H = self.box
+        if len(keypt)==0:
+            self.roi = None # Nothing detected search full frame
+            return
+
+        pt = np.concatenate(keypt, axis=0)
+        if mirror:
+            pt = pt.copy()
+            pt[:,0] = W - pt[:,0] # Back to coordinate of unflipped frame
+        xmin, ymin = pt.min(axis=0)
+        xmax, ymax = pt.max(axis=0)
+
+        # Keep current crop if landmark is still well inside
+        # to avoid shifting the input of MediaPipe tracking every frame
+        if self.roi is not None:
+            rx0, ry0, rx1, ry1 = self.roi
+            pad = 0.1 * min(rx1-rx0, ry1-ry0)
+            if xmin>rx0+pad and ymin>ry0+pad and xmax<rx1-pad and ymax<ry1-pad:
+                return
+
+        # Pad bounding box and enforce minimum size
+        size = max(xmax-xmin, ymax-ymin)
+        size = max(size*(1+2*self.margin), self.min_size*max(W, H))
+        cx, cy = (xmin+xmax)*0.5, (ymin+ymax)*0.5
+        x0 = int(max(0, cx-size*0.5))
+        y0 = int(max(0, cy-size*0.5))
+        x1 = int(min(W, cx+size*0.5))
+        y1 = int(min(H, cy+size*0.5))
+        self.roi = (x0, y0, x1, y1) if x1>x0 and y1>y0 else None
@@ -3,8 +3,11 @@
 ### Joint angle is then used for:
 ### 1) Gesture recognition 
 ### 2) Hand ROM recognition 
+### HandFeature extends joint angle with abduction, fingertip distance,
+### palm orientation and handedness
 ###############################################################################
 
+import os
 import cv2
 import numpy as np
 
@@ -56,23 +59,242 @@ def convert_relative_to_actual_3d_joint_(param, intrin):
     return param['joint_3d']
 
 
+# Parent and child joint of the 20 bones, bone i ends at joint i+1
+bone_parent = [0,1,2,3,0,5,6,7,0,9,10,11,0,13,14,15,0,17,18,19]
+bone_child  = [1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20]
+# Pair of consecutive bones whose angle is the flexion of 15 finger joints
+flexion_pair = ([0,1,2,4,5,6,8,9,10,12,13,14,16,17,18],
+                [1,2,3,5,6,7,9,10,11,13,14,15,17,18,19])
+
+
+def convert_3d_joint_to_angle(joint):
+    # Same as MediaPipeHand.convert_3d_joint_to_angle
+    # but vectorized over leading dimension e.g. [num_hands,21,3] -> [num_hands,15]
+    # Get direction vector of bone from parent to child
+    v1 = joint[...,bone_parent,:] # Parent joint
+    v2 = joint[...,bone_child,:] # Child joint
+    v = v2 - v1 # [...,20,3]
+    # Normalize v
+    v = v/np.linalg.norm(v, axis=-1, keepdims=True)
+
+    # Get angle using arcos of dot product
+    dot = np.einsum('...nt,...nt->...n',
+        v[...,flexion_pair[0],:], v[...,flexion_pair[1],:]) # [...,15]
+
+    return np.degrees(np.arccos(np.clip(dot, -1, 1))) # Convert radian to degree
+
+
+###################################################
+### Extended hand feature with versioned schema ###
+###################################################
+# Each version is a list of (name, size, scale) block
+# Rules to keep logged training data compatible:
+# 1) Never change an existing version, add a new one instead
+# 2) A new version only appends blocks to the previous version
+#    so that data logged with a newer version can be used by an older
+#    version by keeping its first columns (see convert_feature)
+# Version 0 is the 15 flexion angles used by the original training csv
+# scale is the weight applied before KNN so that each block is in a range
+# comparable to a joint angle in degree, data is always logged unscaled
+# thus scale can be tuned without breaking logged data
+# Handedness is weighted like one joint angle (left and right 10 degree apart)
+# so that it only breaks ties between similar poses of both hands
+# and the nearest sample is still decided by pose
+hand_feature_schema = {
+    0: [('flexion'    , 15,  1), # Flexion of finger joints (degree)
+       ],
+    1: [('flexion'    , 15,  1),
+        ('abduction'  ,  5,  1), # Thumb radial / palmar abduction and spread of fingers (degree)
+        ('tip_dist'   ,  7, 45), # Fingertip distances divided by palm size
+        ('palm_normal',  3, 57), # Unit normal of palm pointing to dorsal side
+        ('handedness' ,  1,  5), # +1 right, -1 left, 0 unknown
+       ],
+}
+hand_feature_version = max(hand_feature_schema)
+
+
+def feature_size(version=hand_feature_version):
+    return sum(size for name, size, scale in hand_feature_schema[version])
+
+
+def feature_slice(name, version=hand_feature_version):
+    # Columns of feature block name in a feature vector of version
+    start = 0
+    for n, size, scale in hand_feature_schema[version]:
+        if n==name:
+            return slice(start, start+size)
+        start += size
+    raise KeyError('Feature %s not in version %d' % (name, version))
+
+
+def feature_weight(version=hand_feature_version):
+    return np.concatenate([np.full(size, scale, dtype=np.float32)
+        for name, size, scale in hand_feature_schema[version]])
+
+
+def feature_version(size):
+    # Version of logged feature is found by its number of columns
+    # Return None if it does not match any version
+    for v in hand_feature_schema:
+        if feature_size(v)==size:
+            return v
+    return None
+
+
+def convert_feature(data, version=hand_feature_version):
+    # data: [n,m] logged feature (without label) of any version
+    # Return [n,feature_size(version)] data with columns of the given version
+    data = np.asarray(data)
+    v = feature_version(data.shape[-1])
+    if v is None:
+        raise ValueError('Unknown hand feature with %d columns' % data.shape[-1])
+    if v<version:
+        raise ValueError('Hand feature of version %d cannot be converted to version %d, '
+            'log training data again' % (v, version))
+    return data[...,:feature_size(version)]
+
+
+class HandFeature:
+    def __init__(self, version=hand_feature_version):
+        # version:
+        #   Version of hand_feature_schema to compute
+
+        # Intermediate values e.g. bone vectors and palm normal are computed
+        # once per frame on first use and shared by all feature blocks
+        # Note: Feature is computed from joint (normalized x,y and relative z)
+        #       same as the flexion angle of MediaPipeHand
+
+        self.version = version
+        self.schema  = hand_feature_schema[version]
+        self.size    = feature_size(version)
+        self.weight  = feature_weight(version)
+        self.cache   = {}
+
+
+    def get(self, name):
+        # Compute intermediate value on first use in this frame
+        if name not in self.cache:
+            self.cache[name] = getattr(self, 'compute_'+name)()
+        return self.cache[name]
+
+
+    def compute_bone(self):
+        # Vector of 20 bones from parent to child [...,20,3]
+        j = self.cache['joint']
+        return j[...,bone_child,:] - j[...,bone_parent,:]
+
+
+    def compute_length(self):
+        return np.linalg.norm(self.get('bone'), axis=-1) # [...,20]
+
+
+    def compute_unit(self):
+        return self.get('bone') / np.maximum(self.get('length'), 1e-8)[...,None]
+
+
+    def compute_normal(self):
+        # Normal of plane spanned by index and little finger metacarpal
+        # Sign is flipped for left hand so that it points to dorsal side of both hands
+        b = self.get('bone')
+        n = np.cross(b[...,4,:], b[...,16,:])
+        n = n / np.maximum(np.linalg.norm(n, axis=-1, keepdims=True), 1e-8)
+        side = self.cache['side']
+        return n * np.where(side<0, -1, 1)[...,None]
+
+
+    def compute_inplane(self):
+        # Unit bone projected onto palm plane for in-plane angles
+        u = self.get('unit')
+        n = self.get('normal')[...,None,:]
+        p = u - np.sum(u*n, axis=-1, keepdims=True)*n
+        return p / np.maximum(np.linalg.norm(p, axis=-1, keepdims=True), 1e-8)
+
+
+    def compute_flexion(self):
+        u = self.get('unit')
+        dot = np.einsum('...nt,...nt->...n', u[...,flexion_pair[0],:], u[...,flexion_pair[1],:])
+        return np.degrees(np.arccos(np.clip(dot, -1, 1)))
+
+
+    def compute_abduction(self):
+        p = self.get('inplane')
+        # Thumb radial abduction: In-plane angle between thumb and index metacarpal
+        # Spread between proximal phalanx of adjacent fingers
+        dot = np.einsum('...nt,...nt->...n', p[...,[1,5,9,13],:], p[...,[4,9,13,17],:])
+        inplane = np.degrees(np.arccos(np.clip(dot, -1, 1))) # [...,4]
+        # Thumb palmar abduction: Angle of thumb metacarpal out of palm plane
+        # Note: This separates palmar abduction from radial abduction / opposition
+        #       which look alike in flexion angles
+        out = np.sum(self.get('unit')[...,1,:]*self.get('normal'), axis=-1)
+        out = np.degrees(np.arcsin(np.clip(out, -1, 1)))
+        return np.concatenate([inplane[...,:1], out[...,None], inplane[...,1:]], axis=-1)
+
+
+    def compute_tip_dist(self):
+        # Thumb tip to other tips (opposition) and between adjacent tips
+        # divided by palm size (wrist to middle finger MCP) to be scale invariant
+        j = self.cache['joint']
+        d = np.linalg.norm(j[...,[4,4,4,4,8,12,16],:] - j[...,[8,12,16,20,12,16,20],:], axis=-1)
+        return d / np.maximum(self.get('length')[...,8:9], 1e-8)
+
+
+    def compute_palm_normal(self):
+        return self.get('normal')
+
+
+    def compute_handedness(self):
+        return self.cache['side'][...,None].astype(np.float64)
+
+
+    def forward(self, joint, handedness=None):
+        # joint     : [...,21,3] joint of one or more hands
+        # handedness: 'left' / 'right' / None, or list of it for each hand
+        # Return [...,size] feature vector
+        joint = np.asarray(joint, dtype=np.float64)
+        if handedness is None or isinstance(handedness, str):
+            handedness = np.full(joint.shape[:-2], handedness, dtype=object)
+        side = np.array([{'right':1, 'left':-1}.get(str(h).lower(), 0)
+            for h in np.ravel(handedness)]).reshape(joint.shape[:-2])
+
+        self.cache = {'joint':joint, 'side':side} # New frame
+        return np.concatenate([self.get(name) for name, size, scale in self.schema], axis=-1)
+
+
 #############################################################
 ### Simple gesture recognition from joint angle using KNN ###
 #############################################################
 class GestureRecognition:
-    def __init__(self, mode='train'):
+    def __init__(self, mode='train', model='knn', reject=False):
         super(GestureRecognition, self).__init__()
 
+        # model:
+        #   'knn'     : OpenCV KNN, query cost grows with training data
+        #   'logistic': Multinomial logistic regression (see utils_classifier.py)
+        #   'tree'    : Decision tree
+        #   Other than knn, model is trained from .csv on first use and saved to
+        #   ../data/cache/gesture_train_<model>.npz, trained again when .csv is newer
+        #   or setting of model has changed
+
+        # reject:
+        #   Return 'unknown' for a hand pose far from all training samples of
+        #   its predicted class, per class distance threshold is calibrated
+        #   from training data (see OpenSetThreshold in utils_classifier.py)
+        #   Confidence of each hand of last eval is kept in self.confidence
+
         # 11 types of gesture 'name':class label
         self.gesture = {
             'fist':0,'one':1,'two':2,'three':3,'four':4,'five':5,'six':6,
             'rock':7,'spiderman':8,'yeah':9,'ok':10,
         }
+        self.model      = model
+        self.unknown    = 'unknown'
+        self.threshold  = None
+        self.confidence = []
 
         if mode=='train':
             # Create .csv file to log training data
             self.file = open('../data/gesture_train.csv', 'a+')
-        elif mode=='eval':
+        elif mode=='eval' and model=='knn':
             # Load training data
             file = np.genfromtxt('../data/gesture_train.csv', delimiter=',')
             # Extract input joint angles
@@ -82,6 +304,25 @@ class GestureRecognition:
             # Use OpenCV KNN
             self.knn = cv2.ml.KNearest_create()
             self.knn.train(angle, cv2.ml.ROW_SAMPLE, label)
+        if mode=='eval' and model!='knn':
+            # Note: Import here as utils_classifier imports this file
+            from utils_classifier import (load_data, create_classifier, model_kwargs,
+                save_model, load_model, load_model_kwargs)
+            csv  = '../data/gesture_train.csv'
+            path = '../data/cache/gesture_train_%s.npz' % model
+            self.clf = create_classifier(model)
+            # Reuse saved model only if it is newer than .csv and has the same setting
+            if os.path.isfile(path) and os.path.getmtime(path)>=os.path.getmtime(csv) and \
+                load_model_kwargs(path)==(model, model_kwargs(self.clf)):
+                self.clf = load_model(path)
+            else:
+                self.clf.train(*load_data(csv))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                save_model(self.clf, path)
+        if mode=='eval' and reject:
+            from utils_classifier import load_data, OpenSetThreshold
+            self.threshold = OpenSetThreshold()
+            self.threshold.train(*load_data('../data/gesture_train.csv'))
 
 
     def train(self, angle, label):
@@ -91,21 +332,54 @@ class GestureRecognition:
         
 
     def eval(self, angle):
-        # Use KNN for gesture recognition
-        data = np.asarray([angle], dtype=np.float32)
-        ret, results, neighbours ,dist = self.knn.findNearest(data, 3)
-        idx = int(results[0][0]) # Index of class label
-
-        return list(self.gesture)[idx] # Return name of class label
+        return self.eval_batch([angle])[0]
+
+
+    def eval_batch(self, angle):
+        # angle: [n,15] joint angle of n hands e.g. all hands of a frame
+        # Return list of n names of class label
+        data = np.asarray(angle, dtype=np.float32).reshape(-1, 15)
+        if self.model=='knn':
+            # Use KNN for gesture recognition
+            # Note: Same nearest distance and vote as fan.py so that rejection agrees
+            from utils_classifier import knn_nearest
+            ret, results, neighbours ,dist = self.knn.findNearest(data, 3)
+            idx = results[:,0].astype(int) # Index of class label
+            near, vote = knn_nearest(results[:,0], neighbours, dist)
+        else:
+            idx = self.clf.predict(data)
+            vote = np.max(self.clf.predict_proba(data), axis=1) \
+                if hasattr(self.clf, 'predict_proba') else np.ones(len(idx))
+            if self.threshold is not None:
+                near = self.threshold.nearest(data, idx)
+
+        name = list(self.gesture)
+        if self.threshold is None:
+            self.confidence = vote.tolist()
+            return [name[i] for i in idx] # Return name of class label
+
+        # Open set rejection
+        accept, self.confidence = self.threshold.check(idx, near, vote)
+        self.confidence = self.confidence.tolist()
+        return [name[i] if a else self.unknown for i, a in zip(idx, accept)]
 
 
 ##############################################################
 ### Simple hand ROM recognition from joint angle using KNN ###
 ##############################################################
 class HandRomRecognition:
-    def __init__(self, mode='train'):
+    def __init__(self, mode='train', version=0):
         super(HandRomRecognition, self).__init__()
 
+        # version:
+        #   Version of hand_feature_schema, 0 for the 15 joint angles only
+        #   Version 1 adds thumb palmar abduction and opposition distance
+        #   to better separate class 5 and 6
+        #   Each version logs to its own .csv file
+        self.version = version
+        self.extract = HandFeature(version)
+        name = '../data/handrom_train.csv' if version==0 else '../data/handrom_train_v%d.csv' % version
+
         # 13 types of hand ROM 'name':class label
         self.gesture = {
             'Finger MCP Flexion'    :0,
@@ -126,12 +400,12 @@ class HandRomRecognition:
 
         if mode=='train':
             # Create .csv file to log training data
-            self.file = open('../data/handrom_train.csv', 'a+')
+            self.file = open(name, 'a+')
         elif mode=='eval':
             # Load training data
-            file = np.genfromtxt('../data/handrom_train.csv', delimiter=',')
-            # Extract input joint angles
-            angle = file[:,:-1].astype(np.float32)
+            file = np.genfromtxt(name, delimiter=',')
+            # Extract input feature scaled for KNN
+            angle = convert_feature(file[:,:-1], version).astype(np.float32) * self.extract.weight
             # Extract output class label
             label = file[:, -1].astype(np.float32)
             # Use OpenCV KNN
@@ -139,6 +413,13 @@ class HandRomRecognition:
             self.knn.train(angle, cv2.ml.ROW_SAMPLE, label)
 
 
+    def feature(self, param):
+        # Feature vector of one hand param from MediaPipeHand to train / eval
+        if self.version==0:
+            return param['angle']
+        return self.extract.forward(param['joint'], param['class'])
+
+
     def train(self, angle, label):
         # Log training data
         data = np.append(angle, label) # Combine into one array
@@ -147,7 +428,7 @@ class HandRomRecognition:
 
     def eval(self, angle):
         # Use KNN for gesture recognition
-        data = np.asarray([angle], dtype=np.float32)
+        data = np.asarray([angle], dtype=np.float32) * self.extract.weight
         ret, results, neighbours ,dist = self.knn.findNearest(data, 3)
         idx = int(results[0][0]) # Index of class label
 
@@ -3,10 +3,11 @@
 ### https://github.com/google/mediapipe
 ###############################################################################
 
-import cv2
 import numpy as np
 import mediapipe as mp
 
+from utils_frame import prepare_frame, mirror_landmark, InferenceRoi
+
 
 # Define default camera intrinsic
 img_width  = 640
@@ -21,8 +22,16 @@ intrin_default = {
 }
 
 
+def check_cache(cache, static_image_mode):
+    # Landmark cache is only valid for static image mode
+    # In video mode result depends on previous frames due to tracking
+    if cache is not None and not static_image_mode:
+        raise ValueError('Landmark cache requires static_image_mode=True')
+    return cache
+
+
 class MediaPipeFace:
-    def __init__(self, static_image_mode=True, max_num_faces=1):
+    def __init__(self, static_image_mode=True, max_num_faces=1, cache=None, infer_size=None, crop=False):
         # Access MediaPipe Solutions Python API
         mp_faces = mp.solutions.face_mesh
 
@@ -54,6 +63,19 @@ class MediaPipeFace:
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5)
 
+        # Model setting used as part of the key for landmark cache
+        self.setting = {'model':'face', 'max_num_faces':max_num_faces,
+            'infer_size':infer_size, 'crop':crop}
+        self.cache = check_cache(cache, static_image_mode)
+        self.rgb   = None # Reused buffer of RGB image
+
+        # Inference on downscaled frame or crop around previous landmark
+        # infer_size:
+        #   Maximum length of longer side of image fed to MediaPipe e.g. 640
+        # crop:
+        #   Crop around landmark of previous frame, mainly for video (static_image_mode=False)
+        self.roi = InferenceRoi(infer_size, crop)
+
         # Define face parameter
         self.param = []
         for i in range(max_num_faces):
@@ -90,21 +112,51 @@ class MediaPipeFace:
         return self.param
 
 
-    def forward(self, img):
-        # Preprocess image
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    def forward(self, img, mirror=False):
+        # mirror:
+        #   Return landmark as if img is flipped horizontally
+        #   Avoid flipping the full frame before inference when flip is only for display
+
+        setting = self.setting if not mirror else dict(self.setting, mirror=True)
+
+        # Skip inference if result of the same image is cached
+        if self.cache is not None and self.cache.load(img, setting, self.param):
+            return self.param
+
+        # Crop and/or downscale frame to reduce inference cost
+        sub = self.roi.prepare(img) if self.roi.enabled() else img
+
+        # Preprocess image into reused buffer
+        self.rgb = prepare_frame(sub, self.rgb)
 
         # Extract result
-        result = self.pipe.process(img)
+        result = self.pipe.process(self.rgb)
+
+        # Map landmark of crop back to full frame
+        if self.roi.enabled():
+            for res in result.multi_face_landmarks or []:
+                self.roi.to_full(res)
+
+        # Mirror landmark instead of flipping the input image
+        if mirror and result.multi_face_landmarks is not None:
+            for res in result.multi_face_landmarks:
+                mirror_landmark(res)
 
         # Convert result to my own param
         param = self.result_to_param(result, img)
 
+        # Update crop for next frame
+        if self.roi.enabled():
+            self.roi.update([p['keypt'] for p in param if p['detect']], mirror)
+
+        if self.cache is not None:
+            self.cache.save(img, setting, param)
+
         return param
 
 
 class MediaPipeHand:
-    def __init__(self, static_image_mode=True, max_num_hands=1, intrin=None):
+    def __init__(self, static_image_mode=True, max_num_hands=1, intrin=None, cache=None, infer_size=None, crop=False):
         self.max_num_hands = max_num_hands
         if intrin is None:
             self.intrin = intrin_default
@@ -143,6 +195,19 @@ class MediaPipeHand:
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5)
 
+        # Model setting used as part of the key for landmark cache
+        self.setting = {'model':'hand', 'max_num_hands':max_num_hands, 'intrin':self.intrin,
+            'infer_size':infer_size, 'crop':crop}
+        self.cache = check_cache(cache, static_image_mode)
+        self.rgb   = None # Reused buffer of RGB image
+
+        # Inference on downscaled frame or crop around previous landmark
+        # infer_size:
+        #   Maximum length of longer side of image fed to MediaPipe e.g. 640
+        # crop:
+        #   Crop around landmark of previous frame, mainly for video (static_image_mode=False)
+        self.roi = InferenceRoi(infer_size, crop)
+
         # Define hand parameter
         self.param = []
         for i in range(max_num_hands):
@@ -271,21 +336,56 @@ class MediaPipeHand:
         param['joint_3d'][:,2] += Zwrist      
 
 
-    def forward(self, img):
-        # Preprocess image
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    def forward(self, img, mirror=False):
+        # mirror:
+        #   Return landmark as if img is flipped horizontally
+        #   Avoid flipping the full frame before inference when flip is only for display
+
+        setting = self.setting if not mirror else dict(self.setting, mirror=True)
+
+        # Skip inference if result of the same image is cached
+        if self.cache is not None and self.cache.load(img, setting, self.param):
+            return self.param
+
+        # Crop and/or downscale frame to reduce inference cost
+        sub = self.roi.prepare(img) if self.roi.enabled() else img
+
+        # Preprocess image into reused buffer
+        self.rgb = prepare_frame(sub, self.rgb)
 
         # Extract result
-        result = self.pipe.process(img)
+        result = self.pipe.process(self.rgb)
+
+        # Map landmark of crop back to full frame
+        if self.roi.enabled():
+            for res in result.multi_hand_landmarks or []:
+                self.roi.to_full(res)
+
+        # Mirror landmark instead of flipping the input image
+        if mirror and result.multi_hand_landmarks is not None:
+            for res in result.multi_hand_landmarks:
+                mirror_landmark(res)
+            # Note: Handedness assumes input image is flipped thus need to swap label
+            #       so that it is anatomical, same as body / holistic
+            for res in result.multi_handedness:
+                c = res.classification[0]
+                c.label = 'Left' if c.label=='Right' else 'Right'
 
         # Convert result to my own param
         param = self.result_to_param(result, img)
 
+        # Update crop for next frame
+        if self.roi.enabled():
+            self.roi.update([p['keypt'] for p in param if p['class'] is not None], mirror)
+
+        if self.cache is not None:
+            self.cache.save(img, setting, param)
+
         return param
 
 
 class MediaPipeBody:
-    def __init__(self, static_image_mode=True, model_complexity=1, intrin=None):
+    def __init__(self, static_image_mode=True, model_complexity=1, intrin=None, cache=None, infer_size=None, crop=False):
         if intrin is None:
             self.intrin = intrin_default
         else:
@@ -329,6 +429,19 @@ class MediaPipeBody:
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5)
 
+        # Model setting used as part of the key for landmark cache
+        self.setting = {'model':'body', 'model_complexity':model_complexity, 'intrin':self.intrin,
+            'infer_size':infer_size, 'crop':crop}
+        self.cache = check_cache(cache, static_image_mode)
+        self.rgb   = None # Reused buffer of RGB image
+
+        # Inference on downscaled frame or crop around previous landmark
+        # infer_size:
+        #   Maximum length of longer side of image fed to MediaPipe e.g. 640
+        # crop:
+        #   Crop around landmark of previous frame, mainly for video (static_image_mode=False)
+        self.roi = InferenceRoi(infer_size, crop)
+
         # Define body parameter
         self.param = {
                 'detect'  : False, # Boolean to indicate whether a person is detected
@@ -391,21 +504,54 @@ class MediaPipeBody:
         # thus the step to convert to camera coor is ignored
 
 
-    def forward(self, img):
-        # Preprocess image
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    def forward(self, img, mirror=False):
+        # mirror:
+        #   Return landmark x as if img is flipped horizontally
+        #   Avoid flipping the full frame before inference when flip is only for display
+        #   Note: Unlike a flipped frame, left/right landmark keep anatomical labels
+        #         i.e. left shoulder is still the left shoulder of the person
+        #         (same as handedness of MediaPipeHand with mirror)
+
+        setting = self.setting if not mirror else dict(self.setting, mirror=True)
+
+        # Skip inference if result of the same image is cached
+        if self.cache is not None and self.cache.load(img, setting, self.param):
+            return self.param
+
+        # Crop and/or downscale frame to reduce inference cost
+        sub = self.roi.prepare(img) if self.roi.enabled() else img
+
+        # Preprocess image into reused buffer
+        self.rgb = prepare_frame(sub, self.rgb)
 
         # Extract result
-        result = self.pipe.process(img)
+        result = self.pipe.process(self.rgb)
+
+        # Map landmark of crop back to full frame
+        if self.roi.enabled():
+            for res in [result.pose_landmarks]:
+                self.roi.to_full(res)
+
+        # Mirror landmark instead of flipping the input image
+        # Note: Left/right pose landmark follow anatomy thus are not swapped
+        if mirror:
+            mirror_landmark(result.pose_landmarks)
 
         # Convert result to my own param
         param = self.result_to_param(result, img)
 
+        # Update crop for next frame
+        if self.roi.enabled():
+            self.roi.update([param['keypt']] if param['detect'] else [], mirror)
+
+        if self.cache is not None:
+            self.cache.save(img, setting, param)
+
         return param
 
 
 class MediaPipeHolistic:
-    def __init__(self, static_image_mode=True, model_complexity=1, intrin=None):
+    def __init__(self, static_image_mode=True, model_complexity=1, intrin=None, cache=None, infer_size=None, crop=False):
         if intrin is None:
             self.intrin = intrin_default
         else:
@@ -449,6 +595,19 @@ class MediaPipeHolistic:
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5)
 
+        # Model setting used as part of the key for landmark cache
+        self.setting = {'model':'holistic', 'model_complexity':model_complexity, 'intrin':self.intrin,
+            'infer_size':infer_size, 'crop':crop}
+        self.cache = check_cache(cache, static_image_mode)
+        self.rgb   = None # Reused buffer of RGB image
+
+        # Inference on downscaled frame or crop around previous landmark
+        # infer_size:
+        #   Maximum length of longer side of image fed to MediaPipe e.g. 640
+        # crop:
+        #   Crop around landmark of previous frame, mainly for video (static_image_mode=False)
+        self.roi = InferenceRoi(infer_size, crop)
+
         # Define face parameter
         self.param_fc = {
                 'detect'  : False, # Boolean to indicate whether a face is detected
@@ -665,21 +824,59 @@ class MediaPipeHolistic:
             param_rh['joint_3d'] += -param_rh['joint_3d'][0] + param_bd['joint_3d'][16] # Right wrist joint
 
 
-    def forward(self, img):
-        # Preprocess image
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    def forward(self, img, mirror=False):
+        # mirror:
+        #   Return landmark x as if img is flipped horizontally
+        #   Avoid flipping the full frame before inference when flip is only for display
+        #   Note: Unlike a flipped frame, left/right landmark keep anatomical labels
+        #         i.e. left shoulder is still the left shoulder of the person
+        #         (same as handedness of MediaPipeHand with mirror)
+
+        setting = self.setting if not mirror else dict(self.setting, mirror=True)
+
+        # Skip inference if result of the same image is cached
+        param = (self.param_fc, self.param_lh, self.param_rh, self.param_bd)
+        if self.cache is not None and self.cache.load(img, setting, param):
+            return param
+
+        # Crop and/or downscale frame to reduce inference cost
+        sub = self.roi.prepare(img) if self.roi.enabled() else img
+
+        # Preprocess image into reused buffer
+        self.rgb = prepare_frame(sub, self.rgb)
 
         # Extract result
-        result = self.pipe.process(img)
+        result = self.pipe.process(self.rgb)
+
+        # Map landmark of crop back to full frame
+        if self.roi.enabled():
+            for res in [result.face_landmarks, result.left_hand_landmarks, result.right_hand_landmarks, result.pose_landmarks]:
+                self.roi.to_full(res)
+
+        # Mirror landmark instead of flipping the input image
+        if mirror:
+            # Note: Left/right hand and pose landmark are labelled by the body model
+            #       thus they already follow anatomy and are not swapped
+            mirror_landmark(result.face_landmarks)
+            mirror_landmark(result.left_hand_landmarks)
+            mirror_landmark(result.right_hand_landmarks)
+            mirror_landmark(result.pose_landmarks)
 
         # Convert result to my own param
         param = self.result_to_param(result, img)
 
+        # Update crop for next frame
+        if self.roi.enabled():
+            self.roi.update([p['keypt'] for p in param if p.get('detect', p.get('class') is not None)], mirror)
+
+        if self.cache is not None:
+            self.cache.save(img, setting, param)
+
         return param
 
 
 class MediaPipeObjectron:
-    def __init__(self, static_image_mode=True, max_num_objects=5, model_name='Shoe', intrin=None):
+    def __init__(self, static_image_mode=True, max_num_objects=5, model_name='Shoe', intrin=None, cache=None):
         self.max_num_objects = max_num_objects
 
         # Access MediaPipe Solutions Python API
@@ -729,6 +926,12 @@ class MediaPipeObjectron:
                 image_size=(intrin['width'],intrin['height']),
                 model_name=model_name.capitalize())
 
+        # Model setting used as part of the key for landmark cache
+        self.setting = {'model':'objectron', 'max_num_objects':max_num_objects,
+            'model_name':model_name.capitalize(), 'intrin':intrin}
+        self.cache = check_cache(cache, static_image_mode)
+        self.rgb   = None # Reused buffer of RGB image
+
         # Define face parameter
         self.param = []
         for i in range(max_num_objects):
@@ -808,13 +1011,20 @@ class MediaPipeObjectron:
 
 
     def forward(self, img):
-        # Preprocess image
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        # Skip inference if result of the same image is cached
+        if self.cache is not None and self.cache.load(img, self.setting, self.param):
+            return self.param
+
+        # Preprocess image into reused buffer
+        self.rgb = prepare_frame(img, self.rgb)
 
         # Extract result
-        result = self.pipe.process(img)
+        result = self.pipe.process(self.rgb)
 
         # Convert result to my own param
         param = self.result_to_param(result, img)
 
-        return param
\ No newline at end of file
+        if self.cache is not None:
+            self.cache.save(img, self.setting, param)
+
+        return param
@@ -0,0 +1,246 @@
+###############################################################################
+### Privacy filter to pixelate / blur / mask many regions of a frame
+### e.g. hands showing a rude gesture or faces of bystanders
+### Regions are filtered in place without cropping a copy of each region:
+### pixelate samples all blocks from one shared grid of the frame so that
+### overlapping regions agree, and each pixel of a region is written once,
+### thus the cost of a crowded frame grows with the censored area only
+### FaceAnonymizer restricts the filter to convex hull of face landmark
+###############################################################################
+
+import os
+import cv2
+import numpy as np
+
+from utils_schedule import iter_param, is_detect
+
+
+def clip_box(box, shape):
+    # box  : [n,4] (x1, y1, x2, y2) in pixel, may lie partly outside the frame
+    # shape: Shape of image (height, width, ...)
+    # Return [n,4] int box clamped to frame, empty box has x1==x2 or y1==y2
+    box = np.asarray(box, dtype=np.float64).reshape(-1, 4)
+    h, w = shape[:2]
+    box = np.round(box).astype(int)
+    box[:,[0,2]] = np.clip(box[:,[0,2]], 0, w)
+    box[:,[1,3]] = np.clip(box[:,[1,3]], 0, h)
+    box[:,2] = np.maximum(box[:,2], box[:,0])
+    box[:,3] = np.maximum(box[:,3], box[:,1])
+    return box
+
+
+def keypt_to_box(keypt, shape, margin=0.1, min_size=8):
+    # keypt : [n,k,2] keypt in pixel of n hands / faces
+    # margin: Ratio of box size to pad on each side
+    #         Unlike scaling corner by 0.95/1.05, padding does not depend
+    #         on where the region is in the frame
+    # Return [n,4] box clamped to frame
+    keypt = np.asarray(keypt, dtype=np.float64)
+    if keypt.size==0:
+        return np.zeros((0, 4), dtype=int)
+    keypt = keypt.reshape(len(keypt), -1, keypt.shape[-1])[...,:2]
+    lo = keypt.min(axis=1)
+    hi = keypt.max(axis=1)
+    pad = np.maximum((hi - lo) * margin, min_size/2)
+    return clip_box(np.concatenate([lo - pad, hi + pad], axis=1), shape)
+
+
+def param_to_box(param, shape, margin=0.1, min_size=8):
+    # Box of every detected hand / face / body of param from utils_mediapipe
+    keypt = [p['keypt'] for p in iter_param(param) if is_detect(p)]
+    return keypt_to_box(keypt, shape, margin, min_size)
+
+
+# Index of face landmark that can lie on the convex hull of the face
+face_hull_cache = None
+
+
+def face_hull_index(file=None, yaw=60, pitch=30, step=10):
+    # Only a few of the 468 face landmark can be on the outline of the face
+    # Collect landmark on 2D convex hull of canonical face model over a range
+    # of head rotation (degree), computed once and cached
+    global face_hull_cache
+    if file is None and face_hull_cache is not None:
+        return face_hull_cache
+
+    path = file or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        '..', 'data', 'canonical_face_model.obj')
+    with open(path) as f:
+        vert = np.array([l.split()[1:4] for l in f if l.startswith('v ')], dtype=np.float64)
+
+    index = set()
+    for y in np.radians(np.arange(-yaw, yaw+1, step)):
+        for p in np.radians(np.arange(-pitch, pitch+1, step)):
+            ry = np.array([[np.cos(y),0,np.sin(y)], [0,1,0], [-np.sin(y),0,np.cos(y)]])
+            rx = np.array([[1,0,0], [0,np.cos(p),-np.sin(p)], [0,np.sin(p),np.cos(p)]])
+            pt = (vert @ (rx @ ry).T)[:,:2].astype(np.float32)
+            index.update(cv2.convexHull(pt, returnPoints=False).ravel().tolist())
+
+    index = np.array(sorted(index))
+    if file is None:
+        face_hull_cache = index
+    return index
+
+
+def merge_box(box):
+    # Merge overlapping boxes so that no pixel is filtered twice
+    # Return [m,4] merged box and [n] index of merged box containing each box
+    if len(box)==0:
+        return np.zeros((0, 4), dtype=int), np.zeros(0, dtype=int)
+    orig = np.asarray(box, dtype=int).reshape(-1, 1, 4)
+    box = [list(b) for b in box]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(box)):
+            for j in range(i+1, len(box)):
+                a, b = box[i], box[j]
+                if a[0]<b[2] and b[0]<a[2] and a[1]<b[3] and b[1]<a[3]:
+                    box[i] = [min(a[0],b[0]), min(a[1],b[1]), max(a[2],b[2]), max(a[3],b[3])]
+                    box.pop(j)
+                    merged = True
+                    break
+            if merged:
+                break
+    box = np.array(box, dtype=int).reshape(-1, 4)
+    inside = (box[:,:2]<=orig[...,:2]).all(axis=2) & (box[:,2:]>=orig[...,2:]).all(axis=2)
+    return box, inside.argmax(axis=1)
+
+
+class PrivacyFilter:
+    def __init__(self, method='pixelate', block=16, ksize=31, color=(0,0,0)):
+        # method:
+        #   'pixelate': Replace each block by one pixel sampled from the block
+        #   'blur'    : Box blur, cost per pixel does not depend on ksize
+        #   'mask'    : Fill with solid color
+
+        # block:
+        #   Size (pixel) of block for pixelate
+        #   Block grid is aligned to the frame so it does not shift with region
+
+        # ksize:
+        #   Kernel size (pixel) for blur
+
+        # color:
+        #   Fill color for mask
+
+        if method not in ('pixelate', 'blur', 'mask'):
+            raise ValueError('Unknown privacy filter method: %s' % method)
+
+        self.method = method
+        self.block  = block
+        self.ksize  = ksize
+        self.color  = tuple(int(c) for c in color)
+
+
+    def pixelate(self, img, box):
+        # Snap box outward to block grid, then every box reads from the same
+        # sample of the frame (a view, no copy) so overlap needs no merge
+        # Return list of (box, filtered image of box)
+        b = self.block
+        grid = img[::b, ::b] # One sample per block
+        gx1, gy1 = box[:,0]//b, box[:,1]//b
+        gx2, gy2 = -(-box[:,2]//b), -(-box[:,3]//b)
+        h, w = img.shape[:2]
+        out = []
+        for x1, y1, x2, y2 in zip(gx1, gy1, gx2, gy2):
+            sub = cv2.resize(grid[y1:y2, x1:x2], ((x2-x1)*b, (y2-y1)*b),
+                interpolation=cv2.INTER_NEAREST)
+            X2, Y2 = min(x2*b, w), min(y2*b, h) # Last block may be cut by frame
+            out.append(((x1*b, y1*b, X2, Y2), sub[:Y2-y1*b, :X2-x1*b]))
+        return out
+
+
+    def blur(self, img, box):
+        # Blur a view padded by half the kernel so that border of region
+        # looks the same as blurring the full frame
+        # Overlapping boxes are blurred once as their merged box, but only
+        # the original boxes are returned so that no other pixel is censored
+        r = self.ksize//2
+        h, w = img.shape[:2]
+        merged, group = merge_box(box)
+        out = []
+        for i, (x1, y1, x2, y2) in enumerate(merged):
+            px1, py1 = max(x1-r, 0), max(y1-r, 0)
+            px2, py2 = min(x2+r, w), min(y2+r, h)
+            sub = cv2.blur(img[py1:py2, px1:px2], (self.ksize, self.ksize))
+            for bx1, by1, bx2, by2 in box[group==i]:
+                out.append(((bx1, by1, bx2, by2), sub[by1-py1:by2-py1, bx1-px1:bx2-px1]))
+        return out
+
+
+    def mask(self, img, box, hull=None):
+        # Fill in place, faster than assigning color to a numpy view
+        if hull is not None:
+            for h in hull:
+                cv2.fillConvexPoly(img, h, self.color)
+            return
+        for x1, y1, x2, y2 in box:
+            cv2.rectangle(img, (int(x1), int(y1)), (int(x2)-1, int(y2)-1), self.color, -1)
+
+
+    def forward(self, img, box, hull=None):
+        # img : Image to be filtered in place
+        # box : [n,4] (x1, y1, x2, y2) regions in pixel e.g. from param_to_box
+        # hull: Optional list of n convex polygon [k,2] int32 in pixel
+        #       only pixels inside the polygon of each box are filtered
+        # Return img
+        box  = clip_box(box, img.shape)
+        keep = (box[:,2]>box[:,0]) & (box[:,3]>box[:,1])
+        box  = box[keep]
+        if len(box)==0:
+            return img
+        if hull is not None:
+            hull = [h for h, k in zip(hull, keep) if k]
+
+        if self.method=='mask':
+            self.mask(img, box, hull)
+            return img
+
+        for (x1, y1, x2, y2), sub in getattr(self, self.method)(img, box):
+            if hull is None:
+                img[y1:y2, x1:x2] = sub
+                continue
+            # Polygons are drawn on a small mask of the region only
+            offset = np.array([x1, y1], dtype=np.int32)
+            mask = np.zeros((y2-y1, x2-x1), dtype=np.uint8)
+            for h, (bx1, by1, bx2, by2) in zip(hull, box):
+                if bx1<x2 and x1<bx2 and by1<y2 and y1<by2:
+                    cv2.fillConvexPoly(mask, h - offset, 1)
+            # Note: cv2.copyTo is much faster than numpy masked copy, dst is made
+            # contiguous as older OpenCV does not write into a non-contiguous view
+            img[y1:y2, x1:x2] = cv2.copyTo(sub, mask, np.ascontiguousarray(img[y1:y2, x1:x2]))
+
+        return img
+
+
+class FaceAnonymizer:
+    def __init__(self, method='blur', block=16, ksize=31, color=(0,0,0), margin=0.1):
+        # Blur / pixelate / mask face inside convex hull of face landmark
+        # Hull is computed from the cached subset of landmark instead of all 468
+
+        # margin:
+        #   Ratio to enlarge hull about its center to cover hair line and chin
+
+        self.censor = PrivacyFilter(method, block, ksize, color)
+        self.margin = margin
+        self.index  = face_hull_index()
+
+
+    def hull(self, keypt):
+        # keypt: [n,468,2] keypt in pixel of n faces
+        # Return list of n convex polygon [k,2] int32 and [n,4] box
+        pt = keypt[:,self.index] # [n,m,2] gather all faces at once
+        center = pt.mean(axis=1, keepdims=True)
+        pt = np.ascontiguousarray(np.round(center + (pt - center)*(1+self.margin)), dtype=np.int32)
+        box = np.concatenate([pt.min(axis=1), pt.max(axis=1)+1], axis=1)
+        return [cv2.convexHull(p).reshape(-1, 2) for p in pt], box
+
+
+    def forward(self, img, param):
+        # param: List of face param from MediaPipeFace, filtered in place
+        keypt = [p['keypt'] for p in iter_param(param) if is_detect(p)]
+        if len(keypt)==0:
+            return img
+        hull, box = self.hull(np.asarray(keypt))
+        return self.censor.forward(img, box, hull)
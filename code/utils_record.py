@@ -0,0 +1,350 @@
+###############################################################################
+### Columnar storage of landmarks computed by MediaPipe
+### A landmark file is a folder containing:
+###   meta.json       : Column name, dtype, shape and list of chunks
+###   chunk_XXXXX.npz : One array per column stacked along the first axis
+### Uncompressed chunks are memory-mapped by LandmarkReader so that millions
+### of frames can be scanned without loading everything into memory
+###############################################################################
+
+import os
+import json
+import time
+import struct
+import zipfile
+import numpy as np
+
+from utils_cache import param_to_array, array_to_param
+
+
+# Column logged alongside param which is not part of MediaPipe result
+extra_column = ('frame', 'time', 'file', 'height', 'width')
+
+
+def save_chunk(file, data, compress=True):
+    # Same layout as np.savez but allow any column name
+    # Note: np.savez reserves keyword such as 'file'
+    mode = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(file, 'w', compression=mode, allowZip64=True) as z:
+        for k, v in data.items():
+            with z.open(k+'.npy', 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(v), allow_pickle=False)
+
+
+def memmap_member(file, info):
+    # Memory-map a .npy stored without compression inside a .npz
+    with open(file, 'rb') as f:
+        # Skip zip local file header (30 bytes + file name + extra field)
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_len, extra_len = struct.unpack('<HH', header[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+
+        # Read .npy header to get shape and dtype
+        version = np.lib.format.read_magic(f)
+        if version==(1,0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    return np.memmap(file, dtype=dtype, mode='r', offset=offset,
+        shape=shape, order='F' if fortran else 'C')
+
+
+def load_chunk(file, columns=None, mmap=True):
+    # Load chunk as dict of {column name: array}
+    # Uncompressed column is memory-mapped, compressed column is decompressed
+    data = {}
+    with zipfile.ZipFile(file) as z:
+        for info in z.infolist():
+            k = info.filename[:-4] # Remove .npy
+            if columns is not None and k not in columns: continue
+            if mmap and info.compress_type==zipfile.ZIP_STORED:
+                data[k] = memmap_member(file, info)
+            else:
+                with z.open(info) as f:
+                    data[k] = np.lib.format.read_array(f, allow_pickle=False)
+
+    return data
+
+
+class LandmarkWriter:
+    def __init__(self, folder, chunk_size=1024, compress=True, meta=None):
+        # folder:
+        #   Folder to store the landmark file
+
+        # chunk_size:
+        #   Number of rows to buffer before writing a chunk to disk
+
+        # compress:
+        #   Compress chunk with zip deflate (smaller file)
+        #   Otherwise chunk can be memory-mapped by the reader (faster scan)
+
+        # meta:
+        #   Optional dict of extra info e.g. model setting
+
+        self.folder     = folder
+        self.chunk_size = chunk_size
+        self.compress   = compress
+        os.makedirs(folder, exist_ok=True)
+
+        self.meta = {
+            'version' : 1,
+            'rows'    : 0,
+            'columns' : {}, # {name: {'dtype':..., 'shape':...}}
+            'chunks'  : [], # [{'file':..., 'rows':...}]
+            'info'    : {} if meta is None else meta,
+        }
+        self.buffer = {} # {name: list of value}
+        self.num_buffer = 0
+
+
+    def append(self, row):
+        # row: dict of {column name: value} for a single frame/image
+        if len(self.meta['columns'])==0 and self.num_buffer==0:
+            self.buffer = {k: [] for k in row}
+
+        # Copy as MediaPipe class overwrites its param in place every frame
+        # thus buffered rows would otherwise all hold the last frame
+        for k in self.buffer:
+            self.buffer[k].append(np.array(row[k], copy=True))
+        self.num_buffer += 1
+
+        if self.num_buffer>=self.chunk_size:
+            self.flush()
+
+
+    def flush(self):
+        # Write buffered rows as a new chunk
+        if self.num_buffer==0:
+            return
+
+        data = {k: np.stack(v) for k, v in self.buffer.items()}
+        file = 'chunk_%05d.npz' % len(self.meta['chunks'])
+        save_chunk(os.path.join(self.folder, file), data, self.compress)
+
+        for k, v in data.items():
+            col = self.meta['columns'].get(k)
+            # Promote string width if a longer string is found in later chunk
+            if col is None or (v.dtype.kind=='U' and v.dtype.itemsize>np.dtype(col['dtype']).itemsize):
+                self.meta['columns'][k] = {'dtype':v.dtype.str, 'shape':list(v.shape[1:])}
+
+        self.meta['chunks'].append({'file':file, 'rows':self.num_buffer})
+        self.meta['rows'] += self.num_buffer
+        self.write_meta()
+
+        for v in self.buffer.values():
+            v.clear()
+        self.num_buffer = 0
+
+
+    def write_meta(self):
+        # Meta is rewritten after every chunk so that the file
+        # remains readable even if writing is interrupted
+        file = os.path.join(self.folder, 'meta.json')
+        with open(file+'.tmp', 'w') as f:
+            json.dump(self.meta, f, indent=1)
+        os.replace(file+'.tmp', file)
+
+
+    def close(self):
+        self.flush()
+        self.write_meta()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SessionRecorder:
+    def __init__(self, folder, model='hand', chunk_size=1024, compress=False):
+        # Record param of every frame from MediaPipe class e.g. MediaPipeHand
+        # together with frame index and timestamp
+
+        # compress:
+        #   Default to uncompressed so that the session can be memory-mapped
+
+        self.writer = LandmarkWriter(folder, chunk_size, compress, meta={'model':model})
+        self.frame  = 0
+
+
+    def record(self, param, timestamp=None):
+        # Note: Column name must not clash with extra_column
+        row = param_to_array(param, skip=('fps',)) # Also log classified gesture
+        row['frame'] = self.frame
+        row['time']  = time.time() if timestamp is None else timestamp
+        self.writer.append(row)
+        self.frame += 1
+
+
+    def close(self):
+        self.writer.close()
+
+
+class LandmarkReader:
+    def __init__(self, folder, mmap=True):
+        # folder:
+        #   Folder of landmark file created by LandmarkWriter / SessionRecorder
+
+        # mmap:
+        #   Memory-map uncompressed chunk instead of reading into memory
+
+        self.folder = folder
+        self.mmap   = mmap
+        with open(os.path.join(folder, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        self.columns = list(self.meta['columns'])
+        # Index of first row of each chunk for random access
+        rows = [c['rows'] for c in self.meta['chunks']]
+        self.start = np.concatenate([[0], np.cumsum(rows)]).astype(int)
+
+        # Cache last loaded chunk for sequential access
+        self.cache_idx  = -1
+        self.cache_data = None
+
+
+    def __len__(self):
+        return int(self.start[-1])
+
+
+    def chunk(self, i, columns=None):
+        # Load i-th chunk as dict of {column name: array}
+        if columns is None and i==self.cache_idx:
+            return self.cache_data
+
+        file = os.path.join(self.folder, self.meta['chunks'][i]['file'])
+        data = load_chunk(file, columns, self.mmap)
+
+        if columns is None:
+            self.cache_idx  = i
+            self.cache_data = data
+
+        return data
+
+
+    def iter_chunks(self, columns=None):
+        # Scan through the file chunk by chunk
+        for i in range(len(self.meta['chunks'])):
+            yield self.chunk(i, columns)
+
+
+    def column(self, name):
+        # Concatenate a single column across all chunks
+        return np.concatenate([c[name] for c in self.iter_chunks([name])])
+
+
+    def __getitem__(self, index):
+        # Return a single row as dict of {column name: array}
+        if index<0: index += len(self)
+        if index<0 or index>=len(self):
+            raise IndexError('Row index out of range')
+        i = int(np.searchsorted(self.start, index, side='right')) - 1
+        data = self.chunk(i)
+        return {k: v[index-self.start[i]] for k, v in data.items()}
+
+
+    def __iter__(self):
+        # Iterate row by row
+        for data in self.iter_chunks():
+            n = len(next(iter(data.values())))
+            for j in range(n):
+                yield {k: v[j] for k, v in data.items()}
+
+
+def create_param(columns, model=None):
+    # Rebuild empty param structure from column names of landmark file
+    # e.g. ['0/keypt', '1/keypt'] -> [{'keypt':None}, {'keypt':None}]
+    root = {}
+    for key in columns:
+        if key in extra_column: continue
+        p = root
+        for k in key.split('/')[:-1]:
+            p = p.setdefault(k, {})
+        p[key.split('/')[-1]] = None
+
+    def convert(p):
+        # Convert dict with numeric key to list
+        if len(p)>0 and all(k.isdigit() for k in p):
+            return [convert(p[k]) for k in sorted(p, key=int)]
+        for k, v in p.items():
+            if isinstance(v, dict):
+                p[k] = convert(v)
+        # Field not logged but expected by display and classifier
+        p.setdefault('fps', -1)
+        if 'angle' in p:
+            p.setdefault('gesture', None)
+        return p
+
+    param = convert(root)
+    if model=='holistic':
+        param = tuple(param) # Same as MediaPipeHolistic
+    return param
+
+
+class LandmarkReplay:
+    def __init__(self, folder, speed=0, loop=False):
+        # Drop-in replacement of MediaPipe class e.g. MediaPipeHand
+        # forward(img) returns recorded param of the next frame
+        # without running MediaPipe at all
+
+        # speed:
+        #   0 : Replay as fast as possible
+        #   1 : Replay at recorded frame rate (2: twice as fast, etc.)
+
+        # loop:
+        #   Restart from first frame after last frame
+
+        self.reader = LandmarkReader(folder)
+        self.model  = self.reader.meta['info'].get('model')
+        self.param  = create_param(self.reader.columns, self.model)
+        self.speed  = speed
+        self.loop   = loop
+        self.index  = 0
+        self.pipe   = self # So that pipe.pipe.close() works as MediaPipe class
+
+        self.start_time  = None # Wall clock time of first frame
+        self.start_stamp = None # Recorded timestamp of first frame
+
+
+    def __len__(self):
+        return len(self.reader)
+
+
+    def done(self):
+        # Empty session is done even with loop as there is no frame to restart from
+        return len(self.reader)==0 or (self.index>=len(self.reader) and not self.loop)
+
+
+    def forward(self, img=None):
+        # Note: img is ignored and only kept for same interface as MediaPipe class
+        if self.index>=len(self.reader):
+            if not self.loop or len(self.reader)==0:
+                raise EOFError('End of recorded session')
+            self.index = 0
+            self.start_time = None
+
+        row = self.reader[self.index]
+        array_to_param({k: v for k, v in row.items() if k not in extra_column}, self.param)
+
+        # Wait to follow recorded timestamp
+        if self.speed>0 and 'time' in row:
+            if self.start_time is None:
+                self.start_time  = time.time()
+                self.start_stamp = float(row['time'])
+            delay = (float(row['time'])-self.start_stamp)/self.speed - (time.time()-self.start_time)
+            if delay>0:
+                time.sleep(delay)
+
+        self.index += 1
+
+        return self.param
+
+
+    def close(self):
+        pass
@@ -0,0 +1,234 @@
+###############################################################################
+### Rules engine for rock paper scissor game
+### Outcome of every pair of choice is precomputed in a lookup table
+### so that any number of players (or many tables at once) is resolved
+### in a single vectorized step without if/elif chain
+### RpsPredictor learns pattern of a player for computer opponent
+### ThrowDetector commits a throw once the hand settles after moving
+###############################################################################
+
+import time
+import numpy as np
+
+
+# Index of each choice, -1 for no valid gesture
+rps_name  = ('rock', 'paper', 'scissor')
+rps_index = {'rock':0, 'paper':1, 'scissor':2, 'scissors':2}
+
+# Map name of class label from GestureRecognition to choice
+gesture_to_rps = {'fist':'rock', 'five':'paper', 'three':'scissor', 'yeah':'scissor'}
+
+# Outcome lookup table [3,3] row player against column player
+# 1: win, 0: tie, -1: lose
+rps_outcome = np.array([
+    [ 0,-1, 1], # Rock
+    [ 1, 0,-1], # Paper
+    [-1, 1, 0], # Scissor
+])
+
+
+def rps_choice(label, mapping=None):
+    # Convert list of name e.g. ['rock', None, 'paper'] to choice index [0,-1,1]
+    # mapping: Optional dict to map class label first e.g. gesture_to_rps
+    if mapping is not None:
+        label = [mapping.get(l) for l in label]
+    return np.array([rps_index.get(l, -1) if l is not None else -1 for l in label], dtype=int)
+
+
+def rps_resolve(choice):
+    # choice: [..., N] index of choice of N players, -1 for player without valid gesture
+    #         Leading dimension allows many games (e.g. tables) to be resolved at once
+    # Return
+    #   winner: [..., N] boolean, True if player wins the round
+    #   score : [..., N] number of players beaten minus number of players lost to
+    # Rule for N players: round is decided only when exactly 2 different choices
+    # are shown, then all players showing the stronger choice win
+    # Otherwise (all same or all 3 choices shown) it is a tie
+    choice = np.asarray(choice, dtype=int)
+    valid  = choice>=0
+
+    # Number of players showing each choice [..., 3]
+    count = (choice[...,None]==np.arange(3)).sum(axis=-2)
+
+    # Score of each player is its row of lookup table weighted by count
+    row   = rps_outcome[np.where(valid, choice, 0)] # [..., N, 3]
+    score = np.where(valid, np.einsum('...nc,...c->...n', row, count), 0)
+
+    decided = (count>0).sum(axis=-1)==2
+    winner  = valid & decided[...,None] & (score>0)
+
+    return winner, score
+
+
+def rps_text(choice, winner, name=rps_name):
+    # Result text of a single game e.g. 'Paper wins' / 'Tie'
+    # Return None if less than 2 players have valid gesture
+    choice = np.asarray(choice)
+    if np.sum(choice>=0)<2:
+        return None
+    if not np.any(winner):
+        return 'Tie'
+    return '%s wins' % name[choice[np.argmax(winner)]].capitalize()
+
+
+class RpsPredictor:
+    def __init__(self, order=3, decay=0.9, min_count=1.0):
+        # Predict next choice of a player from history of choice
+        # using n-gram (Markov) model of order 1 to n with backoff
+        # Count table of each order is indexed by context encoded as integer
+        # thus update and predict cost O(order) per round independent of history
+
+        # order:
+        #   Maximum number of previous choice used as context
+
+        # decay:
+        #   Count of a context is multiplied by decay when updated
+        #   so that the model adapts when player changes strategy
+
+        # min_count:
+        #   Minimum total count of context to be trusted, else back off to lower order
+
+        self.order     = order
+        self.decay     = decay
+        self.min_count = min_count
+        self.count     = [np.zeros((3**n, 3)) for n in range(order+1)] # Order 0 is frequency
+        self.context   = 0 # Last n choice encoded in base 3
+        self.length    = 0 # Number of choice seen
+
+
+    def update(self, choice):
+        # choice: Index of choice of the player in last round, -1 is ignored
+        if choice<0:
+            return
+        for n in range(min(self.length, self.order)+1):
+            row = self.count[n][self.context % 3**n]
+            row *= self.decay
+            row[choice] += 1
+        self.context = (self.context*3 + choice) % 3**self.order
+        self.length += 1
+
+
+    def predict(self):
+        # Return probability [3,] of next choice of the player
+        # using the highest order context with enough count
+        for n in range(min(self.length, self.order), -1, -1):
+            row = self.count[n][self.context % 3**n]
+            total = row.sum()
+            if total>=self.min_count:
+                return row / total
+        return np.full(3, 1/3)
+
+
+    def counter(self, rng=np.random):
+        # Choice that beats the most likely next choice of the player
+        # Random choice if nothing is learned yet to avoid being predictable
+        prob = self.predict()
+        if self.length==0 or np.allclose(prob, prob[0]):
+            return int(rng.randint(3))
+        # Expected score of each choice against predicted distribution
+        return int(np.argmax(rps_outcome @ prob))
+
+
+class ThrowDetector:
+    def __init__(self, max_num=2, fps=30, move_speed=1.5, move_angle=200,
+        settle_speed=0.5, settle_angle=60, settle=3, max_wait=8):
+        # Commit a throw only when the hand settles after moving
+        # so that label of mid-motion frame is not used
+        # Wrist speed is normalized by hand size (wrist to middle finger MCP)
+        # and angle speed is mean absolute change of joint angle
+
+        # move_speed / move_angle:
+        #   Hand is moving (e.g. shaking) above either speed (hand size/s, deg/s)
+
+        # settle_speed / settle_angle:
+        #   Frame is settled when below both speed
+
+        # settle:
+        #   Number of consecutive settled frames to commit throw
+
+        # max_wait:
+        #   Commit anyway after this many frames once hand stops moving
+        #   thus decision latency is bounded
+
+        self.max_num      = max_num
+        self.fps          = fps
+        self.move_speed   = move_speed
+        self.move_angle   = move_angle
+        self.settle_speed = settle_speed
+        self.settle_angle = settle_angle
+        self.settle       = settle
+        self.max_wait     = max_wait
+
+        self.prev_wrist = np.zeros((max_num, 3))
+        self.prev_angle = np.zeros((max_num, 15))
+        self.prev_valid = np.zeros(max_num, dtype=bool)
+        self.prev_t     = None
+
+        self.moving = np.zeros(max_num, dtype=bool) # Waiting for hand to settle
+        self.still  = np.zeros(max_num, dtype=int)  # Consecutive settled frames
+        self.wait   = np.zeros(max_num, dtype=int)  # Frames since hand stops moving
+        self.stop_t = np.zeros(max_num)             # Time when hand stops moving
+        self.vote   = [[] for _ in range(max_num)]  # Label since hand stops moving
+        self.throw  = [None] * max_num              # Last committed throw
+
+
+    def update(self, joint, angle, label, slot=None, t=None):
+        # joint: [n,21,3] joint of n detected hands
+        # angle: [n,15] joint angle of n detected hands
+        # label: List of raw label of n detected hands e.g. from KNN
+        # slot : Slot of each hand e.g. LandmarkFilter.slot, default to order of detection
+        # Return list of event {'slot', 'label', 'time', 'frames', 'delay'} of committed throw
+        #   frames: Number of frames from hand stops moving to commit
+        #   delay : Time (s) from hand stops moving to commit
+        joint = np.asarray(joint, dtype=np.float64).reshape(-1, 21, 3)
+        angle = np.asarray(angle, dtype=np.float64).reshape(-1, 15)
+        slot  = np.arange(len(joint)) if slot is None else np.asarray(slot, dtype=int)
+        if t is None:
+            t = time.time()
+        dt = 1/self.fps if self.prev_t is None else max(t-self.prev_t, 1e-3)
+        self.prev_t = t
+
+        # Speed of all hands at once, hand just appeared is treated as moving
+        size  = np.linalg.norm(joint[:,9] - joint[:,0], axis=-1) + 1e-6
+        seen  = self.prev_valid[slot]
+        speed = np.where(seen, np.linalg.norm(joint[:,0] - self.prev_wrist[slot], axis=-1) / size / dt, np.inf)
+        aspeed = np.where(seen, np.mean(np.abs(angle - self.prev_angle[slot]), axis=-1) / dt, np.inf)
+
+        self.prev_wrist[slot] = joint[:,0]
+        self.prev_angle[slot] = angle
+        self.prev_valid[:]    = False
+        self.prev_valid[slot] = True
+
+        # Hand no longer detected
+        for s in np.where(~self.prev_valid)[0]:
+            self.moving[s] = True
+            self.throw[s]  = None
+
+        event = []
+        for i, s in enumerate(slot):
+            if speed[i]>self.move_speed or aspeed[i]>self.move_angle:
+                self.moving[s] = True
+                self.still[s]  = 0
+                self.wait[s]   = 0
+                self.vote[s]   = []
+                continue
+            if not self.moving[s]:
+                continue # Throw already committed, wait for next motion
+
+            if self.wait[s]==0:
+                self.stop_t[s] = t
+            self.wait[s] += 1
+            self.vote[s].append(label[i])
+            settled = speed[i]<self.settle_speed and aspeed[i]<self.settle_angle
+            self.still[s] = self.still[s]+1 if settled else 0
+
+            if self.still[s]>=self.settle or self.wait[s]>=self.max_wait:
+                # Most frequent valid label of the last few frames
+                vote = [l for l in self.vote[s][-self.settle:] if l is not None]
+                throw = max(set(vote), key=vote.count) if len(vote)>0 else None
+                self.moving[s] = False
+                self.throw[s]  = throw
+                event.append({'slot':int(s), 'label':throw, 'time':t,
+                    'frames':int(self.wait[s]), 'delay':float(t-self.stop_t[s])})
+
+        return event
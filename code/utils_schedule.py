@@ -0,0 +1,154 @@
+###############################################################################
+### Adaptive frame skipping for MediaPipe
+### Run full inference only every k frames or when the image changes a lot
+### In between, landmark is extrapolated from the last two inference results
+### and the last gesture label is reused
+###############################################################################
+
+import cv2
+import math
+import time
+import numpy as np
+
+
+def iter_param(param):
+    # Yield each dict of param e.g. a hand / face / body
+    if isinstance(param, dict):
+        yield param
+    else:
+        for p in param:
+            yield p
+
+
+def is_detect(p):
+    # Hand uses 'class' while face / body uses 'detect'
+    if 'class' in p:
+        return p['class'] is not None
+    return p.get('detect', False)
+
+
+class AdaptiveScheduler:
+    def __init__(self, pipe, max_skip=4, motion_thresh=6.0, cpu_target=None,
+        key=('keypt', 'joint', 'joint_3d')):
+        # pipe:
+        #   MediaPipe class e.g. MediaPipeHand, forward() has the same interface
+
+        # max_skip:
+        #   Maximum number of consecutive frames without inference
+
+        # motion_thresh:
+        #   Mean absolute difference [0,255] of downsampled grayscale image
+        #   from the last inference frame to trigger inference
+
+        # cpu_target:
+        #   Target fraction [0,1] of one cpu core to spend on inference e.g. 0.3
+        #   Number of skipped frames is adapted to meet the target
+        #   None to skip inference only while the image is static
+
+        # key:
+        #   Param to be extrapolated on skipped frames
+
+        self.pipe          = pipe
+        self.max_skip      = max_skip
+        self.motion_thresh = motion_thresh
+        self.cpu_target    = cpu_target
+        self.key           = key
+
+        self.ran    = False # Whether inference was run for the current frame
+        self.skip   = 0     # Number of frames since last inference
+        self.gap    = 1     # Number of frames between the last two inference
+        self.k      = 1     # Current inference interval
+        self.thumb  = None  # Downsampled grayscale of last inference frame
+        self.last   = None  # Snapshot of param of last inference
+        self.prev   = None  # Snapshot of param of second last inference
+        self.param  = None
+
+        self.cost   = None  # Average inference time (s)
+        self.period = None  # Average time between frames (s)
+        self.credit = 0     # Inference time budget accumulated (s)
+        self.prev_time = None
+
+        self.num_frame = 0
+        self.num_infer = 0
+
+
+    def snapshot(self, param):
+        return [{k: p[k].copy() for k in self.key if k in p} if is_detect(p) else None
+            for p in iter_param(param)]
+
+
+    def motion(self, img):
+        # Cheap image difference on a tiny grayscale thumbnail
+        thumb = cv2.resize(img, (32, 24), interpolation=cv2.INTER_AREA)
+        thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY).astype(np.float32)
+        if self.thumb is None:
+            return thumb, np.inf
+        return thumb, float(np.mean(np.abs(thumb - self.thumb)))
+
+
+    def update_budget(self, now):
+        # Track frame period and convert cpu target to inference interval
+        if self.prev_time is not None:
+            dt = now - self.prev_time
+            self.period = dt if self.period is None else 0.9*self.period + 0.1*dt
+            if self.cpu_target is not None and self.cost is not None:
+                # Accumulate budget but do not allow bursting for too long
+                self.credit = min(self.credit + self.cpu_target*dt, 2*self.cost)
+        self.prev_time = now
+
+        if self.cpu_target is None:
+            self.k = self.max_skip+1 # Only limited by image motion
+        elif self.cost is None or self.period is None:
+            self.k = 1
+        else:
+            k = math.ceil(self.cost / max(self.cpu_target*self.period, 1e-6))
+            self.k = int(np.clip(k, 1, self.max_skip+1))
+
+
+    def forward(self, img, **kwargs):
+        now = time.perf_counter()
+        self.update_budget(now)
+        self.num_frame += 1
+
+        thumb, motion = self.motion(img)
+        if self.param is None:
+            run = True
+        elif self.skip+1>=self.k:
+            run = True # Inference interval reached
+        elif motion>self.motion_thresh:
+            # Large image change, run inference if budget allows
+            run = self.cpu_target is None or self.credit>0
+        else:
+            run = False
+
+        if run:
+            t = time.perf_counter()
+            self.param = self.pipe.forward(img, **kwargs)
+            cost = time.perf_counter() - t
+            self.cost = cost if self.cost is None else 0.9*self.cost + 0.1*cost
+            self.credit -= cost
+
+            self.prev  = self.last
+            self.last  = self.snapshot(self.param)
+            self.gap   = self.skip + 1
+            self.skip  = 0
+            self.thumb = thumb
+            self.num_infer += 1
+        else:
+            self.skip += 1
+            self.extrapolate()
+
+        self.ran = run
+
+        return self.param
+
+
+    def extrapolate(self):
+        # Constant velocity extrapolation from the last two inference results
+        # Note: Angle and gesture of the last inference are reused
+        if self.prev is None: return
+        t = self.skip / self.gap
+        for p, last, prev in zip(iter_param(self.param), self.last, self.prev):
+            if last is None or prev is None: continue
+            for k in last:
+                p[k][...] = last[k] + (last[k] - prev[k]) * t
@@ -0,0 +1,358 @@
+###############################################################################
+### Round-based rock paper scissor tournament hosting many game tables
+### Each table runs its own round timing in an asyncio task:
+###   countdown -> lock-in window (collect gesture) -> result -> rest
+### Gesture of each player is pushed by a source:
+###   1) Local camera     : MediaPipe runs in a thread so the event loop is not blocked
+###   2) Recorded session : Landmark file from SessionRecorder (see utils_record.py)
+###   3) Socket client    : JSON line e.g. {"table":"t0", "player":"bob", "gesture":"rock"}
+### As a table is idle except for a few timers, one process can drive dozens of tables
+###############################################################################
+
+import json
+import time
+import asyncio
+import numpy as np
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from utils_rps import gesture_to_rps, rps_index, rps_choice, rps_resolve, rps_text
+
+
+def to_rps(label):
+    # Accept rps name e.g. 'rock' or class label of GestureRecognition e.g. 'fist'
+    if label is None:
+        return None
+    label = gesture_to_rps.get(label, label)
+    return label if label in rps_index else None
+
+
+class Leaderboard:
+    def __init__(self, point={'win':3, 'tie':1, 'lose':0}):
+        # point:
+        #   Point awarded for each outcome of a decided round
+        #   Tie is a round where player shows a gesture but nobody wins
+
+        self.point = point
+        self.score = {} # {player: {'point','win','tie','lose','miss','round'}}
+
+
+    def get(self, player):
+        return self.score.setdefault(player,
+            {'point':0, 'win':0, 'tie':0, 'lose':0, 'miss':0, 'round':0})
+
+
+    def update(self, player, choice, winner):
+        decided = np.any(winner)
+        for p, c, w in zip(player, choice, winner):
+            s = self.get(p)
+            s['round'] += 1
+            if c<0:
+                s['miss'] += 1 # No valid gesture in lock-in window
+                continue
+            result = 'win' if w else ('lose' if decided else 'tie')
+            s[result]  += 1
+            s['point'] += self.point[result]
+
+
+    def top(self, n=10):
+        # Sort by point then by win rate
+        rank = sorted(self.score.items(), key=lambda x:
+            (-x[1]['point'], -x[1]['win']/max(x[1]['round'], 1), x[0]))
+        return rank[:n]
+
+
+    def __str__(self):
+        text = '%-4s %-20s %6s %4s %4s %4s %4s' % ('#', 'player', 'point', 'win', 'tie', 'lose', 'miss')
+        for i, (p, s) in enumerate(self.top()):
+            text += '\n%-4d %-20s %6d %4d %4d %4d %4d' % (
+                i+1, p, s['point'], s['win'], s['tie'], s['lose'], s['miss'])
+        return text
+
+
+class Table:
+    def __init__(self, name, player=None, leaderboard=None,
+        countdown=3.0, lock_in=1.0, rest=2.0, rounds=None, max_player=8):
+        # name:
+        #   Unique name of table
+
+        # player:
+        #   List of player name, None to let socket client join
+
+        # countdown / lock_in / rest:
+        #   Duration (s) of each phase of a round
+        #   Gesture is only collected within lock-in window
+
+        # rounds:
+        #   Number of rounds to play, None to play forever
+
+        self.name        = name
+        self.player      = [] if player is None else list(player)
+        self.leaderboard = leaderboard
+        self.countdown   = countdown
+        self.lock_in     = lock_in
+        self.rest        = rest
+        self.rounds      = rounds
+        self.max_player  = max_player
+
+        self.state    = 'idle' # idle / countdown / lock_in / result
+        self.round    = 0
+        self.vote     = {}     # {player: Counter of rps} within lock-in window
+        self.listener = []     # asyncio.Queue of clients subscribed to event
+        self.history  = []     # Result of each round
+
+
+    def join(self, player):
+        if player in self.player:
+            return True
+        if len(self.player)>=self.max_player:
+            return False
+        self.player.append(player)
+        return True
+
+
+    def push(self, player, label):
+        # Gesture of a player for current frame, ignored outside lock-in window
+        if self.state!='lock_in' or player not in self.vote:
+            return False
+        label = to_rps(label)
+        if label is not None:
+            self.vote[player][label] += 1
+        return True
+
+
+    def emit(self, event):
+        event['table'] = self.name
+        event['time']  = time.time()
+        for q in self.listener:
+            if q.full():
+                q.get_nowait() # Slow client only misses old event
+            q.put_nowait(event)
+
+
+    def resolve(self):
+        # Most frequent gesture of each player within lock-in window
+        player = list(self.vote)
+        label  = [self.vote[p].most_common(1)[0][0] if len(self.vote[p])>0 else None
+            for p in player]
+        choice = rps_choice(label)
+        winner, score = rps_resolve(choice)
+        if self.leaderboard is not None:
+            self.leaderboard.update([self.name+'/'+p for p in player], choice, winner)
+
+        result = {
+            'event' : 'result',
+            'round' : self.round,
+            'player': player,
+            'choice': label,
+            'winner': [p for p, w in zip(player, winner) if w],
+            'text'  : rps_text(choice, winner),
+        }
+        self.history.append(result)
+        return result
+
+
+    async def run(self):
+        while self.rounds is None or self.round<self.rounds:
+            # Wait until at least 2 players have joined
+            if len(self.player)<2:
+                self.state = 'idle'
+                await asyncio.sleep(0.5)
+                continue
+
+            self.round += 1
+            self.state = 'countdown'
+            self.emit({'event':'countdown', 'round':self.round, 'duration':self.countdown})
+            await asyncio.sleep(self.countdown)
+
+            self.vote  = {p: Counter() for p in self.player}
+            self.state = 'lock_in'
+            self.emit({'event':'lock_in', 'round':self.round, 'duration':self.lock_in})
+            await asyncio.sleep(self.lock_in)
+
+            self.state = 'result'
+            self.emit(self.resolve())
+            await asyncio.sleep(self.rest)
+
+        self.state = 'idle'
+        self.emit({'event':'end', 'round':self.round})
+
+
+async def replay_source(table, folder, speed=1.0, loop=True):
+    # Feed table with recorded session, each hand is a player
+    # Gesture is taken from recorded label, otherwise classified from angle
+    from utils_record import LandmarkReplay
+    pipe = LandmarkReplay(folder, speed=0, loop=loop) # Pace is handled here
+    gest = None
+    player = ['hand%d' % i for i in range(len(pipe.param))]
+    for p in player:
+        table.join(p)
+
+    stamp = pipe.reader.column('time') if 'time' in pipe.reader.columns else None
+    if len(pipe)==0:
+        return # Empty session, nothing to replay even with loop
+
+    while not pipe.done():
+        i = pipe.index % len(pipe)
+        param = pipe.forward()
+        if stamp is not None and i>0 and speed>0:
+            await asyncio.sleep(max(stamp[i]-stamp[i-1], 0) / speed)
+        else:
+            await asyncio.sleep(0) # Let other table run
+
+        for p, name in zip(param, player):
+            if p.get('class') is None:
+                continue
+            label = p.get('gesture')
+            if label is None and 'angle' in p:
+                if gest is None:
+                    from utils_joint_angle import GestureRecognition
+                    gest = GestureRecognition(mode='eval')
+                label = gest.eval(p['angle'])
+            table.push(name, label)
+
+
+async def camera_source(table, index=0, max_num_hands=2):
+    # Feed table with local camera, hands are assigned to players from left to right
+    # Note: MediaPipe is blocking thus each camera runs in its own thread
+    import cv2
+    from utils_mediapipe import MediaPipeHand
+    from utils_joint_angle import GestureRecognition
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+    cap  = cv2.VideoCapture(index)
+    pipe = MediaPipeHand(static_image_mode=False, max_num_hands=max_num_hands)
+    gest = GestureRecognition(mode='eval')
+    player = ['cam%d_hand%d' % (index, i) for i in range(max_num_hands)]
+    for p in player:
+        table.join(p)
+
+    def step():
+        ret, img = cap.read()
+        if not ret:
+            return None
+        param = pipe.forward(img, mirror=True)
+        hand  = [p for p in param if p['class'] is not None]
+        hand.sort(key=lambda p: p['keypt'][0,0])
+        return gest.eval_batch([p['angle'] for p in hand]) if len(hand)>0 else []
+
+    try:
+        while cap.isOpened():
+            label = await loop.run_in_executor(executor, step)
+            if label is None:
+                break
+            for name, l in zip(player, label):
+                table.push(name, l)
+    finally:
+        cap.release()
+        pipe.pipe.close()
+        executor.shutdown(wait=False)
+
+
+class TournamentServer:
+    def __init__(self, leaderboard=None, **kwargs):
+        # Host many tables in one event loop
+        # Other arguments are default setting of Table e.g. countdown, lock_in
+
+        self.leaderboard = Leaderboard() if leaderboard is None else leaderboard
+        self.setting = kwargs
+        self.tables  = {}
+        self.tasks   = []
+        self.clients = {} # {writer: handler task} of connected socket client
+
+
+    def add_table(self, name=None, player=None, **kwargs):
+        name = 't%d' % len(self.tables) if name is None else name
+        setting = dict(self.setting, **kwargs)
+        self.tables[name] = Table(name, player, self.leaderboard, **setting)
+        return self.tables[name]
+
+
+    async def handle_client(self, reader, writer):
+        # Socket client sends one JSON message per line
+        # {"cmd":"join", "table":"t0", "player":"bob"}
+        # {"cmd":"gesture", "table":"t0", "player":"bob", "gesture":"rock"}
+        # {"cmd":"leaderboard"}
+        # Event of joined table is sent back as JSON line
+        queue  = asyncio.Queue(maxsize=64)
+        joined = set()
+        self.clients[writer] = asyncio.current_task()
+
+        async def send():
+            while True:
+                event = await queue.get()
+                writer.write((json.dumps(event)+'\n').encode())
+                await writer.drain()
+
+        sender = asyncio.ensure_future(send())
+        try:
+            # Note: Reply waits for room in queue so that pipelined commands
+            #       are throttled to the sender instead of raising QueueFull
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    await queue.put({'event':'error', 'message':'Invalid JSON'})
+                    continue
+
+                cmd   = msg.get('cmd', 'gesture')
+                table = self.tables.get(msg.get('table'))
+                if cmd=='leaderboard':
+                    await queue.put({'event':'leaderboard', 'rank':self.leaderboard.top()})
+                elif table is None:
+                    await queue.put({'event':'error', 'message':'Unknown table'})
+                elif cmd=='join':
+                    ok = table.join(str(msg.get('player')))
+                    if ok and table.name not in joined:
+                        table.listener.append(queue)
+                        joined.add(table.name)
+                    await queue.put({'event':'join', 'table':table.name, 'ok':ok})
+                elif cmd=='gesture':
+                    table.push(str(msg.get('player')), msg.get('gesture'))
+        finally:
+            sender.cancel()
+            for t in joined:
+                self.tables[t].listener.remove(queue)
+            self.clients.pop(writer, None)
+            writer.close()
+
+
+    async def report(self, period=10.0):
+        # Print leaderboard periodically
+        while True:
+            await asyncio.sleep(period)
+            print(self.leaderboard)
+
+
+    async def run(self, sources=(), host='0.0.0.0', port=None, report=10.0):
+        # sources: List of coroutine feeding gesture e.g. replay_source(table, folder)
+        self.tasks = [asyncio.ensure_future(t.run()) for t in self.tables.values()]
+        self.tasks += [asyncio.ensure_future(s) for s in sources]
+
+        server = None
+        if port is not None:
+            server = await asyncio.start_server(self.handle_client, host, port)
+            print('Listening on %s:%d' % (host, port))
+        reporter = asyncio.ensure_future(self.report(report)) if report else None
+
+        try:
+            # Finish when all tables have played their rounds
+            await asyncio.gather(*self.tasks[:len(self.tables)])
+        finally:
+            for t in self.tasks:
+                t.cancel()
+            if reporter is not None:
+                reporter.cancel()
+            if server is not None:
+                server.close()
+                handler = list(self.clients.values())
+                for w in list(self.clients):
+                    w.close() # Client handler then ends on EOF
+                await asyncio.gather(*handler, return_exceptions=True)
+                await server.wait_closed()
+
+        return self.leaderboard
@@ -2,6 +2,12 @@ import cv2
 import mediapipe as mp
 import numpy as np
 
+import sys
+sys.path.append('code') # Reuse utility in code folder
+from utils_filter import LandmarkFilter
+from utils_joint_angle import convert_3d_joint_to_angle
+from utils_rps import rps_choice, rps_resolve, rps_text, ThrowDetector
+
 max_num_hands = 2
 gesture = {
     0:'fist', 1:'one', 2:'two', 3:'three', 4:'four', 5:'five',
@@ -24,80 +30,79 @@ label = file[:, -1].astype(np.float32)
 knn = cv2.ml.KNearest_create()
 knn.train(angle, cv2.ml.ROW_SAMPLE, label)
 
+# Temporal smoothing of joints to reduce gesture flicker
+smoother = LandmarkFilter(max_num=max_num_hands, method='one_euro')
+
+# Commit throw only when the hand settles instead of using mid-motion frame
+detector = ThrowDetector(max_num=max_num_hands)
+
 cap = cv2.VideoCapture(0)
 
+rgb = None # Reused buffer of RGB image
 while cap.isOpened():
     ret, img = cap.read()
     if not ret:
         continue
 
-    img = cv2.flip(img, 1)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    # Convert to RGB into a reused buffer without flipping the frame
+    # Flip is only for display thus landmark is mirrored below instead
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=rgb)
 
-    result = hands.process(img)
+    result = hands.process(rgb)
 
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    img = cv2.flip(img, 1) # Flip image for display
 
     if result.multi_hand_landmarks is not None:
         rps_result = []
 
-        for res in result.multi_hand_landmarks:
-            joint = np.zeros((21, 3))
+        joint = np.zeros((len(result.multi_hand_landmarks), 21, 3))
+        for i, res in enumerate(result.multi_hand_landmarks):
             for j, lm in enumerate(res.landmark):
-                joint[j] = [lm.x, lm.y, lm.z]
+                lm.x = 1 - lm.x # Mirror landmark to match flipped image
+                joint[i,j] = [lm.x, lm.y, lm.z]
 
-            # Compute angles between joints
-            v1 = joint[[0,1,2,3,0,5,6,7,0,9,10,11,0,13,14,15,0,17,18,19],:] # Parent joint
-            v2 = joint[[1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20],:] # Child joint
-            v = v2 - v1 # [20,3]
-            # Normalize v
-            v = v / np.linalg.norm(v, axis=1)[:, np.newaxis]
+        # Smooth joints of all hands at once
+        joint = smoother.apply(joint)
 
-            # Get angle using arcos of dot product
-            angle = np.arccos(np.einsum('nt,nt->n',
-                v[[0,1,2,4,5,6,8,9,10,12,13,14,16,17,18],:], 
-                v[[1,2,3,5,6,7,9,10,11,13,14,15,17,18,19],:])) # [15,]
+        # Compute angles between joints and inference gesture of all hands at once
+        angle = convert_3d_joint_to_angle(joint) # [num_hands,15]
+        data = angle.astype(np.float32)
+        ret, results, neighbours, dist = knn.findNearest(data, 3)
 
-            angle = np.degrees(angle) # Convert radian to degree
+        # Raw gesture of each hand, None if it is not rock / paper / scissors
+        raw = [rps_gesture.get(int(r[0])) for r in results]
+        for e in detector.update(joint, angle, raw, smoother.slot):
+            print('Hand %d throws %s: committed %d frames (%.0f ms) after hand stops' % (
+                e['slot'], e['label'], e['frames'], e['delay']*1000))
 
-            # Inference gesture
-            data = np.array([angle], dtype=np.float32)
-            ret, results, neighbours, dist = knn.findNearest(data, 3)
-            idx = int(results[0][0])
+        for i, res in enumerate(result.multi_hand_landmarks[:len(joint)]):
+            throw = detector.throw[smoother.slot[i]] # Committed throw
 
             # Draw gesture result
-            if idx in rps_gesture.keys():
+            if throw is not None:
                 org = (int(res.landmark[0].x * img.shape[1]), int(res.landmark[0].y * img.shape[0]))
-                cv2.putText(img, text=rps_gesture[idx].upper(), org=(org[0], org[1] + 20), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
+                cv2.putText(img, text=throw.upper(), org=(org[0], org[1] + 20), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
 
                 rps_result.append({
-                    'rps': rps_gesture[idx],
+                    'rps': throw,
                     'org': org
                 })
 
             mp_drawing.draw_landmarks(img, res, mp_hands.HAND_CONNECTIONS)
 
-            # Who wins?
-            if len(rps_result) >= 2:
-                winner = None
-                text = ''
-
-                if rps_result[0]['rps']=='rock':
-                    if rps_result[1]['rps']=='rock'     : text = 'Tie'
-                    elif rps_result[1]['rps']=='paper'  : text = 'Paper wins'  ; winner = 1
-                    elif rps_result[1]['rps']=='scissors': text = 'Rock wins'   ; winner = 0
-                elif rps_result[0]['rps']=='paper':
-                    if rps_result[1]['rps']=='rock'     : text = 'Paper wins'  ; winner = 0
-                    elif rps_result[1]['rps']=='paper'  : text = 'Tie'
-                    elif rps_result[1]['rps']=='scissors': text = 'Scissors wins'; winner = 1
-                elif rps_result[0]['rps']=='scissors':
-                    if rps_result[1]['rps']=='rock'     : text = 'Rock wins'   ; winner = 1
-                    elif rps_result[1]['rps']=='paper'  : text = 'Scissors wins'; winner = 0
-                    elif rps_result[1]['rps']=='scissors': text = 'Tie'
-
-                if winner is not None:
-                    cv2.putText(img, text='Winner', org=(rps_result[winner]['org'][0], rps_result[winner]['org'][1] + 70), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=2, color=(0, 255, 0), thickness=3)
-                cv2.putText(img, text=text, org=(int(img.shape[1] / 2), 100), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=2, color=(0, 0, 255), thickness=3)
+        # Who wins? Resolve all hands at once with lookup table
+        if len(rps_result) >= 2:
+            choice = rps_choice([r['rps'] for r in rps_result])
+            winner, score = rps_resolve(choice)
+            text = rps_text(choice, winner, name=('rock', 'paper', 'scissors'))
+
+            for r, w in zip(rps_result, winner):
+                if w:
+                    cv2.putText(img, text='Winner', org=(r['org'][0], r['org'][1] + 70), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=2, color=(0, 255, 0), thickness=3)
+            cv2.putText(img, text=text, org=(int(img.shape[1] / 2), 100), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=2, color=(0, 0, 255), thickness=3)
+    else:
+        smoother.reset() # Restart smoothing when hand reappears
+        detector.update(np.zeros((0, 21, 3)), np.zeros((0, 15)), [])
 
     cv2.imshow('Game', img)
     if cv2.waitKey(1) == ord('q'):
@@ -1,9 +1,35 @@
 import cv2
 import mediapipe as mp
 import numpy as np
-from dynamikontrol import Module
-
-module = Module()
+import argparse
+
+import sys
+sys.path.append('code') # Reuse utility in code folder
+from utils_filter import LandmarkFilter, GestureEvent
+from utils_actuator import ActuatorDispatcher, MockModule
+from utils_joint_angle import convert_3d_joint_to_angle
+from utils_classifier import OpenSetThreshold, knn_nearest
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--mock', action='store_true',
+    help='Use mock motor to run without hardware')
+parser.add_argument('--max_rate', type=float, default=10,
+    help='Maximum number of motor commands per second, 0 for no limit')
+parser.add_argument('--reject', action='store_true',
+    help='Ignore hand pose far from training data instead of forcing the nearest gesture')
+parser.add_argument('--min_confidence', type=float, default=0.5,
+    help='With --reject, ignore gesture below this confidence (0 to 1)')
+args = parser.parse_args()
+
+if args.mock:
+    module = MockModule()
+else:
+    from dynamikontrol import Module
+    module = Module()
+
+# Send motor command from a background thread so that serial latency
+# does not stall the video loop, only the latest command is sent
+motor = ActuatorDispatcher(module.motor, max_rate=args.max_rate)
 
 max_num_hands = 1
 gesture = {
@@ -27,59 +53,85 @@ label = file[:, -1].astype(np.float32)
 knn = cv2.ml.KNearest_create()
 knn.train(angle, cv2.ml.ROW_SAMPLE, label)
 
+# Per class distance threshold to reject unknown hand pose
+threshold = None
+if args.reject:
+    threshold = OpenSetThreshold()
+    threshold.train(angle, label)
+
+# Temporal smoothing of joints to reduce gesture flicker
+smoother = LandmarkFilter(max_num=max_num_hands, method='one_euro')
+
+# Confirm gesture by voting over the last few frames
+events = GestureEvent(max_num=max_num_hands, window=5, enter=3, leave=2)
+
 cap = cv2.VideoCapture(0)
 
+rgb = None # Reused buffer of RGB image
 while cap.isOpened():
     ret, img = cap.read()
     if not ret:
         break
 
-    img = cv2.flip(img, 1)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    # Convert to RGB into a reused buffer without flipping the frame
+    # Flip is only for display thus landmark is mirrored below instead
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=rgb)
 
-    result = hands.process(img)
+    result = hands.process(rgb)
 
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    img = cv2.flip(img, 1) # Flip image for display
 
     if result.multi_hand_landmarks is not None:
-        for res in result.multi_hand_landmarks:
-            joint = np.zeros((21, 3))
+        joint = np.zeros((len(result.multi_hand_landmarks), 21, 3))
+        for i, res in enumerate(result.multi_hand_landmarks):
             for j, lm in enumerate(res.landmark):
-                joint[j] = [lm.x, lm.y, lm.z]
-
-            # Compute angles between joints
-            v1 = joint[[0,1,2,3,0,5,6,7,0,9,10,11,0,13,14,15,0,17,18,19],:] # Parent joint
-            v2 = joint[[1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20],:] # Child joint
-            v = v2 - v1 # [20,3]
-            # Normalize v
-            v = v / np.linalg.norm(v, axis=1)[:, np.newaxis]
+                lm.x = 1 - lm.x # Mirror landmark to match flipped image
+                joint[i,j] = [lm.x, lm.y, lm.z]
+
+        # Smooth joints of all hands at once
+        joint = smoother.apply(joint)
+
+        # Compute angles between joints and inference gesture of all hands at once
+        angle = convert_3d_joint_to_angle(joint) # [num_hands,15]
+        data = angle.astype(np.float32)
+        ret, results, neighbours, dist = knn.findNearest(data, 5)
+
+        # Raw gesture of each hand, None if it is not a fan command
+        raw = [int(r[0]) if int(r[0]) in rps_gesture.keys() else None for r in results]
+        if threshold is not None:
+            # Unknown or uncertain pose is not a command so that it never changes motor speed
+            near, vote = knn_nearest(results[:,0], neighbours, dist)
+            accept, confidence = threshold.check(results[:,0].astype(int), near, vote)
+            accept &= confidence>=args.min_confidence
+            raw = [r if a else None for r, a in zip(raw, accept)]
+    else:
+        raw = []
+        smoother.reset() # Restart smoothing when hand reappears
+
+    # Only send motor command when confirmed gesture changes
+    # instead of flooding the serial link on every frame
+    for e in events.update(raw, smoother.slot):
+        if e['label'] is None:
+            continue # Keep fan running when hand leaves
+        if e['label'] > 0:
+            motor.speed(e['label'] * 1000)
+        else:
+            motor.stop()
 
-            # Get angle using arcos of dot product
-            angle = np.arccos(np.einsum('nt,nt->n',
-                v[[0,1,2,4,5,6,8,9,10,12,13,14,16,17,18],:], 
-                v[[1,2,3,5,6,7,9,10,11,13,14,15,17,18,19],:])) # [15,]
-
-            angle = np.degrees(angle) # Convert radian to degree
-
-            # Inference gesture
-            data = np.array([angle], dtype=np.float32)
-            ret, results, neighbours, dist = knn.findNearest(data, 5)
-            idx = int(results[0][0])
+    if result.multi_hand_landmarks is not None:
+        for i, res in enumerate(result.multi_hand_landmarks[:len(joint)]):
+            idx = events.label[smoother.slot[i]] # Confirmed gesture
 
             # Draw gesture result
-            if idx in rps_gesture.keys():
+            if idx is not None:
                 cv2.putText(img, text=rps_gesture[idx].upper(), org=(int(res.landmark[0].x * img.shape[1]), int(res.landmark[0].y * img.shape[0] + 20)), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
 
-                if idx > 0:
-                    module.motor.speed(idx * 1000)
-                else:
-                    module.motor.stop()
-
             mp_drawing.draw_landmarks(img, res, mp_hands.HAND_CONNECTIONS)
 
     cv2.imshow('AI Fan', img)
     if cv2.waitKey(1) == ord('q'):
         break
 
+motor.close()
 module.motor.stop()
 module.disconnect()
@@ -1,8 +1,44 @@
 import cv2
 import mediapipe as mp
 import numpy as np
-
-max_num_hands = 1
+import argparse
+import os
+
+import sys
+sys.path.append('code') # Reuse utility in code folder
+from utils_joint_angle import convert_3d_joint_to_angle
+from utils_privacy import PrivacyFilter, FaceAnonymizer, keypt_to_box
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--method', default='pixelate', choices=['pixelate', 'blur', 'mask'])
+parser.add_argument('--block', type=int, default=16,
+    help='Block size (pixel) of pixelate')
+parser.add_argument('--max_num_hands', type=int, default=2)
+parser.add_argument('--face', type=int, default=0,
+    help='Also anonymize up to this many faces')
+parser.add_argument('--input', default=None,
+    help='Censor video file offline instead of webcam')
+parser.add_argument('--output', default=None,
+    help='Output video file of offline mode (default: input_censored.mp4)')
+parser.add_argument('--max_skip', type=int, default=2,
+    help='Maximum number of consecutive frames without inference in offline mode')
+parser.add_argument('--num_worker', type=int, default=None,
+    help='Number of video segments censored in parallel in offline mode')
+args = parser.parse_args()
+
+if args.input is not None:
+    # Stream video file through decode -> inference -> encode pipeline
+    # Run again with the same arguments to resume after interruption
+    from utils_censor import VideoCensor
+    output = args.output or os.path.splitext(args.input)[0] + '_censored.mp4'
+    censor = VideoCensor(gesture_file='data/gesture_train_fy.csv',
+        max_num_hands=args.max_num_hands, max_num_faces=args.face,
+        method=args.method, block=args.block, max_skip=args.max_skip, num_worker=args.num_worker)
+    stat = censor.run(args.input, output)
+    print('Saved %s, %d frames in %.1f s (%.1f fps)' % (output, stat['frames'], stat['time'], stat['fps']))
+    sys.exit()
+
+max_num_hands = args.max_num_hands
 gesture = {
     0:'fist', 1:'one', 2:'two', 3:'three', 4:'four', 5:'five',
     6:'six', 7:'rock', 8:'spiderman', 9:'yeah', 10:'ok', 11:'fy'
@@ -23,56 +59,62 @@ label = file[:, -1].astype(np.float32)
 knn = cv2.ml.KNearest_create()
 knn.train(angle, cv2.ml.ROW_SAMPLE, label)
 
+# MediaPipe face model
+if args.face>0:
+    from utils_mediapipe import MediaPipeFace
+    faces = MediaPipeFace(static_image_mode=False, max_num_faces=args.face)
+    anon  = FaceAnonymizer(method=args.method, block=args.block) # Filter inside face outline
+
+# All regions of a frame are filtered in one pass
+censor = PrivacyFilter(method=args.method, block=args.block)
+
 cap = cv2.VideoCapture(0)
 
+rgb = None # Reused buffer of RGB image
 while cap.isOpened():
     ret, img = cap.read()
     if not ret:
         continue
 
-    img = cv2.flip(img, 1)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
-    result = hands.process(img)
+    # Convert to RGB into a reused buffer without flipping the frame
+    # Flip is only for display thus landmark is mirrored below instead
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=rgb)
 
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    result = hands.process(rgb)
 
-    if result.multi_hand_landmarks is not None:
-        for res in result.multi_hand_landmarks:
-            joint = np.zeros((21, 3))
-            for j, lm in enumerate(res.landmark):
-                joint[j] = [lm.x, lm.y, lm.z]
+    if args.face>0:
+        # Face landmark is mirrored to match flipped image
+        param = faces.forward(img, mirror=True)
 
-            # Compute angles between joints
-            v1 = joint[[0,1,2,3,0,5,6,7,0,9,10,11,0,13,14,15,0,17,18,19],:] # Parent joint
-            v2 = joint[[1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20],:] # Child joint
-            v = v2 - v1 # [20,3]
-            # Normalize v
-            v = v / np.linalg.norm(v, axis=1)[:, np.newaxis]
+    img = cv2.flip(img, 1) # Flip image for display
 
-            # Get angle using arcos of dot product
-            angle = np.arccos(np.einsum('nt,nt->n',
-                v[[0,1,2,4,5,6,8,9,10,12,13,14,16,17,18],:], 
-                v[[1,2,3,5,6,7,9,10,11,13,14,15,17,18,19],:])) # [15,]
+    if args.face>0:
+        anon.forward(img, param)
 
-            angle = np.degrees(angle) # Convert radian to degree
+    box = [] # Box (pixel) of regions to be filtered
 
-            # Inference gesture
-            data = np.array([angle], dtype=np.float32)
-            ret, results, neighbours, dist = knn.findNearest(data, 3)
-            idx = int(results[0][0])
+    if result.multi_hand_landmarks is not None:
+        joint = np.zeros((len(result.multi_hand_landmarks), 21, 3))
+        for i, res in enumerate(result.multi_hand_landmarks):
+            for j, lm in enumerate(res.landmark):
+                lm.x = 1 - lm.x # Mirror landmark to match flipped image
+                joint[i,j] = [lm.x, lm.y, lm.z]
 
-            if idx == 11:
-                x1, y1 = tuple((joint.min(axis=0)[:2] * [img.shape[1], img.shape[0]] * 0.95).astype(int))
-                x2, y2 = tuple((joint.max(axis=0)[:2] * [img.shape[1], img.shape[0]] * 1.05).astype(int))
+        # Compute angles between joints and inference gesture of all hands at once
+        angle = convert_3d_joint_to_angle(joint) # [num_hands,15]
+        data = angle.astype(np.float32)
+        ret, results, neighbours, dist = knn.findNearest(data, 3)
 
-                fy_img = img[y1:y2, x1:x2].copy()
-                fy_img = cv2.resize(fy_img, dsize=None, fx=0.05, fy=0.05, interpolation=cv2.INTER_NEAREST)
-                fy_img = cv2.resize(fy_img, dsize=(x2 - x1, y2 - y1), interpolation=cv2.INTER_NEAREST)
+        fy = results[:,0].astype(int) == 11
+        keypt = joint[fy,:,:2] * [img.shape[1], img.shape[0]]
+        box.append(keypt_to_box(keypt, img.shape, margin=0.05))
 
-                img[y1:y2, x1:x2] = fy_img
+        # for res in result.multi_hand_landmarks:
+        #     mp_drawing.draw_landmarks(img, res, mp_hands.HAND_CONNECTIONS)
 
-            # mp_drawing.draw_landmarks(img, res, mp_hands.HAND_CONNECTIONS)
+    # Box is padded and clamped to the frame, all regions are filtered at once
+    if len(box) > 0:
+        censor.forward(img, np.concatenate(box))
 
     cv2.imshow('Filter', img)
     if cv2.waitKey(1) == ord('q'):
@@ -31,22 +31,25 @@ def click(event, x, y, flags, param):
 cv2.namedWindow('Dataset')
 cv2.setMouseCallback('Dataset', click)
 
+rgb = None # Reused buffer of RGB image
 while cap.isOpened():
     ret, img = cap.read()
     if not ret:
         continue
 
-    img = cv2.flip(img, 1)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    # Convert to RGB into a reused buffer without flipping the frame
+    # Flip is only for display thus landmark is mirrored below instead
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=rgb)
 
-    result = hands.process(img)
+    result = hands.process(rgb)
 
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    img = cv2.flip(img, 1) # Flip image for display
 
     if result.multi_hand_landmarks is not None:
         for res in result.multi_hand_landmarks:
             joint = np.zeros((21, 3))
             for j, lm in enumerate(res.landmark):
+                lm.x = 1 - lm.x # Mirror landmark to match flipped image
                 joint[j] = [lm.x, lm.y, lm.z]
 
             # Compute angles between joints
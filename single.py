@@ -1,6 +1,19 @@
 import cv2
 import mediapipe as mp
 import numpy as np
+import time
+import argparse
+
+import sys
+sys.path.append('code') # Reuse utility in code folder
+from utils_rps import rps_name, rps_choice, rps_resolve, RpsPredictor, ThrowDetector
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--ai', action='store_true',
+    help='Play against computer opponent which learns your pattern')
+parser.add_argument('--countdown', type=float, default=3.0,
+    help='Duration (s) of countdown before throw is locked in')
+args = parser.parse_args()
 
 max_num_hands = 1
 gesture = {
@@ -24,24 +37,40 @@ label = file[:, -1].astype(np.float32)
 knn = cv2.ml.KNearest_create()
 knn.train(angle, cv2.ml.ROW_SAMPLE, label)
 
+# Commit throw only when the hand settles instead of using mid-motion frame
+detector = ThrowDetector(max_num=max_num_hands)
+
+# Computer opponent predicts next throw from history of player throws
+if args.ai:
+    predictor  = RpsPredictor(order=3)
+    ai_choice  = None # Committed at start of round before player throw is seen
+    round_time = time.time()
+    round_text = None
+    score = {'player':0, 'computer':0}
+
 cap = cv2.VideoCapture(0)
 
+rgb = None # Reused buffer of RGB image
 while cap.isOpened():
     ret, img = cap.read()
     if not ret:
         continue
+    frame_time  = time.time()
+    throw_event = []
 
-    img = cv2.flip(img, 1)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    # Convert to RGB into a reused buffer without flipping the frame
+    # Flip is only for display thus landmark is mirrored below instead
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=rgb)
 
-    result = hands.process(img)
+    result = hands.process(rgb)
 
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    img = cv2.flip(img, 1) # Flip image for display
 
     if result.multi_hand_landmarks is not None:
         for res in result.multi_hand_landmarks:
             joint = np.zeros((21, 3))
             for j, lm in enumerate(res.landmark):
+                lm.x = 1 - lm.x # Mirror landmark to match flipped image
                 joint[j] = [lm.x, lm.y, lm.z]
 
             # Compute angles between joints
@@ -62,15 +91,59 @@ while cap.isOpened():
             data = np.array([angle], dtype=np.float32)
             ret, results, neighbours, dist = knn.findNearest(data, 3)
             idx = int(results[0][0])
+            throw_event = detector.update(joint[None], angle[None], [rps_gesture.get(idx)], t=frame_time)
+            throw = detector.throw[0] # Committed throw
 
             # Draw gesture result
-            if idx in rps_gesture.keys():
-                cv2.putText(img, text=rps_gesture[idx].upper(), org=(int(res.landmark[0].x * img.shape[1]), int(res.landmark[0].y * img.shape[0] + 20)), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
+            if throw is not None:
+                cv2.putText(img, text=throw.upper(), org=(int(res.landmark[0].x * img.shape[1]), int(res.landmark[0].y * img.shape[0] + 20)), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
 
             # Other gestures
             # cv2.putText(img, text=gesture[idx].upper(), org=(int(res.landmark[0].x * img.shape[1]), int(res.landmark[0].y * img.shape[0] + 20)), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
 
             mp_drawing.draw_landmarks(img, res, mp_hands.HAND_CONNECTIONS)
+    else:
+        throw_event = detector.update(np.zeros((0, 21, 3)), np.zeros((0, 15)), [], t=frame_time)
+
+    if args.ai:
+        lock_time = round_time + args.countdown
+        if ai_choice is None:
+            # Decide before the player's hand is seen so it cannot react to it
+            ai_choice = predictor.counter()
+            commit_time = time.time()
+
+        if frame_time<lock_time:
+            # Countdown
+            cv2.putText(img, text=str(int(lock_time-frame_time)+1), org=(int(img.shape[1] / 2), 100), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=3, color=(0, 255, 255), thickness=5)
+        elif round_text is None and (len(throw_event)>0 or not detector.moving[0] or frame_time>lock_time+1.0):
+            # Lock-in frame: player throw is committed when the hand settles
+            # or has already settled before countdown ends
+            player = rps_choice([detector.throw[0]])[0]
+            choice = np.array([player, ai_choice])
+            winner, _ = rps_resolve(choice)
+            predictor.update(player)
+
+            if player<0:
+                round_text = 'No throw'
+            elif winner[0]:
+                round_text = 'You win'      ; score['player'] += 1
+            elif winner[1]:
+                round_text = 'Computer wins'; score['computer'] += 1
+            else:
+                round_text = 'Tie'
+            print('Round: player %s computer %s -> %s (committed %.0f ms before lock-in, decided %.0f ms after lock-in, revealed %.1f ms after frame)' % (
+                rps_name[player] if player>=0 else None, rps_name[ai_choice], round_text,
+                (lock_time-commit_time)*1000, (frame_time-lock_time)*1000, (time.time()-frame_time)*1000))
+        elif round_text is not None and frame_time>lock_time+2.0:
+            # Start next round
+            round_time = frame_time
+            round_text = None
+            ai_choice  = None
+
+        if round_text is not None:
+            cv2.putText(img, text='AI: ' + rps_name[ai_choice].upper(), org=(10, 50), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(0, 255, 255), thickness=2)
+            cv2.putText(img, text=round_text, org=(int(img.shape[1] / 2), 100), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=2, color=(0, 0, 255), thickness=3)
+        cv2.putText(img, text='You %d : %d AI' % (score['player'], score['computer']), org=(10, img.shape[0] - 20), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(255, 255, 255), thickness=2)
 
     cv2.imshow('Game', img)
     if cv2.waitKey(1) == ord('q'):